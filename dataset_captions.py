@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+📝 Caption corpus statistics
+Token lengths per caption computed once per tokenizer and cached in the dataset index
+"""
+
+import hashlib
+import json
+import re
+import statistics
+from collections import Counter
+
+import dataset_index
+
+# Text encoder windows (including special tokens) of the models we train
+HF_TOKENIZERS = {
+    "clip": ("openai/clip-vit-large-patch14", 77),
+    "t5": ("google/t5-v1_1-xxl", 512),
+}
+DEFAULT_TOKENIZER = "clip"
+WHITESPACE_MAX_LENGTH = 77
+DEFAULT_BIN_SIZE = 16
+DEFAULT_TOP_K = 50
+
+# Subword markers stripped before counting vocabulary
+SUBWORD_MARKERS = ("</w>", "▁", "Ġ")
+
+
+class WhitespaceTokenizer:
+    """Dependency-free fallback: lowercase words, punctuation dropped"""
+
+    name = "whitespace"
+
+    def __init__(self, max_length=WHITESPACE_MAX_LENGTH):
+        self.max_length = max_length
+
+    def tokenize(self, text):
+        return re.findall(r"[\w']+", text.lower())
+
+    def count(self, tokens):
+        return len(tokens)
+
+
+class HFTokenizer:
+    """transformers tokenizer; counts include the special tokens the encoder adds"""
+
+    def __init__(self, name, model_id, max_length):
+        from transformers import AutoTokenizer
+
+        self.name = name
+        self.max_length = max_length
+        self._tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self._special_tokens = self._tokenizer.num_special_tokens_to_add()
+
+    def tokenize(self, text):
+        return self._tokenizer.tokenize(text)
+
+    def count(self, tokens):
+        return len(tokens) + self._special_tokens
+
+
+_FACTORIES = {name: (lambda name=name: HFTokenizer(name, *HF_TOKENIZERS[name])) for name in HF_TOKENIZERS}
+_FACTORIES["whitespace"] = WhitespaceTokenizer
+# name -> (tokenizer, fallback reason or None); failed loads are cached too
+_LOADED = {}
+
+
+def register_tokenizer(name, factory):
+    """Add a tokenizer: factory() returns an object with name, max_length, tokenize() and count()"""
+    _FACTORIES[name] = factory
+    _LOADED.pop(name, None)
+
+
+def load_tokenizer(name=DEFAULT_TOKENIZER):
+    """(tokenizer, fallback reason or None); unavailable tokenizers fall back to whitespace"""
+    if name not in _FACTORIES:
+        raise ValueError(f"Unknown tokenizer: {name} (available: {', '.join(sorted(_FACTORIES))})")
+    if name not in _LOADED:
+        try:
+            _LOADED[name] = (_FACTORIES[name](), None)
+        except Exception as e:
+            _LOADED[name] = (WhitespaceTokenizer(), f"{name} unavailable ({type(e).__name__}: {e})")
+    return _LOADED[name]
+
+
+def _caption_sha256(caption):
+    return hashlib.sha256(caption.encode("utf-8")).hexdigest()
+
+
+def _vocabulary_token(token):
+    for marker in SUBWORD_MARKERS:
+        token = token.replace(marker, "")
+    return token.lower()
+
+
+def tokenize_captions(folder, tokenizer):
+    """{filename: (token_count, tokens)} for every captioned image, tokenizing only unseen captions"""
+    conn = dataset_index.open_index(folder)
+    try:
+        captions = {
+            row["filename"]: row["caption"] for row in conn.execute(
+                "SELECT filename, caption FROM images WHERE caption IS NOT NULL AND caption != ''"
+            )
+        }
+        hashes = {filename: _caption_sha256(caption) for filename, caption in captions.items()}
+        cached = {
+            row["caption_sha256"]: (row["token_count"], json.loads(row["tokens"])) for row in conn.execute(
+                "SELECT caption_sha256, token_count, tokens FROM caption_tokens WHERE tokenizer = ?",
+                (tokenizer.name,)
+            )
+        }
+
+        new_rows = {}
+        for filename, caption in captions.items():
+            sha256 = hashes[filename]
+            if sha256 not in cached and sha256 not in new_rows:
+                tokens = tokenizer.tokenize(caption)
+                new_rows[sha256] = (tokenizer.count(tokens), tokens)
+        conn.executemany(
+            "INSERT OR REPLACE INTO caption_tokens (caption_sha256, tokenizer, token_count, tokens) "
+            "VALUES (?, ?, ?, ?)",
+            [(sha256, tokenizer.name, count, json.dumps(tokens)) for sha256, (count, tokens) in new_rows.items()]
+        )
+        stale = set(cached) - set(hashes.values())
+        conn.executemany(
+            "DELETE FROM caption_tokens WHERE caption_sha256 = ? AND tokenizer = ?",
+            [(sha256, tokenizer.name) for sha256 in stale]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    cached.update(new_rows)
+    return {filename: cached[sha256] for filename, sha256 in hashes.items()}, len(new_rows)
+
+
+def caption_stats(folder, tokenizer_name=DEFAULT_TOKENIZER, max_length=None, bin_size=DEFAULT_BIN_SIZE,
+                  top_k=DEFAULT_TOP_K, caption_dropout_rate=0.0):
+    """Length histogram, truncation and vocabulary of a dataset's captions"""
+    if bin_size <= 0:
+        raise ValueError(f"bin_size must be positive, got {bin_size}")
+    tokenizer, fallback = load_tokenizer(tokenizer_name)
+    max_length = int(max_length or tokenizer.max_length)
+    tokenized, newly_tokenized = tokenize_captions(folder, tokenizer)
+
+    conn = dataset_index.open_index(folder)
+    try:
+        image_count = conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+    finally:
+        conn.close()
+
+    counts = [count for count, _ in tokenized.values()]
+    histogram = {}
+    for count in sorted(counts):
+        start = count // bin_size * bin_size
+        label = f"{start}-{start + bin_size - 1}"
+        histogram[label] = histogram.get(label, 0) + 1
+
+    truncated = sorted(
+        ({"filename": filename, "token_count": count} for filename, (count, _) in tokenized.items()
+         if count > max_length),
+        key=lambda entry: (-entry["token_count"], entry["filename"])
+    )
+    vocabulary = Counter(
+        token for _, tokens in tokenized.values()
+        for token in map(_vocabulary_token, tokens) if token
+    )
+
+    return {
+        "tokenizer": tokenizer.name,
+        "tokenizer_fallback": fallback,
+        "max_length": max_length,
+        "image_count": image_count,
+        "captioned": len(counts),
+        "uncaptioned": image_count - len(counts),
+        "newly_tokenized": newly_tokenized,
+        "length_histogram": histogram,
+        "mean_length": round(statistics.fmean(counts), 2) if counts else 0.0,
+        "median_length": statistics.median(counts) if counts else 0,
+        "max_observed_length": max(counts, default=0),
+        "truncated_count": len(truncated),
+        "truncated": truncated,
+        "vocabulary_size": len(vocabulary),
+        "vocabulary": dict(vocabulary.most_common(top_k)),
+        # Captions replaced by an empty prompt per epoch at this caption_dropout_rate
+        "expected_dropped_per_epoch": round(len(counts) * float(caption_dropout_rate), 2)
+    }
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+✂️ Smart crop planning for bucketed variants
+Edge-energy crop boxes per image and bucket, computed on downscaled images and cached in the dataset index
+"""
+
+import numpy as np
+
+import dataset_index
+import dataset_prepare
+
+CROP_MODES = ("smart", "center")
+# Energy maps are computed on images downscaled to fit this box
+ANALYSIS_SIZE = 256
+# Share of the score given to a center prior, so low-detail images still crop centrally
+CENTER_WEIGHT = 0.25
+
+
+def energy_map(image):
+    """Gradient magnitude of a downscaled grayscale copy of image (float32, rows x cols)"""
+    from PIL import Image
+
+    small = image.convert("L")
+    small.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BILINEAR)
+    pixels = np.asarray(small, dtype=np.float32)
+    gradient_x = np.abs(np.diff(pixels, axis=1, append=pixels[:, -1:]))
+    gradient_y = np.abs(np.diff(pixels, axis=0, append=pixels[-1:, :]))
+    return gradient_x + gradient_y
+
+
+def best_window(profile, window):
+    """Start index of the window with the most energy along a 1-D profile, nudged toward the center"""
+    cumulative = np.concatenate(([0.0], np.cumsum(profile, dtype=np.float64)))
+    sums = cumulative[window:] - cumulative[:-window]
+    if len(sums) == 1:
+        return 0
+
+    positions = np.arange(len(sums))
+    center = (len(sums) - 1) / 2
+    prior = 1.0 - np.abs(positions - center) / center
+    peak = sums.max()
+    score = (sums / peak if peak > 0 else 0.0) * (1 - CENTER_WEIGHT) + prior * CENTER_WEIGHT
+    return int(np.argmax(score))
+
+
+def smart_crop_box(energy, width, height, bucket):
+    """Crop box of the bucket's aspect ratio (same size as center_crop_box) placed on the highest energy"""
+    left, top, right, bottom = dataset_prepare.center_crop_box(width, height, bucket)
+    crop_width, crop_height = right - left, bottom - top
+    if crop_width == width and crop_height == height:
+        return left, top, right, bottom
+
+    # Bucket crops only ever cut one axis
+    horizontal = crop_width < width
+    profile = energy.sum(axis=0) if horizontal else energy.sum(axis=1)
+    full, crop = (width, crop_width) if horizontal else (height, crop_height)
+    scale = len(profile) / full
+    window = min(len(profile), max(1, round(crop * scale)))
+    offset = min(round(best_window(profile, window) / scale), full - crop)
+
+    if horizontal:
+        return offset, 0, offset + crop_width, height
+    return 0, offset, width, offset + crop_height
+
+
+def smart_crop_boxes(image, buckets):
+    """{bucket name: box} for every bucket, from a single energy map"""
+    energy = energy_map(image)
+    return {
+        dataset_prepare.bucket_name(bucket): smart_crop_box(energy, image.width, image.height, bucket)
+        for bucket in buckets
+    }
+
+
+def load_boxes(folder, sha256s, upright):
+    """Cached boxes from the index: {sha256: {bucket name: box}}"""
+    boxes = {}
+    conn = dataset_index.open_index(folder)
+    try:
+        for row in conn.execute(
+            "SELECT sha256, bucket, left_px, top_px, right_px, bottom_px FROM crop_boxes WHERE upright = ?",
+            (int(upright),)
+        ):
+            if row["sha256"] in sha256s:
+                boxes.setdefault(row["sha256"], {})[row["bucket"]] = (
+                    row["left_px"], row["top_px"], row["right_px"], row["bottom_px"]
+                )
+    finally:
+        conn.close()
+    return boxes
+
+
+def store_boxes(folder, boxes, upright):
+    """Write {sha256: {bucket name: box}} to the index and drop boxes of images no longer indexed"""
+    conn = dataset_index.open_index(folder)
+    try:
+        conn.executemany(
+            "INSERT OR REPLACE INTO crop_boxes (sha256, bucket, upright, left_px, top_px, right_px, bottom_px) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(sha256, bucket, int(upright), *box)
+             for sha256, per_bucket in boxes.items() for bucket, box in per_bucket.items()]
+        )
+        conn.execute("DELETE FROM crop_boxes WHERE sha256 NOT IN (SELECT sha256 FROM images)")
+        conn.commit()
+    finally:
+        conn.close()
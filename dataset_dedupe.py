@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+👯 Near-duplicate detection for training datasets
+Perceptual hashes (dHash/pHash) cached in the dataset index, compared all-pairs with NumPy
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import dataset_index
+
+HASH_TYPES = ("phash", "dhash")
+# Hamming distance (out of 64 bits) at or below which two images count as near-duplicates
+DEFAULT_THRESHOLD = 6
+# Rows of the distance matrix computed at once: BLOCK_SIZE x n uint64 values
+BLOCK_SIZE = 1024
+
+PHASH_SIZE = 32
+_DCT_MATRIX = np.cos(
+    np.pi * (2 * np.arange(PHASH_SIZE)[None, :] + 1) * np.arange(PHASH_SIZE)[:, None] / (2 * PHASH_SIZE)
+)
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(gray):
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 thumbnail"""
+    from PIL import Image
+
+    pixels = np.asarray(gray.resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+    return np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes()
+
+
+def phash(gray):
+    """64-bit DCT hash: low 8x8 frequencies of a 32x32 thumbnail against their median"""
+    from PIL import Image
+
+    pixels = np.asarray(gray.resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.LANCZOS), dtype=np.float64)
+    low = (_DCT_MATRIX @ pixels @ _DCT_MATRIX.T)[:8, :8].flatten()
+    # The DC term only encodes overall brightness and would skew the median
+    return np.packbits(low > np.median(low[1:])).tobytes()
+
+
+def compute_hashes(path):
+    """(dhash, phash) bytes for one image; JPEGs are decoded in draft mode"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.draft("L", (PHASH_SIZE * 2, PHASH_SIZE * 2))
+        gray = image.convert("L")
+    return dhash(gray), phash(gray)
+
+
+def _hash_task(task):
+    sha256, path = task
+    try:
+        return sha256, compute_hashes(path), None
+    except Exception as e:
+        return sha256, None, f"{type(e).__name__}: {e}"
+
+
+def update_hashes(folder, max_workers=None):
+    """Hash every indexed image whose content has no stored hashes yet
+
+    Hashes are keyed by sha256, so renamed or re-uploaded files reuse them.
+    """
+    conn = dataset_index.open_index(folder)
+    try:
+        tasks = [
+            (row["sha256"], os.path.join(folder, row["filename"])) for row in conn.execute(
+                "SELECT images.sha256 AS sha256, MIN(images.filename) AS filename FROM images "
+                "LEFT JOIN image_hashes ON image_hashes.sha256 = images.sha256 "
+                "WHERE images.error IS NULL AND images.sha256 IS NOT NULL "
+                "AND image_hashes.sha256 IS NULL GROUP BY images.sha256"
+            )
+        ]
+
+        results = []
+        if tasks:
+            workers = max_workers or min(len(tasks), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_hash_task, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO image_hashes (sha256, dhash, phash) VALUES (?, ?, ?)",
+            [(sha256, hashes[0], hashes[1]) for sha256, hashes, error in results if hashes]
+        )
+        conn.execute("DELETE FROM image_hashes WHERE sha256 NOT IN (SELECT sha256 FROM images)")
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {
+        "hashed": sum(1 for _, hashes, _ in results if hashes),
+        "errors": [{"sha256": sha256, "error": error} for sha256, hashes, error in results if error]
+    }
+
+
+def load_hashes(folder):
+    """(filenames, dhash array, phash array) for every hashed image, as uint64"""
+    conn = dataset_index.open_index(folder)
+    try:
+        rows = conn.execute(
+            "SELECT images.filename, image_hashes.dhash, image_hashes.phash FROM images "
+            "JOIN image_hashes ON image_hashes.sha256 = images.sha256 ORDER BY images.filename"
+        ).fetchall()
+    finally:
+        conn.close()
+
+    filenames = [row["filename"] for row in rows]
+    dhashes = np.frombuffer(b"".join(row["dhash"] for row in rows), dtype=">u8").astype(np.uint64)
+    phashes = np.frombuffer(b"".join(row["phash"] for row in rows), dtype=">u8").astype(np.uint64)
+    return filenames, dhashes, phashes
+
+
+def popcount_lookup(values):
+    """Set bits per element of a uint64 array via a byte lookup table"""
+    as_bytes = np.ascontiguousarray(values).view(np.uint8).reshape(values.shape + (8,))
+    return _POPCOUNT_TABLE[as_bytes].sum(axis=-1, dtype=np.uint8)
+
+
+# NumPy >= 2.0 has a native popcount ufunc
+popcount = getattr(np, "bitwise_count", popcount_lookup)
+
+
+def near_duplicate_pairs(hashes, threshold=DEFAULT_THRESHOLD, block_size=BLOCK_SIZE):
+    """(i, j, distance) arrays for all pairs i < j within threshold
+
+    The upper triangle of the Hamming distance matrix is computed in row
+    blocks, so memory stays at block_size x n regardless of dataset size.
+    """
+    n = len(hashes)
+    found_i, found_j, found_distance = [], [], []
+    for start in range(0, n, block_size):
+        block = hashes[start:start + block_size]
+        distances = popcount(block[:, None] ^ hashes[None, start:])
+        rows, cols = np.nonzero(distances <= threshold)
+        upper = cols > rows
+        rows, cols = rows[upper], cols[upper]
+        found_i.append(rows + start)
+        found_j.append(cols + start)
+        found_distance.append(distances[rows, cols])
+
+    if not found_i:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.uint8)
+    return np.concatenate(found_i), np.concatenate(found_j), np.concatenate(found_distance)
+
+
+def _clusters(n, pairs_i, pairs_j):
+    """Connected components of the near-duplicate graph (union-find)"""
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j in zip(pairs_i.tolist(), pairs_j.tolist()):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    groups = {}
+    for i in set(pairs_i.tolist()) | set(pairs_j.tolist()):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+def dedupe_report(folder, hash_type="phash", threshold=DEFAULT_THRESHOLD, max_workers=None):
+    """Near-duplicate clusters of a training folder
+
+    Each cluster lists its images and every matching pair with both
+    dHash and pHash Hamming distances; hash_type picks which one decides.
+    """
+    if hash_type not in HASH_TYPES:
+        raise ValueError(f"Unknown hash_type: {hash_type} (expected one of {', '.join(HASH_TYPES)})")
+
+    start_time = time.time()
+    hashing = update_hashes(folder, max_workers=max_workers)
+    filenames, dhashes, phashes = load_hashes(folder)
+
+    compare_start = time.time()
+    hashes = phashes if hash_type == "phash" else dhashes
+    pairs_i, pairs_j, distances = near_duplicate_pairs(hashes, threshold)
+    dhash_distances = popcount(dhashes[pairs_i] ^ dhashes[pairs_j])
+    phash_distances = popcount(phashes[pairs_i] ^ phashes[pairs_j])
+    compare_ms = (time.time() - compare_start) * 1000
+
+    pair_lists = {}
+    for k, (i, j) in enumerate(zip(pairs_i.tolist(), pairs_j.tolist())):
+        pair_lists.setdefault(i, []).append({
+            "a": filenames[i],
+            "b": filenames[j],
+            "distance": int(distances[k]),
+            "dhash_distance": int(dhash_distances[k]),
+            "phash_distance": int(phash_distances[k])
+        })
+
+    clusters = []
+    for members in _clusters(len(filenames), pairs_i, pairs_j):
+        pairs = [pair for i in sorted(members) for pair in pair_lists.get(i, [])]
+        clusters.append({
+            "images": sorted(filenames[i] for i in members),
+            "pairs": pairs,
+            "max_distance": max(pair["distance"] for pair in pairs)
+        })
+    clusters.sort(key=lambda c: (-len(c["images"]), c["images"][0]))
+
+    return {
+        "hash_type": hash_type,
+        "threshold": threshold,
+        "image_count": len(filenames),
+        "hashed": hashing["hashed"],
+        "hash_errors": hashing["errors"],
+        "clusters": clusters,
+        "duplicate_images": sum(len(c["images"]) - 1 for c in clusters),
+        "compare_ms": round(compare_ms, 2),
+        "duration_seconds": round(time.time() - start_time, 3)
+    }
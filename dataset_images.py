@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+🖼️ Per-image checks for training datasets
+Cheap header-level validation at upload time, full decodes on request
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import dataset_prepare
+
+ALLOWED_FORMATS = ("JPEG", "MPO", "PNG", "WEBP", "BMP")
+MIN_IMAGE_SIDE = int(os.environ.get("MIN_IMAGE_SIDE", 256))
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", 64 * 1024 * 1024))
+
+VALIDATION_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+
+def is_image_file(filename):
+    return filename.lower().endswith(dataset_prepare.IMAGE_EXTENSIONS)
+
+
+def check_image(path, full_decode=False):
+    """Validate one image file
+
+    The default check parses the header (format, dimensions) and proves the
+    data is decodable as cheaply as the format allows: JPEGs are decoded in
+    draft mode at 1/8 scale, PNGs are CRC-verified without inflating pixels.
+    full_decode=True loads every pixel instead.
+    """
+    from PIL import Image
+
+    result = {"filename": os.path.basename(path), "valid": False}
+    try:
+        with Image.open(path) as image:
+            result.update(format=image.format, width=image.width, height=image.height, mode=image.mode)
+
+            if image.format not in ALLOWED_FORMATS:
+                result["error"] = f"Unsupported image format: {image.format}"
+                return result
+            if min(image.size) < MIN_IMAGE_SIDE:
+                result["error"] = f"Image too small: {image.width}x{image.height} (min side {MIN_IMAGE_SIDE})"
+                return result
+            if image.width * image.height > MAX_IMAGE_PIXELS:
+                result["error"] = f"Image too large: {image.width}x{image.height} (max {MAX_IMAGE_PIXELS} pixels)"
+                return result
+
+            if full_decode:
+                image.load()
+            elif image.format in ("JPEG", "MPO"):
+                image.draft("RGB", (max(1, image.width // 8), max(1, image.height // 8)))
+                image.load()
+            else:
+                image.verify()
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+
+    result["valid"] = True
+    return result
+
+
+def _check_full(path):
+    return check_image(path, full_decode=True)
+
+
+def validate_images(folder, filenames=None, full_decode=False, max_workers=None):
+    """Validate images in folder in parallel; returns one result per image
+
+    Header checks are I/O bound and run in threads; full decodes are CPU
+    bound and run in a process pool.
+    """
+    if filenames is None:
+        filenames = dataset_prepare.list_images(folder)
+    paths = [os.path.join(folder, name) for name in filenames if is_image_file(name)]
+    if not paths:
+        return []
+
+    if full_decode:
+        workers = max_workers or min(len(paths), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_check_full, paths, chunksize=max(1, len(paths) // (workers * 4))))
+
+    with ThreadPoolExecutor(max_workers=max_workers or VALIDATION_WORKERS) as pool:
+        return list(pool.map(check_image, paths))
+
+
+def remove_images(folder, filenames, caption_ext="txt"):
+    """Delete rejected images together with their caption sidecars"""
+    removed = []
+    for filename in filenames:
+        for name in (filename, f"{os.path.splitext(filename)[0]}.{caption_ext}"):
+            path = os.path.join(folder, name)
+            if os.path.isfile(path):
+                os.remove(path)
+                removed.append(name)
+    return removed
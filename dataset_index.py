@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+🗂️ Per-dataset SQLite index for training folders
+Image metadata gathered once at upload time, queried by dataset jobs
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import dataset_prepare
+
+INDEX_FILENAME = ".dataset_index.sqlite"
+SCHEMA_VERSION = 4
+
+# Aspect buckets are recorded at this reference resolution
+INDEX_BUCKET_RESOLUTION = 1024
+INDEX_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+EXIF_ORIENTATION_TAG = 0x0112
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    filename TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    width INTEGER,
+    height INTEGER,
+    mode TEXT,
+    format TEXT,
+    exif_orientation INTEGER,
+    caption TEXT,
+    caption_mtime_ns INTEGER,
+    bucket TEXT,
+    error TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_sha256 ON images (sha256);
+CREATE TABLE IF NOT EXISTS image_hashes (
+    sha256 TEXT PRIMARY KEY,
+    dhash BLOB NOT NULL,
+    phash BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS caption_tokens (
+    caption_sha256 TEXT NOT NULL,
+    tokenizer TEXT NOT NULL,
+    token_count INTEGER NOT NULL,
+    tokens TEXT NOT NULL,
+    PRIMARY KEY (caption_sha256, tokenizer)
+);
+CREATE TABLE IF NOT EXISTS crop_boxes (
+    sha256 TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    upright INTEGER NOT NULL,
+    left_px INTEGER NOT NULL,
+    top_px INTEGER NOT NULL,
+    right_px INTEGER NOT NULL,
+    bottom_px INTEGER NOT NULL,
+    PRIMARY KEY (sha256, bucket, upright)
+);
+"""
+
+
+def index_path(folder):
+    return os.path.join(folder, INDEX_FILENAME)
+
+
+def open_index(folder):
+    """Open (and create or migrate) the index of a training folder"""
+    conn = sqlite3.connect(index_path(folder), timeout=30)
+    conn.row_factory = sqlite3.Row
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        conn.executescript(SCHEMA)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    return conn
+
+
+def read_image_metadata(path):
+    """Header-only metadata: PIL parses the header and never decodes pixels here"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        try:
+            orientation = image.getexif().get(EXIF_ORIENTATION_TAG)
+        except Exception:
+            orientation = None
+        return {
+            "width": image.width,
+            "height": image.height,
+            "mode": image.mode,
+            "format": image.format,
+            "exif_orientation": orientation
+        }
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_caption(path):
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read().strip(), os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None, None
+
+
+def _caption_path(folder, filename, caption_ext):
+    return os.path.join(folder, f"{os.path.splitext(filename)[0]}.{caption_ext}")
+
+
+def _index_image(folder, filename, stat, known_sha256, caption_ext):
+    path = os.path.join(folder, filename)
+    row = {
+        "filename": filename,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": known_sha256 or _file_sha256(path),
+        "width": None, "height": None, "mode": None, "format": None,
+        "exif_orientation": None, "bucket": None, "error": None,
+        "indexed_at": time.time()
+    }
+    try:
+        row.update(read_image_metadata(path))
+        # Bucket follows the displayed orientation (EXIF 5-8 swap the axes)
+        width, height = row["width"], row["height"]
+        if row["exif_orientation"] in (5, 6, 7, 8):
+            width, height = height, width
+        row["bucket"] = dataset_prepare.bucket_name(
+            dataset_prepare.assign_bucket(width, height, INDEX_BUCKET_RESOLUTION)
+        )
+    except Exception as e:
+        row["error"] = str(e)
+
+    row["caption"], row["caption_mtime_ns"] = _read_caption(_caption_path(folder, filename, caption_ext))
+    return row
+
+
+def update_index(folder, known_hashes=None, caption_ext="txt", max_workers=INDEX_WORKERS):
+    """Bring the index in line with the folder contents
+
+    Only images whose size/mtime changed are re-read (sha256 from
+    known_hashes is reused when the upload already computed it); captions
+    are refreshed from their sidecars when the sidecar's mtime changed.
+    """
+    known_hashes = known_hashes or {}
+    conn = open_index(folder)
+    try:
+        indexed = {row["filename"]: row for row in conn.execute(
+            "SELECT filename, size, mtime_ns, caption_mtime_ns FROM images"
+        )}
+
+        stats = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if (entry.is_file() and not entry.name.startswith(".")
+                        and entry.name.lower().endswith(dataset_prepare.IMAGE_EXTENSIONS)):
+                    stats[entry.name] = entry.stat()
+
+        changed = [
+            name for name, stat in stats.items()
+            if name not in indexed
+            or (indexed[name]["size"], indexed[name]["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns)
+        ]
+        removed = sorted(set(indexed) - set(stats))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            rows = list(pool.map(
+                lambda name: _index_image(folder, name, stats[name], known_hashes.get(name), caption_ext),
+                changed
+            ))
+
+        captions_refreshed = 0
+        for name in set(stats) - set(changed):
+            caption_path = _caption_path(folder, name, caption_ext)
+            try:
+                caption_mtime = os.stat(caption_path).st_mtime_ns
+            except FileNotFoundError:
+                caption_mtime = None
+            if caption_mtime != indexed[name]["caption_mtime_ns"]:
+                caption, caption_mtime = _read_caption(caption_path)
+                conn.execute("UPDATE images SET caption = ?, caption_mtime_ns = ? WHERE filename = ?",
+                             (caption, caption_mtime, name))
+                captions_refreshed += 1
+
+        if rows:
+            columns = list(rows[0])
+            conn.executemany(
+                f"INSERT OR REPLACE INTO images ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                [tuple(row[c] for c in columns) for row in rows]
+            )
+        conn.executemany("DELETE FROM images WHERE filename = ?", [(name,) for name in removed])
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {
+        "indexed": len(rows),
+        "removed": removed,
+        "unchanged": len(stats) - len(changed),
+        "captions_refreshed": captions_refreshed
+    }
+
+
+def ensure_index(folder, caption_ext="txt"):
+    """Build the index on first use (datasets uploaded before indexing existed)"""
+    if not os.path.exists(index_path(folder)):
+        update_index(folder, caption_ext=caption_ext)
+
+
+def dataset_info(folder, resolutions=dataset_prepare.DEFAULT_RESOLUTIONS):
+    """Summary answered purely from the index"""
+    conn = open_index(folder)
+    try:
+        totals = conn.execute(
+            "SELECT COUNT(*) AS count, COALESCE(SUM(size), 0) AS bytes FROM images"
+        ).fetchone()
+
+        # Largest training resolution each image supports without upscaling
+        resolutions = sorted(int(r) for r in resolutions)
+        band = "CASE " + " ".join(
+            f"WHEN width * height >= {r * r} THEN '{r}'" for r in reversed(resolutions)
+        ) + f" ELSE 'below_{resolutions[0]}' END"
+        resolution_histogram = {f"below_{resolutions[0]}": 0, **{str(r): 0 for r in resolutions}}
+        for row in conn.execute(
+            f"SELECT {band} AS band, COUNT(*) AS count FROM images WHERE error IS NULL GROUP BY band"
+        ):
+            resolution_histogram[row["band"]] = row["count"]
+
+        bucket_histogram = {
+            row["bucket"]: row["count"] for row in conn.execute(
+                "SELECT bucket, COUNT(*) AS count FROM images WHERE bucket IS NOT NULL "
+                "GROUP BY bucket ORDER BY count DESC"
+            )
+        }
+        missing_captions = [row["filename"] for row in conn.execute(
+            "SELECT filename FROM images WHERE caption IS NULL OR caption = '' ORDER BY filename"
+        )]
+        exif_rotated = conn.execute(
+            "SELECT COUNT(*) FROM images WHERE exif_orientation > 1"
+        ).fetchone()[0]
+        modes = {row["mode"]: row["count"] for row in conn.execute(
+            "SELECT mode, COUNT(*) AS count FROM images WHERE mode IS NOT NULL GROUP BY mode"
+        )}
+        errors = [{"filename": row["filename"], "error": row["error"]} for row in conn.execute(
+            "SELECT filename, error FROM images WHERE error IS NOT NULL ORDER BY filename"
+        )]
+    finally:
+        conn.close()
+
+    return {
+        "image_count": totals["count"],
+        "total_bytes": totals["bytes"],
+        "resolution_histogram": resolution_histogram,
+        "bucket_histogram": bucket_histogram,
+        "missing_captions": missing_captions,
+        "exif_rotated": exif_rotated,
+        "modes": modes,
+        "unreadable": errors
+    }
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+🧊 Cross-run latent cache for cache_latents_to_disk
+Latents keyed by (image sha256, bucket, VAE identity), planned and linked without a GPU
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import struct
+
+import dataset_index
+import dataset_prepare
+
+# Folder ai-toolkit writes cache_latents_to_disk files into, next to the images
+LATENT_DIRNAME = "_latent_cache"
+LATENT_SUFFIX = ".safetensors"
+# Spatial downsampling of the SD/SDXL/FLUX VAEs: latent H, W = image H, W / 8
+VAE_SCALE_FACTOR = 8
+
+
+def vae_identity(name_or_path, vae_path=None, revision=None):
+    """Stable short id of the VAE that produced a latent"""
+    identity = json.dumps(
+        {"name_or_path": name_or_path, "vae_path": vae_path, "revision": revision}, sort_keys=True
+    )
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+
+
+def vae_identity_from_model(model_config):
+    """VAE id from the model section of an ai-toolkit process config"""
+    return vae_identity(
+        model_config.get("name_or_path"),
+        model_config.get("vae_path"),
+        model_config.get("revision")
+    )
+
+
+def latent_key(sha256, bucket, vae_id):
+    return f"{vae_id}/{sha256}_{dataset_prepare.bucket_name(bucket)}"
+
+
+def store_path(store_dir, sha256, bucket, vae_id):
+    return os.path.join(store_dir, vae_id, sha256[:2], f"{sha256}_{dataset_prepare.bucket_name(bucket)}{LATENT_SUFFIX}")
+
+
+def read_safetensors_header(path):
+    """Tensor metadata of a .safetensors file (8-byte length + JSON header; no tensor data is read)"""
+    with open(path, "rb") as f:
+        (length,) = struct.unpack("<Q", f.read(8))
+        return json.loads(f.read(length))
+
+
+def latent_bucket(path, scale=VAE_SCALE_FACTOR):
+    """(width, height) of the image a cached latent was encoded from"""
+    tensors = {name: info for name, info in read_safetensors_header(path).items() if name != "__metadata__"}
+    shape = max((info["shape"] for info in tensors.values()), key=len)
+    return shape[-1] * scale, shape[-2] * scale
+
+
+def _cache_stem(cache_name):
+    # ai-toolkit names cache files <image stem>_<settings hash>.safetensors
+    return cache_name[:-len(LATENT_SUFFIX)].rsplit("_", 1)[0]
+
+
+def _load_names(path):
+    try:
+        with open(path + ".json") as f:
+            return json.load(f)["cache_names"]
+    except (OSError, ValueError, KeyError):
+        return []
+
+
+def _save_names(path, names):
+    with open(path + ".json.tmp", "w") as f:
+        json.dump({"cache_names": sorted(set(names))}, f)
+    os.replace(path + ".json.tmp", path + ".json")
+
+
+def _images_by_stem(folder):
+    dataset_index.update_index(folder)
+    conn = dataset_index.open_index(folder)
+    try:
+        rows = conn.execute(
+            "SELECT filename, sha256, width, height, exif_orientation FROM images "
+            "WHERE error IS NULL ORDER BY filename"
+        ).fetchall()
+    finally:
+        conn.close()
+    by_stem = {}
+    for row in rows:
+        by_stem.setdefault(os.path.splitext(row["filename"])[0], []).append(dict(row))
+    return by_stem
+
+
+def harvest_latents(folder, store_dir, vae_id):
+    """Move latents a finished run computed in folder/_latent_cache into the shared store
+
+    Each file is matched to its image by stem, keyed by the image's sha256
+    and the bucket read from the latent's own shape, and replaced by a
+    symlink into the store. The ai-toolkit file name is recorded with it so
+    later runs can link it under the name the trainer will look up.
+    """
+    latent_dir = os.path.join(folder, LATENT_DIRNAME)
+    summary = {"harvested": 0, "already_stored": 0, "unmatched": []}
+    if not os.path.isdir(latent_dir):
+        return summary
+
+    by_stem = _images_by_stem(folder)
+    with os.scandir(latent_dir) as entries:
+        cache_files = sorted(
+            entry.name for entry in entries
+            if entry.name.endswith(LATENT_SUFFIX) and entry.is_file(follow_symlinks=False)
+        )
+
+    for cache_name in cache_files:
+        cache_path = os.path.join(latent_dir, cache_name)
+        images = by_stem.get(_cache_stem(cache_name), [])
+        if len(images) != 1:
+            # No image, or img.jpg and img.png sharing a stem: ambiguous
+            summary["unmatched"].append(cache_name)
+            continue
+        try:
+            bucket = latent_bucket(cache_path)
+        except (OSError, ValueError, KeyError, struct.error):
+            summary["unmatched"].append(cache_name)
+            continue
+
+        target = store_path(store_dir, images[0]["sha256"], bucket, vae_id)
+        if os.path.exists(target):
+            os.remove(cache_path)
+            summary["already_stored"] += 1
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(cache_path, target)
+            summary["harvested"] += 1
+        os.symlink(target, cache_path)
+        _save_names(target, _load_names(target) + [cache_name])
+
+    return summary
+
+
+def plan_latents(folder, store_dir, vae_id, resolutions=dataset_prepare.DEFAULT_RESOLUTIONS):
+    """Which (image, resolution) latents a run on folder can reuse from the store
+
+    Buckets follow dataset_prepare (displayed orientation, never upscaled),
+    so for a _prepared/<resolution> folder the bucket is the image size.
+    Status per entry: "linked" (already in folder/_latent_cache),
+    "reusable" (in the store), "missing" (the run will encode it).
+    """
+    latent_dir = os.path.join(folder, LATENT_DIRNAME)
+    entries = []
+    for stem, images in sorted(_images_by_stem(folder).items()):
+        for image in images:
+            width, height = image["width"], image["height"]
+            if image["exif_orientation"] in (5, 6, 7, 8):
+                width, height = height, width
+            for resolution in sorted({int(r) for r in resolutions}):
+                if width * height < resolution * resolution:
+                    continue
+                bucket = dataset_prepare.assign_bucket(width, height, resolution)
+                path = store_path(store_dir, image["sha256"], bucket, vae_id)
+                entry = {
+                    "filename": image["filename"],
+                    "sha256": image["sha256"],
+                    "resolution": resolution,
+                    "bucket": dataset_prepare.bucket_name(bucket),
+                    "key": latent_key(image["sha256"], bucket, vae_id),
+                    "status": "missing",
+                    "cache_name": None
+                }
+                if os.path.exists(path):
+                    names = [n for n in _load_names(path) if _cache_stem(n) == stem and len(images) == 1]
+                    entry["store_path"] = path
+                    entry["cache_name"] = names[0] if names else None
+                    linked = names and os.path.lexists(os.path.join(latent_dir, names[0]))
+                    entry["status"] = "linked" if linked else "reusable"
+                entries.append(entry)
+
+    counts = {status: sum(1 for e in entries if e["status"] == status) for status in ("linked", "reusable", "missing")}
+    return {
+        "vae_id": vae_id,
+        "total": len(entries),
+        **counts,
+        # Reusable latents recorded under another file name cannot be linked for the trainer
+        "unlinkable": sum(1 for e in entries if e["status"] == "reusable" and not e["cache_name"]),
+        "reuse_ratio": round((counts["linked"] + counts["reusable"]) / len(entries), 4) if entries else 0.0,
+        "entries": entries
+    }
+
+
+def link_latents(folder, plan):
+    """Symlink every reusable latent of plan into folder/_latent_cache"""
+    latent_dir = os.path.join(folder, LATENT_DIRNAME)
+    linked = []
+    for entry in plan["entries"]:
+        if entry["status"] != "reusable" or not entry["cache_name"]:
+            continue
+        os.makedirs(latent_dir, exist_ok=True)
+        link_path = os.path.join(latent_dir, entry["cache_name"])
+        if os.path.lexists(link_path):
+            os.remove(link_path)
+        os.symlink(entry["store_path"], link_path)
+        entry["status"] = "linked"
+        linked.append(entry["cache_name"])
+    return linked
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+🎨 Image normalization for training datasets
+EXIF transpose, sRGB/RGB conversion with alpha flattening, re-encoded once per content hash
+"""
+
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import dataset_index
+import dataset_upload
+
+NORMALIZE_QUALITY = 95
+# Transparent pixels are flattened onto white, the usual product-shot background
+BACKGROUND_COLOR = (255, 255, 255)
+NORMALIZED_EXT = ".jpg"
+
+
+def normalize_image(image, background=BACKGROUND_COLOR):
+    """Upright 8-bit sRGB copy of a PIL image
+
+    Applies the EXIF orientation, flattens alpha onto background and
+    converts embedded ICC profiles (Display P3, CMYK press profiles) to
+    sRGB when littleCMS is available, plain mode conversion otherwise.
+    """
+    from PIL import Image, ImageOps
+
+    icc_profile = image.info.get("icc_profile")
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode == "P":
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    if image.mode in ("RGBA", "LA", "PA", "La", "RGBa"):
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", rgba.size, background)
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    elif icc_profile and image.mode in ("RGB", "CMYK"):
+        try:
+            from PIL import ImageCms
+            image = ImageCms.profileToProfile(
+                image, ImageCms.ImageCmsProfile(io.BytesIO(icc_profile)), ImageCms.createProfile("sRGB"),
+                outputMode="RGB"
+            )
+        except Exception:
+            image = image.convert("RGB")
+
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def needs_normalization(path):
+    """False for files that are already upright, untagged RGB JPEGs (re-encoding would only lose quality)"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        try:
+            orientation = image.getexif().get(dataset_index.EXIF_ORIENTATION_TAG)
+        except Exception:
+            orientation = None
+        return not (
+            image.format == "JPEG" and image.mode == "RGB"
+            and orientation in (None, 1) and not image.info.get("icc_profile")
+        )
+
+
+def normalized_cache_path(cache_dir, sha256, quality=NORMALIZE_QUALITY):
+    return os.path.join(cache_dir, sha256[:2], f"{sha256}_q{quality}{NORMALIZED_EXT}")
+
+
+def normalize_to_cache(source_path, target_path, quality=NORMALIZE_QUALITY):
+    """Normalize one file into the cache (temp + rename, so readers never see partial files)"""
+    from PIL import Image
+
+    with Image.open(source_path) as image:
+        normalized = normalize_image(image)
+
+    directory, name = os.path.split(target_path)
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    normalized.save(temp_path, format="JPEG", quality=quality, subsampling=0 if quality >= 90 else 2)
+    os.replace(temp_path, target_path)
+
+
+def _normalize_task(task):
+    sha256, source_path, target_path, quality = task
+    try:
+        if not os.path.exists(target_path):
+            normalize_to_cache(source_path, target_path, quality)
+        return sha256, None
+    except Exception as e:
+        return sha256, f"{type(e).__name__}: {e}"
+
+
+def normalize_images(folder, cache_dir, filenames, quality=NORMALIZE_QUALITY, known_hashes=None, max_workers=None):
+    """Replace images in folder by their normalized JPEG, reusing cached results
+
+    Results are cached by source sha256 and quality, so an image is only
+    decoded and re-encoded the first time its content is seen. img.png
+    becomes img.jpg (its caption sidecar still matches); an image whose
+    new name is taken by another file is reported as an error and kept.
+    Returns (normalized entries, errors).
+    """
+    known_hashes = known_hashes or {}
+    tasks = {}
+    pending = []
+    for filename in filenames:
+        path = os.path.join(folder, filename)
+        if not needs_normalization(path):
+            continue
+        sha256 = known_hashes.get(filename) or dataset_upload.file_sha256(path)
+        pending.append((filename, sha256))
+        tasks.setdefault(sha256, (sha256, path, normalized_cache_path(cache_dir, sha256, quality), quality))
+
+    results = []
+    if len(tasks) == 1:
+        results = [_normalize_task(next(iter(tasks.values())))]
+    elif tasks:
+        workers = max_workers or min(len(tasks), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_normalize_task, tasks.values()))
+    failed = {sha256: error for sha256, error in results if error}
+
+    normalized = []
+    errors = []
+    for filename, sha256 in pending:
+        if sha256 in failed:
+            errors.append({"filename": filename, "error": failed[sha256]})
+            continue
+
+        new_name = os.path.splitext(filename)[0] + NORMALIZED_EXT
+        if new_name != filename and os.path.exists(os.path.join(folder, new_name)):
+            errors.append({"filename": filename, "error": f"Cannot normalize: {new_name} already exists"})
+            continue
+
+        digest = hashlib.sha256()
+        with open(normalized_cache_path(cache_dir, sha256, quality), "rb") as src, \
+                dataset_upload.atomic_open(os.path.join(folder, new_name), "wb") as dst:
+            size = dataset_upload.copy_limited(src, dst, dataset_upload.MAX_UPLOAD_FILE_BYTES, digest)
+        if new_name != filename:
+            os.remove(os.path.join(folder, filename))
+
+        normalized.append({
+            "filename": filename,
+            "normalized_filename": new_name,
+            "size": size,
+            "sha256": digest.hexdigest(),
+            "source_sha256": sha256
+        })
+
+    return normalized, errors
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+🪣 Dataset preparation for prepare_dataset
+Aspect-ratio bucketing and pre-resized variants per training resolution
+"""
+
+import json
+import math
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+IMAGE_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".webp": "WEBP", ".bmp": "BMP"}
+
+# Matches the resolution list in training.yaml
+DEFAULT_RESOLUTIONS = (512, 768, 1024, 1280)
+BUCKET_DIVISIBILITY = 64
+MAX_ASPECT_RATIO = 4.0
+JPEG_QUALITY = 95
+
+# Same naming convention as ai-toolkit's _latent_cache folder
+PREPARED_DIRNAME = "_prepared"
+STATE_FILENAME = "prepare_state.json"
+
+
+def list_images(folder):
+    """Sorted image filenames directly inside folder"""
+    with os.scandir(folder) as entries:
+        return sorted(
+            entry.name for entry in entries
+            if entry.is_file() and not entry.name.startswith(".")
+            and entry.name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+
+
+def bucket_sizes(resolution, divisibility=BUCKET_DIVISIBILITY, max_aspect=MAX_ASPECT_RATIO):
+    """All (width, height) buckets with area close to resolution² for one resolution"""
+    area = resolution * resolution
+    buckets = set()
+    width = divisibility
+    while width <= resolution * math.sqrt(max_aspect):
+        height = max(divisibility, int(area / width) // divisibility * divisibility)
+        if 1 / max_aspect <= width / height <= max_aspect:
+            buckets.add((width, height))
+        width += divisibility
+    return sorted(buckets)
+
+
+_BUCKET_CACHE = {}
+
+
+def assign_bucket(width, height, resolution, divisibility=BUCKET_DIVISIBILITY):
+    """Bucket (width, height) whose aspect ratio is closest to the image's"""
+    key = (resolution, divisibility)
+    if key not in _BUCKET_CACHE:
+        _BUCKET_CACHE[key] = bucket_sizes(resolution, divisibility)
+
+    log_aspect = math.log(width / height)
+    return min(_BUCKET_CACHE[key], key=lambda b: abs(math.log(b[0] / b[1]) - log_aspect))
+
+
+def bucket_name(bucket):
+    return f"{bucket[0]}x{bucket[1]}"
+
+
+def center_crop_box(width, height, bucket):
+    """Largest box of the bucket's aspect ratio centered in the image"""
+    target = bucket[0] / bucket[1]
+    if width / height > target:
+        crop_width = round(height * target)
+        left = (width - crop_width) // 2
+        return (left, 0, left + crop_width, height)
+    crop_height = round(width / target)
+    top = (height - crop_height) // 2
+    return (0, top, width, top + crop_height)
+
+
+def save_image(image, path, quality=JPEG_QUALITY):
+    """Save via a temp file + rename, keeping the format implied by path"""
+    directory, name = os.path.split(path)
+    image_format = IMAGE_FORMATS.get(os.path.splitext(name)[1].lower(), "PNG")
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    options = {"quality": quality} if image_format in ("JPEG", "WEBP") else {}
+    temp_path = os.path.join(directory, f".{name}.tmp")
+    image.save(temp_path, format=image_format, **options)
+    os.replace(temp_path, path)
+
+
+def _prepare_image(task):
+    """Process-pool worker: write one image's variants for every resolution"""
+    from PIL import Image
+
+    source_path, output_dir, resolutions, quality, normalize, crop, crop_boxes = task
+    filename = os.path.basename(source_path)
+    result = {"filename": filename, "variants": {}}
+    new_boxes = {}
+    try:
+        with Image.open(source_path) as image:
+            image.load()
+            if normalize:
+                import dataset_normalize
+                image = dataset_normalize.normalize_image(image)
+            width, height = image.size
+            result["width"], result["height"] = width, height
+
+            for resolution in resolutions:
+                if width * height < resolution * resolution:
+                    continue  # never upscale
+
+                bucket = assign_bucket(width, height, resolution)
+                if crop == "smart":
+                    if bucket_name(bucket) not in crop_boxes:
+                        import dataset_crops
+                        missing = [assign_bucket(width, height, r) for r in resolutions
+                                   if width * height >= r * r]
+                        new_boxes = dataset_crops.smart_crop_boxes(image, missing)
+                        crop_boxes = {**new_boxes, **crop_boxes}
+                    box = tuple(crop_boxes[bucket_name(bucket)])
+                else:
+                    box = center_crop_box(width, height, bucket)
+                variant = image.resize(bucket, Image.LANCZOS, box=box, reducing_gap=3.0)
+                save_image(variant, os.path.join(output_dir, str(resolution), filename), quality)
+                result["variants"][str(resolution)] = bucket_name(bucket)
+    except Exception as e:
+        result["error"] = str(e)
+    if new_boxes:
+        result["crop_boxes"] = new_boxes
+    return result
+
+
+def _fingerprint(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _load_state(output_dir):
+    try:
+        with open(os.path.join(output_dir, STATE_FILENAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(output_dir, state):
+    path = os.path.join(output_dir, STATE_FILENAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def _remove_variants(output_dir, filename, caption_name):
+    for resolution_dir in os.listdir(output_dir):
+        for name in (filename, caption_name):
+            path = os.path.join(output_dir, resolution_dir, name)
+            if os.path.isfile(path):
+                os.remove(path)
+
+
+def prepare_dataset(folder, resolutions=DEFAULT_RESOLUTIONS, quality=JPEG_QUALITY,
+                    caption_ext="txt", force=False, normalize=False, crop="smart", max_workers=None):
+    """Bucket every image in folder and write resized variants per resolution
+
+    Variants go to <folder>/_prepared/<resolution>/ together with a copy of
+    the caption sidecar. Images whose size/mtime fingerprint is unchanged
+    since the last run are skipped; changing resolutions or quality
+    rebuilds everything. Resizing runs in a process pool across all cores.
+    With normalize, variants are made from the upright, alpha-flattened
+    sRGB image (see dataset_normalize) instead of the raw pixels.
+    crop="smart" places each bucket's crop on the image's edge energy
+    instead of its center; the boxes are cached in the dataset index by
+    content hash (see dataset_crops).
+    """
+    # Imported here: dataset_crops imports this module
+    import dataset_crops
+
+    if crop not in dataset_crops.CROP_MODES:
+        raise ValueError(f"Unknown crop mode: {crop} (expected {' or '.join(dataset_crops.CROP_MODES)})")
+    start_time = time.time()
+    resolutions = sorted({int(r) for r in resolutions})
+    output_dir = os.path.join(folder, PREPARED_DIRNAME)
+    settings = {"resolutions": resolutions, "quality": quality, "divisibility": BUCKET_DIVISIBILITY}
+    if normalize:
+        settings["normalize"] = True
+    if crop != "center":
+        settings["crop"] = crop
+
+    state = _load_state(output_dir)
+    if force or state.get("settings") != settings:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        state = {}
+    for resolution in resolutions:
+        os.makedirs(os.path.join(output_dir, str(resolution)), exist_ok=True)
+
+    previous = state.get("images", {})
+    images = {}
+    pending = []
+    skipped = []
+    for filename in list_images(folder):
+        source_path = os.path.join(folder, filename)
+        entry = previous.get(filename)
+        fingerprint = _fingerprint(source_path)
+        if entry and entry.get("fingerprint") == fingerprint and "error" not in entry:
+            images[filename] = entry
+            skipped.append(filename)
+        else:
+            images[filename] = {"fingerprint": fingerprint}
+            pending.append(filename)
+
+    # Smart crops: boxes computed by earlier runs come from the index
+    hashes = {}
+    cached_boxes = {}
+    if crop == "smart" and pending:
+        import dataset_index
+        dataset_index.update_index(folder, caption_ext=caption_ext)
+        conn = dataset_index.open_index(folder)
+        try:
+            hashes = {row["filename"]: row["sha256"] for row in conn.execute("SELECT filename, sha256 FROM images")}
+        finally:
+            conn.close()
+        cached_boxes = dataset_crops.load_boxes(folder, {hashes.get(f) for f in pending}, upright=normalize)
+
+    tasks = [
+        (os.path.join(folder, filename), output_dir, resolutions, quality, normalize, crop,
+         cached_boxes.get(hashes.get(filename), {}))
+        for filename in pending
+    ]
+
+    removed = sorted(set(previous) - set(images))
+    for filename in removed:
+        _remove_variants(output_dir, filename, f"{os.path.splitext(filename)[0]}.{caption_ext}")
+
+    errors = []
+    if tasks:
+        workers = max_workers or min(len(tasks), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            for result in pool.map(_prepare_image, tasks, chunksize=chunksize):
+                filename = result.pop("filename")
+                new_boxes = result.pop("crop_boxes", None)
+                if new_boxes and hashes.get(filename):
+                    cached_boxes.setdefault(hashes[filename], {}).update(new_boxes)
+                images[filename].update(result)
+                if "error" in result:
+                    errors.append({"filename": filename, "error": result["error"]})
+        if crop == "smart":
+            dataset_crops.store_boxes(folder, cached_boxes, upright=normalize)
+
+    # Captions can change without the image changing (update_captions)
+    for filename, entry in images.items():
+        caption_name = f"{os.path.splitext(filename)[0]}.{caption_ext}"
+        caption_path = os.path.join(folder, caption_name)
+        caption_fingerprint = _fingerprint(caption_path)
+        if entry.get("caption") == caption_fingerprint:
+            continue
+        for resolution in entry.get("variants", {}):
+            target = os.path.join(output_dir, resolution, caption_name)
+            if caption_fingerprint:
+                shutil.copyfile(caption_path, target)
+            elif os.path.exists(target):
+                os.remove(target)
+        entry["caption"] = caption_fingerprint
+
+    _save_state(output_dir, {"settings": settings, "images": images})
+
+    histogram = {str(r): {} for r in resolutions}
+    for entry in images.values():
+        for resolution, bucket in entry.get("variants", {}).items():
+            histogram[resolution][bucket] = histogram[resolution].get(bucket, 0) + 1
+
+    return {
+        "processed": len(tasks) - len(errors),
+        "skipped": len(skipped),
+        "removed": removed,
+        "errors": errors,
+        "buckets": histogram,
+        "output_dir": output_dir,
+        "dataset_entries": [
+            {"folder_path": os.path.join(output_dir, str(r)), "caption_ext": caption_ext, "resolution": [r]}
+            for r in resolutions if histogram[str(r)]
+        ],
+        "duration_seconds": round(time.time() - start_time, 3)
+    }
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+📦 Packed dataset shards
+One file per training folder with an offset index, read via mmap without per-sample open()
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+
+import dataset_upload
+
+SHARD_MAGIC = b"RPSHARD1"
+SHARD_VERSION = 1
+SHARD_DIRNAME = "_shards"
+SHARD_SUFFIX = ".shard"
+
+# Layout: MAGIC | file data ... | JSON index | footer (index offset, index length, MAGIC)
+FOOTER = struct.Struct("<QQ8s")
+
+
+def shard_path(training_folder, resolution=None):
+    """Shard location for a training folder or one of its prepared resolutions"""
+    name = str(resolution) if resolution else "dataset"
+    return os.path.join(training_folder, SHARD_DIRNAME, f"{name}{SHARD_SUFFIX}")
+
+
+def _sort_key(name):
+    # Keep each image next to its caption so a sample is one contiguous range
+    stem, ext = os.path.splitext(name)
+    return stem, ext
+
+
+def list_shard_files(folder):
+    """Regular, non-hidden files directly inside folder, in shard order"""
+    with os.scandir(folder) as entries:
+        files = {
+            entry.name: entry.stat() for entry in entries
+            if entry.is_file() and not entry.name.startswith(".")
+            and not entry.name.endswith(dataset_upload.TEMP_SUFFIXES)
+        }
+    return [(name, files[name]) for name in sorted(files, key=_sort_key)]
+
+
+def read_shard_index(path):
+    """Index of a shard file without mapping its data"""
+    with open(path, "rb") as f:
+        f.seek(-FOOTER.size, os.SEEK_END)
+        index_offset, index_length, magic = FOOTER.unpack(f.read(FOOTER.size))
+        if magic != SHARD_MAGIC:
+            raise ValueError(f"Not a dataset shard: {path}")
+        f.seek(index_offset)
+        return json.loads(f.read(index_length))
+
+
+def _shard_up_to_date(path, files):
+    try:
+        index = read_shard_index(path)
+    except (OSError, ValueError):
+        return False
+    current = [[name, stat.st_size, stat.st_mtime_ns] for name, stat in files]
+    return [[e["name"], e["size"], e["mtime_ns"]] for e in index["files"]] == current
+
+
+def pack_folder(folder, path, force=False):
+    """Pack every file of folder into a single shard at path
+
+    The shard is rewritten only when a file was added, removed or changed
+    (size/mtime) since it was packed, unless force is set.
+    """
+    start_time = time.time()
+    files = list_shard_files(folder)
+    if not force and _shard_up_to_date(path, files):
+        index = read_shard_index(path)
+        return {
+            "shard_path": path,
+            "file_count": len(index["files"]),
+            "data_bytes": sum(e["size"] for e in index["files"]),
+            "shard_bytes": os.path.getsize(path),
+            "skipped": True,
+            "duration_seconds": round(time.time() - start_time, 3)
+        }
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entries = []
+    with dataset_upload.atomic_open(path, "wb") as shard:
+        shard.write(SHARD_MAGIC)
+        offset = len(SHARD_MAGIC)
+        for name, stat in files:
+            digest = hashlib.sha256()
+            size = 0
+            with open(os.path.join(folder, name), "rb") as src:
+                for chunk in iter(lambda: src.read(dataset_upload.COPY_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    shard.write(chunk)
+                    size += len(chunk)
+            entries.append({
+                "name": name,
+                "offset": offset,
+                "size": size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": digest.hexdigest()
+            })
+            offset += size
+
+        index = json.dumps({
+            "version": SHARD_VERSION,
+            "created_at": time.time(),
+            "files": entries
+        }).encode("utf-8")
+        shard.write(index)
+        shard.write(FOOTER.pack(offset, len(index), SHARD_MAGIC))
+    dataset_upload.fsync_directory(os.path.dirname(path))
+
+    return {
+        "shard_path": path,
+        "file_count": len(entries),
+        "data_bytes": offset - len(SHARD_MAGIC),
+        "shard_bytes": os.path.getsize(path),
+        "skipped": False,
+        "duration_seconds": round(time.time() - start_time, 3)
+    }
+
+
+class ShardReader:
+    """Memory-mapped read access to a shard
+
+    read() returns memoryview slices of the mapping, so sample bytes are
+    never copied; release those views before calling close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = read_shard_index(path)
+        self.files = {entry["name"]: entry for entry in self.index["files"]}
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.files)
+
+    def __contains__(self, name):
+        return name in self.files
+
+    def names(self):
+        return [entry["name"] for entry in self.index["files"]]
+
+    def read(self, name):
+        """Zero-copy view of one file's bytes"""
+        entry = self.files[name]
+        return memoryview(self._mmap)[entry["offset"]:entry["offset"] + entry["size"]]
+
+    def samples(self, caption_ext=dataset_upload.DEFAULT_CAPTION_EXT):
+        """Yield (image name, image view, caption text or None) per image"""
+        import dataset_prepare
+
+        for name in self.names():
+            if not name.lower().endswith(dataset_prepare.IMAGE_EXTENSIONS):
+                continue
+            caption_name = dataset_upload.caption_filename(name, caption_ext)
+            caption = None
+            if caption_name in self.files:
+                with self.read(caption_name) as view:
+                    caption = view.tobytes().decode("utf-8", errors="replace")
+            yield name, self.read(name), caption
+
+    def verify(self):
+        """Names of files whose bytes no longer match their recorded sha256"""
+        corrupted = []
+        for entry in self.index["files"]:
+            with self.read(entry["name"]) as view:
+                if hashlib.sha256(view).hexdigest() != entry["sha256"]:
+                    corrupted.append(entry["name"])
+        return corrupted
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+def unpack_shard(path, dest_dir, overwrite=False):
+    """Write a shard's files back into dest_dir
+
+    Existing files with the recorded size and sha256 are kept unless
+    overwrite is set. Every written file is checked against its sha256.
+    """
+    start_time = time.time()
+    os.makedirs(dest_dir, exist_ok=True)
+    unpacked = []
+    skipped = []
+    total_bytes = 0
+    with ShardReader(path) as reader:
+        for entry in reader.index["files"]:
+            name = entry["name"]
+            if dataset_upload.safe_member_name(name) != name:
+                raise dataset_upload.UploadError(f"Invalid file name in shard: {name!r}")
+
+            target = os.path.join(dest_dir, name)
+            # Size first, so only same-size files are hashed
+            if not overwrite and os.path.isfile(target) and os.path.getsize(target) == entry["size"] \
+                    and dataset_upload.file_sha256(target) == entry["sha256"]:
+                skipped.append(name)
+                continue
+
+            with reader.read(name) as view:
+                if hashlib.sha256(view).hexdigest() != entry["sha256"]:
+                    raise ValueError(f"Checksum mismatch in shard for {name}")
+                with dataset_upload.atomic_open(target, "wb") as f:
+                    f.write(view)
+            unpacked.append(name)
+            total_bytes += entry["size"]
+    dataset_upload.fsync_directory(dest_dir)
+
+    return {
+        "unpacked": unpacked,
+        "skipped": skipped,
+        "bytes": total_bytes,
+        "output_dir": dest_dir,
+        "duration_seconds": round(time.time() - start_time, 3)
+    }
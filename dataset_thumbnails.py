@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+🖼️ Thumbnail cache for dataset browsing
+Small WebP previews keyed by content hash, served in pages from the dataset index
+"""
+
+import base64
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import dataset_index
+
+THUMBNAIL_SIZE = 256
+THUMBNAIL_QUALITY = 80
+MIN_THUMBNAIL_SIZE = 32
+MAX_THUMBNAIL_SIZE = 1024
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def thumbnail_path(cache_dir, sha256, size=THUMBNAIL_SIZE):
+    """Cache location of one thumbnail; sharded by hash prefix to keep directories small"""
+    return os.path.join(cache_dir, sha256[:2], f"{sha256}_{size}.webp")
+
+
+def make_thumbnail(source_path, target_path, size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY):
+    """Write a WebP thumbnail fitting size x size, upright per EXIF; returns its (width, height)"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        # JPEGs decode straight at a reduced scale close to the target size
+        image.draft("RGB", (size, size))
+        thumbnail = ImageOps.exif_transpose(image)
+        thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+    has_alpha = thumbnail.mode in ("RGBA", "LA") or "transparency" in thumbnail.info
+    thumbnail = thumbnail.convert("RGBA" if has_alpha else "RGB")
+
+    directory, name = os.path.split(target_path)
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    thumbnail.save(temp_path, format="WEBP", quality=quality)
+    os.replace(temp_path, target_path)
+    return thumbnail.size
+
+
+def _thumbnail_task(task):
+    sha256, source_path, target_path, size, quality = task
+    try:
+        make_thumbnail(source_path, target_path, size, quality)
+        return sha256, None
+    except Exception as e:
+        return sha256, f"{type(e).__name__}: {e}"
+
+
+def generate_thumbnails(folder, cache_dir, filenames=None, size=THUMBNAIL_SIZE,
+                        quality=THUMBNAIL_QUALITY, max_workers=None):
+    """Create missing thumbnails for indexed images of folder (all, or only filenames)
+
+    Identical content is thumbnailed once, across files and datasets.
+    """
+    conn = dataset_index.open_index(folder)
+    try:
+        rows = conn.execute(
+            "SELECT filename, sha256 FROM images WHERE error IS NULL AND sha256 IS NOT NULL ORDER BY filename"
+        ).fetchall()
+    finally:
+        conn.close()
+
+    if filenames is not None:
+        wanted = set(filenames)
+        rows = [row for row in rows if row["filename"] in wanted]
+
+    tasks = {}
+    cached = 0
+    for row in rows:
+        target = thumbnail_path(cache_dir, row["sha256"], size)
+        if os.path.exists(target):
+            cached += 1
+        elif row["sha256"] not in tasks:
+            tasks[row["sha256"]] = (row["sha256"], os.path.join(folder, row["filename"]), target, size, quality)
+
+    results = []
+    if len(tasks) == 1:
+        results = [_thumbnail_task(next(iter(tasks.values())))]
+    elif tasks:
+        workers = max_workers or min(len(tasks), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_thumbnail_task, tasks.values(), chunksize=max(1, len(tasks) // (workers * 4))))
+
+    return {
+        "generated": sum(1 for _, error in results if error is None),
+        "cached": cached,
+        "errors": [{"sha256": sha256, "error": error} for sha256, error in results if error]
+    }
+
+
+def thumbnail_page(folder, cache_dir, page=1, page_size=DEFAULT_PAGE_SIZE,
+                   size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY):
+    """One page of base64 WebP thumbnails in filename order
+
+    Thumbnails missing from the cache (datasets uploaded before thumbnails
+    existed, or a new size) are generated for this page only.
+    """
+    page = max(1, int(page))
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+    conn = dataset_index.open_index(folder)
+    try:
+        total = conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+        rows = conn.execute(
+            "SELECT filename, sha256, width, height, caption, error FROM images "
+            "ORDER BY filename LIMIT ? OFFSET ?",
+            (page_size, (page - 1) * page_size)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    generation = generate_thumbnails(
+        folder, cache_dir, [row["filename"] for row in rows], size=size, quality=quality
+    )
+
+    thumbnails = []
+    for row in rows:
+        entry = {
+            "filename": row["filename"],
+            "sha256": row["sha256"],
+            "width": row["width"],
+            "height": row["height"],
+            "caption": row["caption"]
+        }
+        path = thumbnail_path(cache_dir, row["sha256"], size) if row["sha256"] else None
+        if row["error"] is None and path and os.path.exists(path):
+            with open(path, "rb") as f:
+                entry["content"] = base64.b64encode(f.read()).decode("ascii")
+            entry["format"] = "webp"
+        else:
+            entry["error"] = row["error"] or "Thumbnail unavailable"
+        thumbnails.append(entry)
+
+    return {
+        "page": page,
+        "page_size": page_size,
+        "total": total,
+        "pages": math.ceil(total / page_size),
+        "size": size,
+        "thumbnails": thumbnails,
+        "generated": generation["generated"],
+        "payload_bytes": sum(len(t.get("content", "")) for t in thumbnails)
+    }
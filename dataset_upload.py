@@ -0,0 +1,691 @@
+#!/usr/bin/env python3
+"""
+📦 Dataset upload helpers for upload_training_data
+Streaming base64 decoding and archive extraction into training folders
+"""
+
+import base64
+import contextlib
+import gzip
+import hashlib
+import io
+import json
+import os
+import stat
+import tarfile
+import threading
+import time
+import uuid
+import urllib.parse
+import urllib.request
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Upload limits (uncompressed bytes on disk)
+MAX_UPLOAD_FILE_BYTES = int(os.environ.get("MAX_UPLOAD_FILE_BYTES", 100 * 1024 * 1024))
+MAX_UPLOAD_TOTAL_BYTES = int(os.environ.get("MAX_UPLOAD_TOTAL_BYTES", 4 * 1024 * 1024 * 1024))
+MAX_ARCHIVE_MEMBERS = int(os.environ.get("MAX_ARCHIVE_MEMBERS", 20000))
+
+COPY_CHUNK_SIZE = 1024 * 1024
+BASE64_CHUNK_CHARS = 4 * 256 * 1024
+UPLOAD_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+
+# Remote fetch (files entries with "url" instead of "content")
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", 8))
+FETCH_RETRIES = int(os.environ.get("FETCH_RETRIES", 3))
+FETCH_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", 60))
+FETCH_RETRY_DELAY = 1.0
+ALLOW_FILE_URLS = os.environ.get("ALLOW_FILE_URLS", "").lower() in ("1", "true", "yes")
+
+# Per-file content encodings accepted by upload_training_data
+SUPPORTED_ENCODINGS = ("base64", "base64+gzip", "base64+zstd")
+
+# Commit manifest marking a training folder as completely written
+MANIFEST_NAME = ".dataset_manifest.json"
+TEMP_SUFFIXES = (".tmp", ".part")
+
+# Sidecar caption extension (matches caption_ext in training.yaml)
+DEFAULT_CAPTION_EXT = "txt"
+
+# Archive members that are never training data
+IGNORED_MEMBER_PREFIXES = ("__MACOSX/",)
+
+
+class UploadError(ValueError):
+    """Rejected upload (bad name, unsupported format or size limit exceeded)"""
+
+
+class Base64Reader(io.RawIOBase):
+    """Read-only stream that decodes a base64 string chunk by chunk"""
+
+    def __init__(self, content):
+        super().__init__()
+        if content.startswith("data:") and "," in content[:256]:
+            content = content.split(",", 1)[1]
+        if "\n" in content or "\r" in content or " " in content:
+            content = "".join(content.split())
+        self._content = content
+        self._pos = 0
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and self._pos < len(self._content):
+            chunk = self._content[self._pos:self._pos + BASE64_CHUNK_CHARS]
+            self._pos += len(chunk)
+            try:
+                self._buffer = base64.b64decode(chunk)
+            except ValueError as e:
+                raise UploadError(f"Invalid base64 content: {e}")
+
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def open_base64_stream(content):
+    """Buffered binary stream over base64 content"""
+    return io.BufferedReader(Base64Reader(content), buffer_size=COPY_CHUNK_SIZE)
+
+
+def open_zstd_stream(fileobj):
+    """Wrap a binary stream with a zstd decompressor (optional dependency)"""
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd.ZstdFile(fileobj, mode="rb")
+    except ImportError:
+        pass
+    try:
+        from backports import zstd
+        return zstd.ZstdFile(fileobj, mode="rb")
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(fileobj)
+    except ImportError:
+        raise UploadError("zstd support requires the 'zstandard' package")
+
+
+@contextlib.contextmanager
+def atomic_open(file_path, mode="wb"):
+    """Write to a hidden temp file next to file_path and rename it into place
+
+    The data is fsynced before the rename, so after a crash file_path holds
+    either the old or the new content, never a truncated mix. The directory
+    entry itself is made durable by the batched fsync in commit_dataset.
+    """
+    directory, name = os.path.split(file_path)
+    temp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(temp_path, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
+def partial_path(file_path):
+    """Hidden resumable download path for file_path"""
+    directory, name = os.path.split(file_path)
+    return os.path.join(directory, f".{name}.part")
+
+
+def fsync_directory(directory):
+    """Persist renames/unlinks in directory (no-op where unsupported)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def begin_dataset_write(dest_dir):
+    """Mark dest_dir as incomplete before modifying it
+
+    Removes the commit manifest and any temp files left behind by an
+    interrupted upload.
+    """
+    removed = False
+    with os.scandir(dest_dir) as entries:
+        for entry in entries:
+            if entry.name == MANIFEST_NAME or (entry.name.startswith(".") and entry.name.endswith(TEMP_SUFFIXES)):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(entry.path)
+                removed = True
+    if removed:
+        fsync_directory(dest_dir)
+
+
+def commit_dataset(dest_dir):
+    """Fsync dest_dir once and write the commit manifest listing its files
+
+    Only names and sizes are recorded (one stat per file), so committing
+    never re-reads image data.
+    """
+    fsync_directory(dest_dir)
+
+    files = {}
+    with os.scandir(dest_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            files[entry.name] = entry.stat().st_size
+
+    manifest = {
+        "complete": True,
+        "file_count": len(files),
+        "total_bytes": sum(files.values()),
+        "files": dict(sorted(files.items())),
+        "committed_at": time.time()
+    }
+    with atomic_open(os.path.join(dest_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f)
+    fsync_directory(dest_dir)
+    return manifest
+
+
+def read_manifest(dest_dir):
+    """Commit manifest of a training folder, or None if it is incomplete"""
+    try:
+        with open(os.path.join(dest_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("complete") else None
+
+
+def is_dataset_complete(dest_dir):
+    """O(1) integrity check: True once an upload into dest_dir was committed"""
+    return read_manifest(dest_dir) is not None
+
+
+def open_encoded_stream(content, encoding="base64"):
+    """Binary stream yielding the decoded (and decompressed) file bytes"""
+    if encoding not in SUPPORTED_ENCODINGS:
+        raise UploadError(f"Unsupported encoding: {encoding} (supported: {', '.join(SUPPORTED_ENCODINGS)})")
+
+    stream = open_base64_stream(content)
+    if encoding == "base64+gzip":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if encoding == "base64+zstd":
+        return open_zstd_stream(stream)
+    return stream
+
+
+def safe_dataset_name(name):
+    """Validate a training folder name (single path component)"""
+    if not name or name in (".", "..") or "/" in name or "\\" in name or "\0" in name:
+        raise UploadError(f"Invalid training name: {name!r}")
+    return name
+
+
+def safe_member_name(name):
+    """Map an uploaded or archived path to a flat filename inside the training folder
+
+    Returns None for entries that should be skipped (directories, OS junk,
+    hidden files) and raises UploadError on path traversal attempts.
+    """
+    if not name or "\0" in name:
+        raise UploadError(f"Invalid file name: {name!r}")
+
+    normalized = name.replace("\\", "/")
+    if normalized.startswith("/") or (len(normalized) > 1 and normalized[1] == ":"):
+        raise UploadError(f"Absolute path not allowed: {name}")
+
+    parts = [part for part in normalized.split("/") if part not in ("", ".")]
+    if ".." in parts:
+        raise UploadError(f"Path traversal not allowed: {name}")
+    if not parts or normalized.endswith("/"):
+        return None
+    if normalized.startswith(IGNORED_MEMBER_PREFIXES) or parts[-1].startswith("."):
+        return None
+
+    return parts[-1]
+
+
+class ByteBudget:
+    """Total upload size shared by parallel writers
+
+    Every writer charges the bytes it is about to write, so the upload fails
+    as soon as the total goes over the limit instead of after every file is
+    on disk. Once exceeded, every later charge fails too.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+        self._files = {}
+
+    def _check(self):
+        if self.used > self.limit:
+            raise UploadError(f"Upload exceeds total size limit of {self.limit} bytes")
+
+    def charge(self, size):
+        with self._lock:
+            self.used += size
+            self._check()
+
+    def charge_file(self, key, size):
+        """Charge a file that has grown to size bytes; bytes charged for key before count
+
+        Download retries rewrite or resume the same part file, so only its
+        growth past what was already charged is new.
+        """
+        with self._lock:
+            self.used += max(0, size - self._files.get(key, 0))
+            self._files[key] = max(size, self._files.get(key, 0))
+            self._check()
+
+    def fits_file(self, key, size):
+        """Whether key can grow to size bytes without going over the limit"""
+        with self._lock:
+            return self.used + max(0, size - self._files.get(key, 0)) <= self.limit
+
+
+def copy_limited(src, dst, limit, digest=None, budget=None):
+    """Copy src to dst in chunks, failing as soon as more than limit bytes arrive
+
+    If digest (a hashlib object) is given it is fed the copied bytes, so the
+    content hash comes for free without re-reading the file. Chunks are also
+    charged to budget (a ByteBudget) when one is given.
+    """
+    written = 0
+    while True:
+        chunk = src.read(COPY_CHUNK_SIZE)
+        if not chunk:
+            return written
+        written += len(chunk)
+        if written > limit:
+            raise UploadError(f"File exceeds size limit of {limit} bytes")
+        if budget is not None:
+            budget.charge(len(chunk))
+        if digest is not None:
+            digest.update(chunk)
+        dst.write(chunk)
+
+
+def write_encoded_file(content, file_path, encoding="base64", max_file_bytes=MAX_UPLOAD_FILE_BYTES,
+                       digest=None, budget=None):
+    """Decode content straight to disk; returns decompressed bytes written
+
+    The size limits apply to the decompressed output, so a compression bomb
+    is rejected after at most max_file_bytes (or what is left of budget) have
+    been inflated.
+    """
+    try:
+        with atomic_open(file_path) as f:
+            return copy_limited(open_encoded_stream(content, encoding), f, max_file_bytes, digest, budget)
+    except (gzip.BadGzipFile, EOFError, zlib.error) as e:
+        raise UploadError(f"Corrupted {encoding} content for {os.path.basename(file_path)}: {e}")
+
+
+def _url_scheme(url):
+    scheme = urllib.parse.urlsplit(url).scheme.lower()
+    if scheme in ("http", "https") or (scheme == "file" and ALLOW_FILE_URLS):
+        return scheme
+    raise UploadError(f"Unsupported URL scheme: {url}")
+
+
+def create_fetch_session(pool_size=FETCH_WORKERS):
+    """requests session with a connection pool sized for concurrent fetches"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _download_attempt(session, url, part_path, max_file_bytes, budget=None):
+    """One GET into part_path, resuming from its current size with a Range header
+
+    The part file is charged to budget (keyed by its path) as it grows.
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    with session.get(url, headers=headers, stream=True, timeout=FETCH_TIMEOUT) as response:
+        if response.status_code == 416 and offset:
+            if budget is not None:
+                budget.charge_file(part_path, offset)
+            return offset  # part file already holds the whole body
+        response.raise_for_status()
+        if response.status_code != 206:
+            offset = 0  # server ignored the Range header, start over
+
+        # Refuse up front what the announced length already rules out
+        length = response.headers.get("Content-Length")
+        if length and length.isdigit():
+            if offset + int(length) > max_file_bytes:
+                raise UploadError(f"File exceeds size limit of {max_file_bytes} bytes: {url}")
+            if budget is not None and not budget.fits_file(part_path, offset + int(length)):
+                raise UploadError(f"Upload exceeds total size limit of {budget.limit} bytes: {url}")
+
+        with open(part_path, "ab" if offset else "wb") as f:
+            written = offset
+            for chunk in response.iter_content(COPY_CHUNK_SIZE):
+                written += len(chunk)
+                if written > max_file_bytes:
+                    raise UploadError(f"File exceeds size limit of {max_file_bytes} bytes: {url}")
+                if budget is not None:
+                    budget.charge_file(part_path, written)
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+    return written
+
+
+def fetch_url_to_file(session, url, file_path, expected_sha256=None,
+                      max_file_bytes=MAX_UPLOAD_FILE_BYTES, retries=FETCH_RETRIES, budget=None):
+    """Download url to file_path with retries, Range resume and checksum check
+
+    Returns (bytes written, sha256 hex digest). Interrupted transfers are
+    resumed from the partial file instead of starting over; 4xx responses
+    are not retried. The bytes of the finished file are charged to budget
+    (a ByteBudget) as they are streamed.
+    """
+    if _url_scheme(url) == "file":
+        source_path = urllib.request.url2pathname(urllib.parse.urlsplit(url).path)
+        sha256 = file_sha256(source_path)
+        if expected_sha256 and sha256 != expected_sha256.lower():
+            raise UploadError(f"Checksum mismatch for {url}")
+        with open(source_path, "rb") as src:
+            with atomic_open(file_path) as dst:
+                size = copy_limited(src, dst, max_file_bytes, budget=budget)
+    else:
+        import requests
+
+        part_path = partial_path(file_path)
+        for attempt in range(retries + 1):
+            try:
+                size = _download_attempt(session, url, part_path, max_file_bytes, budget)
+                break
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == retries:
+                    raise UploadError(f"Download failed after {retries + 1} attempts: {url}: {e}")
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if attempt == retries or (status is not None and status < 500 and status != 429):
+                    raise UploadError(f"Download failed: {url}: {e}")
+            time.sleep(FETCH_RETRY_DELAY * (2 ** attempt))
+        # Checked before the rename so a bad download never replaces an existing file
+        sha256 = file_sha256(part_path)
+        if expected_sha256 and sha256 != expected_sha256.lower():
+            os.remove(part_path)
+            raise UploadError(f"Checksum mismatch for {url}")
+        os.replace(part_path, file_path)
+    return size, sha256
+
+
+def caption_filename(filename, caption_ext=DEFAULT_CAPTION_EXT):
+    """Sidecar caption name for an image: img.jpg -> img.txt"""
+    return f"{os.path.splitext(filename)[0]}.{caption_ext.lstrip('.')}"
+
+
+def write_caption(file_path, caption):
+    """Write caption text as UTF-8; returns bytes written"""
+    data = caption.strip().encode("utf-8")
+    with atomic_open(file_path) as f:
+        f.write(data)
+    return len(data)
+
+
+def write_uploaded_files(files_data, dest_dir,
+                         max_file_bytes=MAX_UPLOAD_FILE_BYTES,
+                         max_total_bytes=MAX_UPLOAD_TOTAL_BYTES,
+                         caption_ext=DEFAULT_CAPTION_EXT):
+    """Write upload_training_data 'files' entries into dest_dir in parallel
+
+    Each entry is {filename, content, encoding?} or {filename, url, sha256?},
+    optionally with a "caption" that is written as a <basename>.<caption_ext>
+    sidecar in the same pass. Entries without a filename or data are skipped.
+    URL entries are fetched through one pooled HTTP session. On any error the
+    files written so far are removed.
+    """
+    jobs = []
+    seen = set()
+
+    def claim(name):
+        if name in seen:
+            raise UploadError(f"Duplicate file name in upload: {name}")
+        seen.add(name)
+
+    for file_info in files_data:
+        filename = safe_member_name(file_info.get("filename") or "")
+        content = file_info.get("content")
+        url = file_info.get("url")
+        if not filename or not (content or url):
+            continue
+        claim(filename)
+
+        caption = file_info.get("caption")
+        if caption and caption.strip():
+            sidecar = caption_filename(filename, caption_ext)
+            claim(sidecar)
+            jobs.append({"filename": sidecar, "caption": caption, "caption_for": filename})
+
+        if url:
+            _url_scheme(url)
+            jobs.append({"filename": filename, "url": url, "sha256": file_info.get("sha256")})
+            continue
+
+        encoding = file_info.get("encoding") or "base64"
+        if encoding not in SUPPORTED_ENCODINGS:
+            raise UploadError(f"Unsupported encoding for {filename}: {encoding}")
+        jobs.append({"filename": filename, "content": content, "encoding": encoding})
+
+    session = None
+    if any("url" in job for job in jobs):
+        session = create_fetch_session()
+    budget = ByteBudget(max_total_bytes)
+
+    def write_one(job):
+        file_path = os.path.join(dest_dir, job["filename"])
+        if "caption" in job:
+            budget.charge(len(job["caption"].strip().encode("utf-8")))
+            size = write_caption(file_path, job["caption"])
+            return {"filename": job["filename"], "path": file_path, "size": size,
+                    "caption_for": job["caption_for"]}
+        if "url" in job:
+            size, sha256 = fetch_url_to_file(session, job["url"], file_path, job["sha256"], max_file_bytes,
+                                             budget=budget)
+            return {"filename": job["filename"], "path": file_path, "size": size, "sha256": sha256,
+                    "url": job["url"]}
+
+        digest = hashlib.sha256()
+        size = write_encoded_file(job["content"], file_path, job["encoding"], max_file_bytes, digest, budget)
+        return {"filename": job["filename"], "path": file_path, "size": size, "sha256": digest.hexdigest(),
+                "encoding": job["encoding"]}
+
+    written = []
+    errors = []
+    try:
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS if session else UPLOAD_WORKERS) as pool:
+            futures = [pool.submit(write_one, job) for job in jobs]
+            for job, future in zip(jobs, futures):
+                try:
+                    written.append(future.result())
+                except Exception as e:
+                    errors.append(e)
+                    # A failed job never replaced its target (atomic_open / .part rename), so
+                    # only its resumable partial is removed; an earlier upload's copy stays
+                    written.append({"path": partial_path(os.path.join(dest_dir, job["filename"]))})
+    finally:
+        if session:
+            session.close()
+
+    if errors:
+        _remove_files(written)
+        raise errors[0]
+
+    return written
+
+
+def update_captions(captions, dest_dir, caption_ext=DEFAULT_CAPTION_EXT):
+    """Rewrite caption sidecars for images already in dest_dir
+
+    captions is a list of {filename, caption} or a {filename: caption} dict.
+    Images are never opened; an empty caption removes the sidecar.
+    Returns (updated entries, filenames whose image does not exist).
+    """
+    if isinstance(captions, dict):
+        captions = [{"filename": name, "caption": text} for name, text in captions.items()]
+
+    jobs = []
+    missing = []
+    for entry in captions:
+        filename = safe_member_name(entry.get("filename") or "")
+        if not filename:
+            continue
+        if not os.path.isfile(os.path.join(dest_dir, filename)):
+            missing.append(filename)
+            continue
+        jobs.append((filename, entry.get("caption") or ""))
+
+    def write_one(job):
+        filename, caption = job
+        file_path = os.path.join(dest_dir, caption_filename(filename, caption_ext))
+        if not caption.strip():
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            return {"filename": os.path.basename(file_path), "caption_for": filename, "removed": True}
+        size = write_caption(file_path, caption)
+        return {"filename": os.path.basename(file_path), "path": file_path, "size": size,
+                "caption_for": filename}
+
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+        updated = list(pool.map(write_one, jobs))
+    return updated, missing
+
+
+def detect_archive_format(filename):
+    """Return 'zip', 'tar', 'tar.gz' or 'tar.zst' from an archive filename"""
+    lowered = (filename or "").lower()
+    if lowered.endswith(".zip"):
+        return "zip"
+    if lowered.endswith((".tar.gz", ".tgz")):
+        return "tar.gz"
+    if lowered.endswith((".tar.zst", ".tar.zstd", ".tzst")):
+        return "tar.zst"
+    if lowered.endswith(".tar"):
+        return "tar"
+    raise UploadError(f"Unsupported archive format: {filename}")
+
+
+def _iter_zip_members(content):
+    """Yield (name, stream) for regular files in a zip archive"""
+    # zip keeps its central directory at the end, so the compressed bytes
+    # have to be addressable; members are still decompressed as streams.
+    archive_bytes = io.BytesIO(open_base64_stream(content).read())
+    try:
+        archive = zipfile.ZipFile(archive_bytes)
+    except zipfile.BadZipFile as e:
+        raise UploadError(f"Invalid zip archive: {e}")
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            if stat.S_ISLNK(info.external_attr >> 16):
+                raise UploadError(f"Symlinks not allowed in archive: {info.filename}")
+            with archive.open(info) as member:
+                yield info.filename, member
+
+
+def _iter_tar_members(content, archive_format):
+    """Yield (name, stream) for regular files in a tar archive, read sequentially"""
+    stream = open_base64_stream(content)
+    if archive_format == "tar.zst":
+        stream = open_zstd_stream(stream)
+    mode = "r|gz" if archive_format == "tar.gz" else "r|"
+
+    with tarfile.open(fileobj=stream, mode=mode) as archive:
+        for member in archive:
+            if member.isdir():
+                continue
+            if not member.isfile():
+                raise UploadError(f"Only regular files allowed in archive: {member.name}")
+            yield member.name, archive.extractfile(member)
+
+
+def extract_archive(content, archive_name, dest_dir,
+                    max_file_bytes=MAX_UPLOAD_FILE_BYTES,
+                    max_total_bytes=MAX_UPLOAD_TOTAL_BYTES,
+                    max_members=MAX_ARCHIVE_MEMBERS):
+    """Stream a base64 zip/tar archive into dest_dir as flat files
+
+    Members are copied chunk by chunk, so only the compressed archive is ever
+    held in memory. On any error the files written so far are removed.
+    """
+    archive_format = detect_archive_format(archive_name)
+    if archive_format == "zip":
+        members = _iter_zip_members(content)
+    else:
+        members = _iter_tar_members(content, archive_format)
+
+    extracted = []
+    seen = set()
+    total = 0
+    try:
+        for count, (member_name, stream) in enumerate(members, start=1):
+            if count > max_members:
+                raise UploadError(f"Archive has more than {max_members} files")
+
+            filename = safe_member_name(member_name)
+            if filename is None:
+                continue
+            if filename in seen:
+                raise UploadError(f"Duplicate file name in archive: {filename}")
+            seen.add(filename)
+
+            file_path = os.path.join(dest_dir, filename)
+            limit = min(max_file_bytes, max_total_bytes - total)
+            digest = hashlib.sha256()
+            with atomic_open(file_path) as f:
+                size = copy_limited(stream, f, limit, digest)
+            extracted.append({"filename": filename, "path": file_path, "size": size,
+                              "sha256": digest.hexdigest()})
+
+            total += size
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError, OSError) as e:
+        _remove_files(extracted)
+        raise UploadError(f"Archive extraction failed for {archive_name}: {e}")
+    except Exception:
+        _remove_files(extracted)
+        raise
+
+    return extracted
+
+
+def _remove_files(entries):
+    for entry in entries:
+        try:
+            os.remove(entry["path"])
+        except OSError:
+            pass
+
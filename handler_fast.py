@@ -18,6 +18,22 @@ from typing import Dict, Any
 ENVIRONMENT_READY = False
 SETUP_LOCK = False
 
+# Workspace layout
+WORKSPACE_PATH = os.environ.get("WORKSPACE_PATH", "/workspace")
+TRAINING_DATA_DIR = os.path.join(WORKSPACE_PATH, "training_data")
+THUMBNAIL_CACHE_DIR = os.path.join(WORKSPACE_PATH, "cache", "thumbnails")
+NORMALIZE_CACHE_DIR = os.path.join(WORKSPACE_PATH, "cache", "normalized")
+LATENT_CACHE_DIR = os.path.join(WORKSPACE_PATH, "cache", "latents")
+AI_TOOLKIT_PATH = os.path.join(WORKSPACE_PATH, "ai-toolkit")
+TRAINING_RUNS_DIR = os.path.join(WORKSPACE_PATH, "training_runs")
+BASE_CONFIG_DIR = os.path.join(WORKSPACE_PATH, "cache", "configs")
+
+# Training runs launched by this worker and the queue in front of them (created on first use)
+PROCESS_MANAGER = None
+TRAINING_SCHEDULER = None
+TRAINING_WATCHDOG = None
+BASE_CONFIG_STORE = None
+
 def log(message, level="INFO"):
     """Unified logging to stdout and stderr for RunPod visibility"""
     timestamp = datetime.now().strftime("%H:%M:%S")
@@ -230,8 +246,13 @@ def handler(job):
         # Heavy operations require environment setup
         heavy_operations = [
             "upload_training_data", "load_matt_dataset", 
-            "train", "train_with_yaml", "process_status", 
-            "processes", "list_models", "download_model",
+            "update_captions", "prepare_dataset", "dataset_info", "validate_dataset",
+            "dataset_dedupe_report", "dataset_shard", "dataset_thumbnails", "latent_cache",
+            "caption_stats",
+            "train", "train_with_yaml", "register_base_config", "train_sweep", "sweep_status",
+            "process_status", 
+            "processes", "process_logs", "cancel_training", "force_kill", "cleanup_stuck",
+            "list_models", "download_model",
             "generate", "inference"
         ]
         
@@ -257,18 +278,7 @@ def handler(job):
                     "timestamp": datetime.now().isoformat()
                 }
             
-            # For now, return placeholder for heavy operations
-            result = {
-                "status": "success",
-                "message": f"Heavy operation {job_type} would be processed here",
-                "job_type": job_type,
-                "environment_ready": ENVIRONMENT_READY,
-                "timestamp": datetime.now().isoformat(),
-                "note": "Heavy operations implementation in progress"
-            }
-            
-            log(f"✅ Heavy operation {job_type} placeholder completed", "INFO")
-            return result
+            return handle_heavy_operation(job_type, job_input, heavy_modules)
         
         # Unknown job type
         log(f"⚠️ Unknown job type: {job_type}", "WARN")
@@ -289,6 +299,1108 @@ def handler(job):
             "handler_type": "ultra-fast"
         }
 
+def resolve_training_folder(job_input):
+    """Existing training folder for job_input["training_name"] -> (path, error response)"""
+    import dataset_upload
+    
+    training_name = job_input.get("training_name")
+    if not training_name:
+        return None, {"status": "error", "error": "Missing training_name"}
+    
+    training_folder = os.path.join(TRAINING_DATA_DIR, dataset_upload.safe_dataset_name(training_name))
+    if not os.path.isdir(training_folder):
+        return None, {"status": "error", "error": f"Training data not found: {training_name}"}
+    return training_folder, None
+
+def handle_heavy_operation(job_type, job_input, modules):
+    """Route heavy operations to their implementations"""
+    try:
+        if job_type == "upload_training_data":
+            return handle_upload_training_data(job_input, modules)
+        elif job_type == "update_captions":
+            return handle_update_captions(job_input, modules)
+        elif job_type == "prepare_dataset":
+            return handle_prepare_dataset(job_input, modules)
+        elif job_type == "dataset_info":
+            return handle_dataset_info(job_input, modules)
+        elif job_type == "validate_dataset":
+            return handle_validate_dataset(job_input, modules)
+        elif job_type == "dataset_dedupe_report":
+            return handle_dataset_dedupe_report(job_input, modules)
+        elif job_type == "dataset_shard":
+            return handle_dataset_shard(job_input, modules)
+        elif job_type == "dataset_thumbnails":
+            return handle_dataset_thumbnails(job_input, modules)
+        elif job_type == "latent_cache":
+            return handle_latent_cache(job_input, modules)
+        elif job_type == "caption_stats":
+            return handle_caption_stats(job_input, modules)
+        elif job_type == "train_with_yaml":
+            return handle_train_with_yaml(job_input, modules)
+        elif job_type == "register_base_config":
+            return handle_register_base_config(job_input, modules)
+        elif job_type == "train_sweep":
+            return handle_train_sweep(job_input, modules)
+        elif job_type == "sweep_status":
+            return handle_sweep_status(job_input, modules)
+        elif job_type == "process_status":
+            return handle_process_status(job_input, modules)
+        elif job_type == "processes":
+            return handle_processes(job_input, modules)
+        elif job_type == "process_logs":
+            return handle_process_logs(job_input, modules)
+        elif job_type == "cancel_training":
+            return handle_cancel_training(job_input, modules)
+        elif job_type == "force_kill":
+            return handle_force_kill(job_input, modules)
+        elif job_type == "cleanup_stuck":
+            return handle_cleanup_stuck(job_input, modules)
+        
+        # For now, return placeholder for remaining heavy operations
+        result = {
+            "status": "success",
+            "message": f"Heavy operation {job_type} would be processed here",
+            "job_type": job_type,
+            "environment_ready": ENVIRONMENT_READY,
+            "timestamp": datetime.now().isoformat(),
+            "note": "Heavy operations implementation in progress"
+        }
+        
+        log(f"✅ Heavy operation {job_type} placeholder completed", "INFO")
+        return result
+        
+    except Exception as e:
+        log(f"❌ Heavy operation {job_type} failed: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Heavy operation error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_upload_training_data(job_input, modules):
+    """Write uploaded files and/or a single zip/tar archive into the training folder
+    
+    Each file entry may set "encoding" to base64 (default), base64+gzip or base64+zstd,
+    or give a "url" (plus optional "sha256") to be fetched by the worker instead.
+    A "caption" on an entry is written as a <basename>.txt sidecar.
+    Images are validated from their headers (set "full_validation" to decode every
+    pixel) and bad ones are rejected before they can reach a training run.
+    Files are written atomically and the folder is committed with a manifest
+    once everything is on disk, so an interrupted upload is detectable.
+    With "normalize", images are re-encoded as upright RGB JPEGs at "normalize_quality".
+    Preview thumbnails are generated afterwards unless "thumbnails" is false.
+    """
+    import dataset_upload
+    import dataset_index
+    import dataset_images
+    import dataset_normalize
+    import dataset_thumbnails
+    
+    try:
+        files_data = job_input.get("files", [])
+        archive = job_input.get("archive")
+        training_name = job_input.get("training_name", f"training_{int(datetime.now().timestamp())}")
+        caption_ext = job_input.get("caption_ext", "txt")
+        
+        if not files_data and not archive:
+            return {"status": "error", "error": "No files provided"}
+        
+        # Create training folder
+        training_folder = os.path.join(TRAINING_DATA_DIR, dataset_upload.safe_dataset_name(training_name))
+        os.makedirs(training_folder, exist_ok=True)
+        dataset_upload.begin_dataset_write(training_folder)
+        
+        # Files are decoded (and decompressed) as streams, in parallel
+        uploaded_files = dataset_upload.write_uploaded_files(files_data, training_folder, caption_ext=caption_ext)
+        
+        if archive:
+            archive_name = archive.get("filename", "")
+            log(f"📦 Extracting archive {archive_name} into {training_folder}", "INFO")
+            uploaded_files.extend(dataset_upload.extract_archive(
+                archive.get("content", ""), archive_name, training_folder
+            ))
+        
+        # Reject corrupted, oversized or unsupported images (and their captions)
+        checks = dataset_images.validate_images(
+            training_folder,
+            [f["filename"] for f in uploaded_files],
+            full_decode=bool(job_input.get("full_validation", False))
+        )
+        rejected_files = [c for c in checks if not c["valid"]]
+        if rejected_files:
+            removed = set(dataset_images.remove_images(
+                training_folder, [c["filename"] for c in rejected_files], caption_ext
+            ))
+            uploaded_files = [f for f in uploaded_files if f["filename"] not in removed]
+            log(f"⚠️ Rejected {len(rejected_files)} invalid images", "WARN")
+        
+        # Optional normalization: EXIF transpose + RGB, cached by content hash
+        normalized_files, normalize_errors = [], []
+        if job_input.get("normalize", False):
+            normalized_files, normalize_errors = dataset_normalize.normalize_images(
+                training_folder,
+                NORMALIZE_CACHE_DIR,
+                [f["filename"] for f in uploaded_files if dataset_images.is_image_file(f["filename"])],
+                quality=int(job_input.get("normalize_quality", dataset_normalize.NORMALIZE_QUALITY)),
+                known_hashes={f["filename"]: f["sha256"] for f in uploaded_files if "sha256" in f}
+            )
+            renamed = {n["filename"]: n for n in normalized_files}
+            for entry in uploaded_files:
+                if entry["filename"] in renamed:
+                    n = renamed[entry["filename"]]
+                    entry.update(filename=n["normalized_filename"], size=n["size"], sha256=n["sha256"],
+                                 path=os.path.join(training_folder, n["normalized_filename"]))
+            log(f"🎨 Normalized {len(normalized_files)} images", "INFO")
+        
+        # Index image metadata (hashes were computed while writing)
+        dataset_index.update_index(
+            training_folder,
+            known_hashes={f["filename"]: f["sha256"] for f in uploaded_files if "sha256" in f},
+            caption_ext=caption_ext
+        )
+        
+        # Single directory fsync + commit manifest marks the dataset complete
+        manifest = dataset_upload.commit_dataset(training_folder)
+        
+        # Post-processing: previews for dataset browsing (never fails the upload)
+        thumbnails = None
+        if job_input.get("thumbnails", True):
+            try:
+                thumbnails = dataset_thumbnails.generate_thumbnails(training_folder, THUMBNAIL_CACHE_DIR)
+            except Exception as e:
+                log(f"⚠️ Thumbnail generation failed: {e}", "WARN")
+        
+        log(f"✅ Uploaded {len(uploaded_files)} files to {training_folder}", "INFO")
+        return {
+            "status": "success",
+            "uploaded_files": uploaded_files,
+            "rejected_files": rejected_files,
+            "training_folder": training_folder,
+            "dataset_complete": True,
+            "dataset_file_count": manifest["file_count"],
+            "normalized_files": normalized_files,
+            "normalize_errors": normalize_errors,
+            "thumbnails": thumbnails,
+            "message": f"Uploaded {len(uploaded_files)} files",
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        log(f"❌ Upload error: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Upload error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_update_captions(job_input, modules):
+    """Rewrite caption sidecars of an uploaded dataset without touching images"""
+    import dataset_upload
+    import dataset_index
+    
+    try:
+        captions = job_input.get("captions")
+        if not captions:
+            return {"status": "error", "error": "No captions provided"}
+        
+        training_folder, folder_error = resolve_training_folder(job_input)
+        if folder_error:
+            return folder_error
+        
+        caption_ext = job_input.get("caption_ext", "txt")
+        dataset_upload.begin_dataset_write(training_folder)
+        updated, missing = dataset_upload.update_captions(captions, training_folder, caption_ext=caption_ext)
+        dataset_index.update_index(training_folder, caption_ext=caption_ext)
+        dataset_upload.commit_dataset(training_folder)
+        
+        log(f"✅ Updated {len(updated)} captions in {training_folder}", "INFO")
+        return {
+            "status": "success",
+            "updated_captions": updated,
+            "missing_images": missing,
+            "training_folder": training_folder,
+            "message": f"Updated {len(updated)} captions",
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        log(f"❌ Caption update error: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Caption update error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_prepare_dataset(job_input, modules):
+    """Bucket an uploaded dataset and write pre-resized variants per resolution"""
+    import dataset_prepare
+    
+    try:
+        training_folder, folder_error = resolve_training_folder(job_input)
+        if folder_error:
+            return folder_error
+        
+        log(f"🪣 Preparing dataset {training_folder}", "INFO")
+        summary = dataset_prepare.prepare_dataset(
+            training_folder,
+            resolutions=job_input.get("resolutions", dataset_prepare.DEFAULT_RESOLUTIONS),
+            quality=int(job_input.get("quality", dataset_prepare.JPEG_QUALITY)),
+            caption_ext=job_input.get("caption_ext", "txt"),
+            force=bool(job_input.get("force", False)),
+            normalize=bool(job_input.get("normalize", False)),
+            crop=job_input.get("crop", "smart")
+        )
+        
+        log(f"✅ Prepared {summary['processed']} images ({summary['skipped']} unchanged) "
+            f"in {summary['duration_seconds']}s", "INFO")
+        return {
+            "status": "success",
+            "training_folder": training_folder,
+            **summary,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        log(f"❌ Prepare dataset error: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Prepare dataset error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_dataset_info(job_input, modules):
+    """Dataset summary (counts, resolution histogram, missing captions) from the index"""
+    import dataset_upload
+    import dataset_index
+    
+    try:
+        training_folder, folder_error = resolve_training_folder(job_input)
+        if folder_error:
+            return folder_error
+        
+        start_time = time.time()
+        dataset_index.ensure_index(training_folder, caption_ext=job_input.get("caption_ext", "txt"))
+        info = dataset_index.dataset_info(training_folder)
+        
+        return {
+            "status": "success",
+            "training_folder": training_folder,
+            "dataset_complete": dataset_upload.is_dataset_complete(training_folder),
+            **info,
+            "query_ms": round((time.time() - start_time) * 1000, 2),
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        log(f"❌ Dataset info error: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Dataset info error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_validate_dataset(job_input, modules):
+    """Validate every image of a dataset; "full_decode" decodes all pixels in parallel"""
+    import dataset_upload
+    import dataset_index
+    import dataset_images
+    
+    try:
+        training_folder, folder_error = resolve_training_folder(job_input)
+        if folder_error:
+            return folder_error
+        
+        start_time = time.time()
+        checks = dataset_images.validate_images(
+            training_folder, full_decode=bool(job_input.get("full_decode", False))
+        )
+        invalid = [c for c in checks if not c["valid"]]
+        
+        removed = []
+        if invalid and job_input.get("remove_invalid", False):
+            caption_ext = job_input.get("caption_ext", "txt")
+            dataset_upload.begin_dataset_write(training_folder)
+            removed = dataset_images.remove_images(training_folder, [c["filename"] for c in invalid], caption_ext)
+            dataset_index.update_index(training_folder, caption_ext=caption_ext)
+            dataset_upload.commit_dataset(training_folder)
+        
+        log(f"✅ Validated {len(checks)} images, {len(invalid)} invalid", "INFO")
+        return {
+            "status": "success",
+            "training_folder": training_folder,
+            "checked": len(checks),
+            "invalid": invalid,
+            "removed": removed,
+            "full_decode": bool(job_input.get("full_decode", False)),
+            "duration_seconds": round(time.time() - start_time, 3),
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        log(f"❌ Validate dataset error: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Validate dataset error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_dataset_dedupe_report(job_input, modules):
+    """Near-duplicate clusters from perceptual hashes stored in the dataset index"""
+    import dataset_index
+    import dataset_dedupe
+    
+    try:
+        training_folder, folder_error = resolve_training_folder(job_input)
+        if folder_error:
+            return folder_error
+        
+        dataset_index.update_index(training_folder, caption_ext=job_input.get("caption_ext", "txt"))
+        report = dataset_dedupe.dedupe_report(
+            training_folder,
+            hash_type=job_input.get("hash_type", "phash"),
+            threshold=int(job_input.get("threshold", dataset_dedupe.DEFAULT_THRESHOLD))
+        )
+        
+        log(f"✅ Dedupe report: {len(report['clusters'])} clusters in {report['image_count']} images", "INFO")
+        return {
+            "status": "success",
+            "training_folder": training_folder,
+            **report,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        log(f"❌ Dedupe report error: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Dedupe report error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_dataset_shard(job_input, modules):
+    """Pack a training folder (or one prepared resolution) into a shard, or unpack it again
+    
+    Shards live in <training folder>/_shards/; "resolution" selects
+    _prepared/<resolution>/ instead of the uploaded originals.
+    """
+    import dataset_upload
+    import dataset_index
+    import dataset_prepare
+    import dataset_shard
+    
+    try:
+        training_folder, folder_error = resolve_training_folder(job_input)
+        if folder_error:
+            return folder_error
+        
+        action = job_input.get("action", "pack")
+        resolution = job_input.get("resolution")
+        source_dir = training_folder
+        if resolution:
+            source_dir = os.path.join(training_folder, dataset_prepare.PREPARED_DIRNAME, str(int(resolution)))
+        path = dataset_shard.shard_path(training_folder, resolution and int(resolution))
+        
+        if action == "pack":
+            if not os.path.isdir(source_dir):
+                return {"status": "error", "error": f"Prepared resolution not found: {resolution}"}
+            summary = dataset_shard.pack_folder(source_dir, path, force=bool(job_input.get("force", False)))
+            log(f"📦 Packed {summary['file_count']} files into {path}", "INFO")
+        elif action == "unpack":
+            if not os.path.isfile(path):
+                return {"status": "error", "error": f"Shard not found: {path}"}
+            overwrite = bool(job_input.get("overwrite", False))
+            if resolution:
+                summary = dataset_shard.unpack_shard(path, source_dir, overwrite=overwrite)
+            else:
+                # Restoring originals is a dataset write like an upload
+                dataset_upload.begin_dataset_write(training_folder)
+                summary = dataset_shard.unpack_shard(path, training_folder, overwrite=overwrite)
+                dataset_index.update_index(training_folder, caption_ext=job_input.get("caption_ext", "txt"))
+                dataset_upload.commit_dataset(training_folder)
+            log(f"📂 Unpacked {len(summary['unpacked'])} files from {path}", "INFO")
+        else:
+            return {"status": "error", "error": f"Unknown shard action: {action} (expected pack or unpack)"}
+        
+        return {
+            "status": "success",
+            "action": action,
+            "training_folder": training_folder,
+            "shard_path": path,
+            **summary,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        log(f"❌ Dataset shard error: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Dataset shard error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_dataset_thumbnails(job_input, modules):
+    """Page through a dataset's cached WebP thumbnails ("page", "page_size", "size")"""
+    import dataset_index
+    import dataset_thumbnails
+    
+    try:
+        training_folder, folder_error = resolve_training_folder(job_input)
+        if folder_error:
+            return folder_error
+        
+        size = int(job_input.get("size", dataset_thumbnails.THUMBNAIL_SIZE))
+        if not dataset_thumbnails.MIN_THUMBNAIL_SIZE <= size <= dataset_thumbnails.MAX_THUMBNAIL_SIZE:
+            return {
+                "status": "error",
+                "error": f"Thumbnail size must be between {dataset_thumbnails.MIN_THUMBNAIL_SIZE} "
+                         f"and {dataset_thumbnails.MAX_THUMBNAIL_SIZE}"
+            }
+        
+        dataset_index.ensure_index(training_folder, caption_ext=job_input.get("caption_ext", "txt"))
+        result = dataset_thumbnails.thumbnail_page(
+            training_folder,
+            THUMBNAIL_CACHE_DIR,
+            page=job_input.get("page", 1),
+            page_size=job_input.get("page_size", dataset_thumbnails.DEFAULT_PAGE_SIZE),
+            size=size
+        )
+        
+        return {
+            "status": "success",
+            "training_folder": training_folder,
+            **result,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        log(f"❌ Dataset thumbnails error: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Dataset thumbnails error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_latent_cache(job_input, modules):
+    """Plan, link or harvest cached latents shared across training runs
+    
+    "action": plan (default) reports which latents of the dataset are already in the
+    shared store, link also symlinks them into <folder>/_latent_cache before training,
+    harvest moves latents a finished run computed into the store.
+    The VAE is identified from "model" ({name_or_path, vae_path, revision}) or from the
+    model section of "yaml_config"; "resolution" selects a _prepared/<resolution> folder.
+    """
+    import dataset_prepare
+    import dataset_latents
+    
+    try:
+        training_folder, folder_error = resolve_training_folder(job_input)
+        if folder_error:
+            return folder_error
+        
+        model_config = job_input.get("model")
+        resolutions = job_input.get("resolutions", dataset_prepare.DEFAULT_RESOLUTIONS)
+        if job_input.get("yaml_config"):
+            process = modules['yaml'].safe_load(job_input["yaml_config"])["config"]["process"][0]
+            model_config = model_config or process.get("model")
+            resolutions = process.get("datasets", [{}])[0].get("resolution", resolutions)
+        if not model_config or not model_config.get("name_or_path"):
+            return {"status": "error", "error": "Missing model.name_or_path (or yaml_config) to identify the VAE"}
+        vae_id = dataset_latents.vae_identity_from_model(model_config)
+        
+        folder = training_folder
+        if job_input.get("resolution"):
+            resolutions = [int(job_input["resolution"])]
+            folder = os.path.join(training_folder, dataset_prepare.PREPARED_DIRNAME, str(resolutions[0]))
+            if not os.path.isdir(folder):
+                return {"status": "error", "error": f"Prepared resolution not found: {resolutions[0]}"}
+        
+        action = job_input.get("action", "plan")
+        if action == "harvest":
+            result = dataset_latents.harvest_latents(folder, LATENT_CACHE_DIR, vae_id)
+            log(f"🧊 Harvested {result['harvested']} latents from {folder}", "INFO")
+        elif action in ("plan", "link"):
+            result = dataset_latents.plan_latents(folder, LATENT_CACHE_DIR, vae_id, resolutions)
+            if action == "link":
+                linked = dataset_latents.link_latents(folder, result)
+                result = dataset_latents.plan_latents(folder, LATENT_CACHE_DIR, vae_id, resolutions)
+                result["newly_linked"] = len(linked)
+            log(f"🧊 Latent plan: {result['linked'] + result['reusable']}/{result['total']} reusable", "INFO")
+        else:
+            return {"status": "error", "error": f"Unknown latent_cache action: {action} (expected plan, link or harvest)"}
+        
+        return {
+            "status": "success",
+            "action": action,
+            "folder": folder,
+            "vae_id": vae_id,
+            **result,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        log(f"❌ Latent cache error: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Latent cache error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_caption_stats(job_input, modules):
+    """Caption token lengths, truncation and vocabulary; tokenizations are cached in the index
+    
+    "tokenizer" is clip (default), t5, whitespace or a registered name; when it cannot be
+    loaded the whitespace tokenizer is used and "tokenizer_fallback" says why.
+    """
+    import dataset_index
+    import dataset_captions
+    
+    try:
+        training_folder, folder_error = resolve_training_folder(job_input)
+        if folder_error:
+            return folder_error
+        
+        start_time = time.time()
+        # Stat-only refresh: picks up caption edits without reading unchanged files
+        dataset_index.update_index(training_folder, caption_ext=job_input.get("caption_ext", "txt"))
+        stats = dataset_captions.caption_stats(
+            training_folder,
+            tokenizer_name=job_input.get("tokenizer", dataset_captions.DEFAULT_TOKENIZER),
+            max_length=job_input.get("max_length"),
+            bin_size=int(job_input.get("bin_size", dataset_captions.DEFAULT_BIN_SIZE)),
+            top_k=int(job_input.get("top_k", dataset_captions.DEFAULT_TOP_K)),
+            caption_dropout_rate=float(job_input.get("caption_dropout_rate", 0.0))
+        )
+        if stats["tokenizer_fallback"]:
+            log(f"⚠️ Tokenizer fallback: {stats['tokenizer_fallback']}", "WARN")
+        
+        return {
+            "status": "success",
+            "training_folder": training_folder,
+            **stats,
+            "duration_seconds": round(time.time() - start_time, 3),
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        log(f"❌ Caption stats error: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Caption stats error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def get_process_manager():
+    """Process manager running ai-toolkit's runner from AI_TOOLKIT_PATH
+    
+    The registry is journaled to TRAINING_RUNS_DIR/registry.jsonl, so runs
+    started before a worker restart are reloaded (and still-running ones
+    adopted) the first time this is called.
+    """
+    global PROCESS_MANAGER
+    import training_manager
+    
+    if PROCESS_MANAGER is None:
+        PROCESS_MANAGER = training_manager.ProcessManager(
+            training_manager.runner_command(AI_TOOLKIT_PATH),
+            cwd=AI_TOOLKIT_PATH,
+            journal_path=os.path.join(TRAINING_RUNS_DIR, "registry.jsonl")
+        )
+        running = sum(1 for p in PROCESS_MANAGER.list() if p["status"] == "running")
+        if running:
+            log(f"♻️ Reattached to {running} running training processes", "INFO")
+    return PROCESS_MANAGER
+
+def get_training_scheduler():
+    """Queue admitting MAX_CONCURRENT_TRAININGS runs at a time on the process manager
+    
+    Queued runs are journaled to TRAINING_RUNS_DIR/queue.jsonl next to the
+    registry, so they survive a worker restart and start once a slot frees.
+    """
+    global TRAINING_SCHEDULER
+    import training_scheduler
+    
+    manager = get_process_manager()
+    if TRAINING_SCHEDULER is None or TRAINING_SCHEDULER.manager is not manager:
+        TRAINING_SCHEDULER = training_scheduler.TrainingScheduler(
+            manager, journal_path=os.path.join(TRAINING_RUNS_DIR, "queue.jsonl")
+        )
+        queued = len(TRAINING_SCHEDULER.queue())
+        if queued:
+            log(f"♻️ Restored {queued} queued training runs", "INFO")
+    return TRAINING_SCHEDULER
+
+def get_training_watchdog():
+    """Stall watchdog for the process manager, sweeping in the background once started"""
+    global TRAINING_WATCHDOG
+    import training_watchdog
+    
+    manager = get_process_manager()
+    if TRAINING_WATCHDOG is None or TRAINING_WATCHDOG.manager is not manager:
+        if TRAINING_WATCHDOG is not None:
+            TRAINING_WATCHDOG.stop()
+        TRAINING_WATCHDOG = training_watchdog.Watchdog(manager)
+    return TRAINING_WATCHDOG
+
+def get_base_config_store():
+    """Base training configs registered on this worker, kept parsed in memory"""
+    global BASE_CONFIG_STORE
+    import training_config
+    
+    if BASE_CONFIG_STORE is None or BASE_CONFIG_STORE.store_dir != BASE_CONFIG_DIR:
+        BASE_CONFIG_STORE = training_config.BaseConfigStore(BASE_CONFIG_DIR)
+    return BASE_CONFIG_STORE
+
+def config_train_steps(config):
+    """train.steps of the first process in an ai-toolkit config, or None"""
+    try:
+        return int(config["config"]["process"][0]["train"]["steps"])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+def load_training_config(job_input, modules):
+    """Full config from "yaml_config" or "base_config", with "overlay" merged on top"""
+    import training_config
+    
+    overlay = job_input.get("overlay") or {}
+    if isinstance(overlay, str):
+        overlay = json.loads(overlay)
+    if not isinstance(overlay, dict):
+        raise training_config.ConfigError("overlay must be an object of {path: value}")
+    
+    if job_input.get("base_config"):
+        return get_base_config_store().build(job_input["base_config"], overlay)
+    if job_input.get("yaml_config"):
+        return training_config.apply_overlay(modules['yaml'].safe_load(job_input["yaml_config"]), overlay)
+    raise training_config.ConfigError("Missing yaml_config or base_config")
+
+def submit_training_run(config, modules, priority=0, steps=None, estimated_seconds=None):
+    """Write config to a new run directory and hand it to the training scheduler"""
+    process_id = str(modules['uuid'].uuid4())[:8]
+    name = (config.get("config") or {}).get("name") if isinstance(config, dict) else None
+    
+    run_dir = os.path.join(TRAINING_RUNS_DIR, process_id)
+    os.makedirs(run_dir, exist_ok=True)
+    config_path = os.path.join(run_dir, "config.yaml")
+    with open(config_path, 'w') as f:
+        modules['yaml'].dump(config, f)
+    
+    return get_training_scheduler().submit(
+        process_id,
+        config_path,
+        name=name,
+        log_path=os.path.join(run_dir, "train.log"),
+        priority=priority,
+        steps=steps,
+        estimated_seconds=estimated_seconds
+    )
+
+def handle_train_with_yaml(job_input, modules):
+    """Write the training config and launch ai-toolkit on it as a detached process
+    
+    The config is either a full "yaml_config" or the name of a config stored
+    with register_base_config ("base_config"); either way an "overlay" of
+    {"config.process[0].train.lr": 2e-4, "steps": 500, ...} is merged on top.
+    The result is checked against the training config schema (defaults filled
+    in, dataset folders looked up in their index) unless "validate" is false;
+    "dry_run" returns the resolved config without launching anything.
+    "resume" continues from the newest checkpoint in training_folder/<name>
+    (see training_checkpoints.prepare_resume) and reports the steps saved.
+    Returns as soon as the trainer is started; follow it with process_status.
+    While another run holds the GPU the new one is queued ("priority", higher
+    first, then submission order) and starts the moment a slot frees up.
+    """
+    try:
+        import training_config
+        
+        config = load_training_config(job_input, modules)
+        resume = None
+        if job_input.get("resume"):
+            import training_checkpoints
+            training_config.validate_base(config)
+            config, resume = training_checkpoints.prepare_resume(config, AI_TOOLKIT_PATH)
+            it_per_sec = get_training_scheduler().last_it_per_sec
+            if resume["resumed"] and it_per_sec:
+                resume["estimated_seconds_saved"] = round(resume["steps_saved"] / it_per_sec, 1)
+        
+        report = {"warnings": [], "datasets": []}
+        if job_input.get("validate", True):
+            report = training_config.validate_config(config)
+            config = report["config"]
+        if job_input.get("dry_run"):
+            return {
+                "status": "success",
+                "dry_run": True,
+                "name": (config.get("config") or {}).get("name") if isinstance(config, dict) else None,
+                "steps": config_train_steps(config),
+                "config": config,
+                "resume": resume,
+                "warnings": report["warnings"],
+                "datasets": report["datasets"],
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        record = submit_training_run(
+            config, modules,
+            priority=int(job_input.get("priority", 0)),
+            steps=resume["steps_remaining"] if resume and resume["resumed"] else config_train_steps(config),
+            estimated_seconds=job_input.get("estimated_seconds")
+        )
+        process_id, name = record["process_id"], record["name"]
+        if resume and resume["resumed"]:
+            log(f"⏩ Resuming {name or process_id} from step {resume['step']} ({resume['checkpoint']})", "INFO")
+        get_training_watchdog().start()
+        if record["status"] == "queued":
+            log(f"🚦 Training {name or process_id} queued at position {record['position']}", "INFO")
+            message = f"Training queued with process ID: {process_id}"
+        else:
+            log(f"🏋️ Training {name or process_id} started (pid {record['pid']})", "INFO")
+            message = f"Training started with process ID: {process_id}"
+        return {
+            **record,
+            "status": "success",
+            "process_status": record["status"],
+            "message": message,
+            "warnings": report["warnings"],
+            "resume": resume,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except ValueError as e:
+        # Config that fails to parse, merge or validate: nothing was written or started
+        log(f"❌ Training config rejected: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Training error: {str(e)}",
+            "errors": getattr(e, "errors", [str(e)]),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        log(f"❌ Training error: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Training error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_register_base_config(job_input, modules):
+    """Parse and store a full training YAML under a name for later overlay-only submissions"""
+    try:
+        name = job_input.get("name")
+        yaml_content = job_input.get("yaml_config")
+        if not name or not yaml_content:
+            return {"status": "error", "error": "Missing name or yaml_config"}
+        
+        entry = get_base_config_store().register(name, yaml_content, modules['yaml'])
+        log(f"🧩 Registered base config {name} ({entry['sha256'][:12]})", "INFO")
+        return {
+            "status": "success",
+            **entry,
+            "base_configs": get_base_config_store().names(),
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        log(f"❌ Register base config error: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Register base config error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_process_status(job_input, modules):
+    """Registry entry of one training run (status, pid, exit code, runtime, progress)
+    
+    "progress" has step/total_steps, loss, lr, smoothed it_per_sec and eta_seconds
+    parsed from the trainer output as it is written (null before the first step).
+    """
+    process_id = job_input.get("process_id")
+    if not process_id:
+        return {"status": "error", "error": "Missing process_id"}
+    
+    record = get_training_scheduler().status(process_id)
+    if record is None:
+        return {"status": "error", "error": f"Process not found: {process_id}"}
+    return {
+        **record,
+        "status": "success",
+        "process_status": record["status"],
+        "timestamp": datetime.now().isoformat()
+    }
+
+def handle_processes(job_input, modules):
+    """All training runs known to this worker, including queued ones"""
+    processes = get_training_scheduler().list()
+    return {
+        "status": "success",
+        "processes": processes,
+        "running": sum(1 for p in processes if p["status"] == "running"),
+        "queued": sum(1 for p in processes if p["status"] == "queued"),
+        "total_count": len(processes),
+        "timestamp": datetime.now().isoformat()
+    }
+
+def handle_process_logs(job_input, modules):
+    """Trainer output appended since "offset"; pass back next_offset to follow a run
+    
+    At most "max_bytes" (default 64 KiB, max 1 MiB) are read per call and only
+    complete lines are returned while the run is still writing.
+    """
+    import training_manager
+    
+    process_id = job_input.get("process_id")
+    if not process_id:
+        return {"status": "error", "error": "Missing process_id"}
+    
+    try:
+        chunk = get_process_manager().read_logs(
+            process_id,
+            offset=int(job_input.get("offset", 0)),
+            max_bytes=int(job_input.get("max_bytes", training_manager.DEFAULT_LOG_CHUNK))
+        )
+        return {
+            "status": "success",
+            **chunk,
+            "timestamp": datetime.now().isoformat()
+        }
+    except (ValueError, training_manager.TrainingError) as e:
+        return {
+            "status": "error",
+            "error": f"Process logs error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_cancel_training(job_input, modules):
+    """Remove a queued training run before it starts"""
+    import training_manager
+    
+    process_id = job_input.get("process_id")
+    if not process_id:
+        return {"status": "error", "error": "Missing process_id"}
+    
+    try:
+        entry = get_training_scheduler().cancel(process_id)
+        log(f"🚦 Cancelled queued training {process_id}", "INFO")
+        return {
+            **entry,
+            "status": "success",
+            "process_status": entry["status"],
+            "timestamp": datetime.now().isoformat()
+        }
+    except training_manager.TrainingError as e:
+        return {
+            "status": "error",
+            "error": f"Cancel error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_force_kill(job_input, modules):
+    """Kill a training run's whole process group (SIGKILL unless "signal" says otherwise)"""
+    import signal
+    import training_manager
+    
+    process_id = job_input.get("process_id")
+    if not process_id:
+        return {"status": "error", "error": "Missing process_id"}
+    
+    signal_name = job_input.get("signal", "SIGKILL")
+    if signal_name not in ("SIGTERM", "SIGINT", "SIGKILL"):
+        return {"status": "error", "error": f"Unsupported signal: {signal_name}"}
+    
+    try:
+        sig = signal.Signals[signal_name]
+        record = get_process_manager().kill(process_id, sig)
+        log(f"🛑 Sent {sig.name} to training {process_id}", "INFO")
+        return {
+            **record,
+            "status": "success",
+            "process_status": record["status"],
+            "timestamp": datetime.now().isoformat()
+        }
+    except training_manager.TrainingError as e:
+        return {
+            "status": "error",
+            "error": f"Force kill error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_cleanup_stuck(job_input, modules):
+    """Run the watchdog sweep now: stop stalled runs and kill leftover process groups
+    
+    "stall_seconds" / "log_stall_seconds" override how long a run may go without
+    advancing a step / writing to its log (STALL_PROGRESS_SECONDS, STALL_LOG_SECONDS).
+    """
+    try:
+        windows = {
+            key: float(job_input[field]) if job_input.get(field) is not None else None
+            for key, field in (("progress_window", "stall_seconds"), ("log_window", "log_stall_seconds"))
+        }
+        sweep = get_training_watchdog().sweep(**windows)
+    except ValueError as e:
+        return {
+            "status": "error",
+            "error": f"Cleanup error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    cleaned = sweep["stalled"] + sweep["orphans"]
+    for entry in sweep["stalled"]:
+        log(f"🐕 Stopping stalled training {entry['process_id']}: {entry['reason']}", "WARN")
+    if sweep["orphans"]:
+        log(f"🧹 Cleaned up {len(sweep['orphans'])} stuck process groups", "INFO")
+    return {
+        "status": "success",
+        **sweep,
+        "cleaned": cleaned,
+        "cleaned_count": len(cleaned),
+        "timestamp": datetime.now().isoformat()
+    }
+
+def sweep_report(sweep):
+    """Sweep record with the current status of its runs and the summary table"""
+    import training_sweep
+    
+    scheduler = get_training_scheduler()
+    records = {run["process_id"]: scheduler.status(run["process_id"]) for run in sweep["runs"]}
+    return {**sweep, **training_sweep.summarize(sweep, records)}
+
+def wait_for_sweep(sweep, timeout=None):
+    """Block until every run of the sweep has finished; False on timeout"""
+    import training_sweep
+    
+    scheduler = get_training_scheduler()
+    deadline = time.time() + float(timeout) if timeout else None
+    for run in sweep["runs"]:
+        while True:
+            record = scheduler.status(run["process_id"])
+            if record is None or record["status"] in training_sweep.FINISHED_STATUSES:
+                break
+            remaining = deadline - time.time() if deadline else 60
+            if remaining <= 0:
+                return False
+            if record["status"] == "running":
+                scheduler.manager.wait(run["process_id"], timeout=min(remaining, 60))
+            else:
+                time.sleep(min(remaining, 1))
+    return True
+
+def handle_train_sweep(job_input, modules):
+    """Expand parameter axes over a base config and queue one training run per variant
+    
+    The base comes from "yaml_config" or "base_config" (+ "overlay") as in
+    train_with_yaml. "axes" maps paths relative to the first process
+    ({"network.linear": [8, 16], "train.lr": [1e-4, 2e-4]}) to values;
+    "mode" "grid" runs the Cartesian product, "random" a seeded sample of
+    "samples" variants. Every variant is validated before any is queued,
+    the dataset is checked once for the whole sweep, and latents are cached
+    to disk so only the first run encodes them. "wait" blocks until the
+    sweep completes; otherwise poll sweep_status for the summary table.
+    """
+    try:
+        import training_config
+        import training_sweep
+        
+        base = load_training_config(job_input, modules)
+        training_config.validate_base(base)
+        axes = job_input.get("axes")
+        if isinstance(axes, str):
+            axes = json.loads(axes)
+        mode = job_input.get("mode", "grid")
+        variants = training_sweep.expand_axes(axes, mode, job_input.get("samples"), job_input.get("seed"))
+        
+        sweep_id = str(modules['uuid'].uuid4())[:8]
+        base_name = base["config"].get("name") or "sweep"
+        checked_datasets = set()
+        runs, warnings = [], []
+        for index, params in enumerate(variants):
+            name = f"{base_name}_{sweep_id}_{index:02d}"
+            overlay = {training_sweep.axis_path(axis): value for axis, value in params.items()}
+            overlay["name"] = name
+            try:
+                config = training_config.apply_overlay(base, overlay)
+                datasets = [d for d in config["config"]["process"][0].get("datasets") or [] if isinstance(d, dict)]
+                for dataset in datasets:
+                    dataset["cache_latents_to_disk"] = True
+                if job_input.get("validate", True):
+                    folders = tuple(str(d.get("folder_path")) for d in datasets)
+                    report = training_config.validate_config(config, check_datasets=folders not in checked_datasets)
+                    checked_datasets.add(folders)
+                    config = report["config"]
+                    warnings += [f"{name}: {warning}" for warning in report["warnings"]]
+            except training_config.ConfigError as e:
+                raise training_config.ConfigError(f"{name}: {e}", [f"{name}: {error}" for error in e.errors]) from e
+            runs.append({"name": name, "params": params, "config": config})
+        
+        if job_input.get("dry_run"):
+            return {
+                "status": "success",
+                "dry_run": True,
+                "sweep_id": sweep_id,
+                "runs": runs,
+                "warnings": warnings,
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        for run in runs:
+            config = run.pop("config")
+            record = submit_training_run(
+                config, modules,
+                priority=int(job_input.get("priority", 0)),
+                steps=config_train_steps(config),
+                estimated_seconds=job_input.get("estimated_seconds")
+            )
+            run["process_id"] = record["process_id"]
+        sweep = training_sweep.new_sweep(sweep_id, base_name, axes, mode, runs)
+        training_sweep.save_sweep(os.path.join(TRAINING_RUNS_DIR, "sweeps"), sweep)
+        get_training_watchdog().start()
+        log(f"🧪 Sweep {sweep_id} queued {len(runs)} runs over {', '.join(axes)}", "INFO")
+        
+        timed_out = False
+        if job_input.get("wait"):
+            timed_out = not wait_for_sweep(sweep, job_input.get("wait_timeout"))
+        report = sweep_report(sweep)
+        if report["complete"]:
+            log(f"🏁 Sweep {sweep_id} complete:\n{report['table']}", "INFO")
+        return {
+            "status": "success",
+            **report,
+            "timed_out": timed_out,
+            "warnings": warnings,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except ValueError as e:
+        log(f"❌ Sweep config rejected: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Sweep error: {str(e)}",
+            "errors": getattr(e, "errors", [str(e)]),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        log(f"❌ Sweep error: {e}", "ERROR")
+        return {
+            "status": "error",
+            "error": f"Sweep error: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+def handle_sweep_status(job_input, modules):
+    """Runs of a sweep with their final losses and timings, and whether all have finished"""
+    import training_sweep
+    
+    sweep_id = job_input.get("sweep_id")
+    if not sweep_id:
+        return {"status": "error", "error": "Missing sweep_id"}
+    
+    sweep = training_sweep.load_sweep(os.path.join(TRAINING_RUNS_DIR, "sweeps"), sweep_id)
+    if sweep is None:
+        return {"status": "error", "error": f"Sweep not found: {sweep_id}"}
+    return {
+        "status": "success",
+        **sweep_report(sweep),
+        "timestamp": datetime.now().isoformat()
+    }
+
 def handle_local_testing():
     """Handle local testing arguments"""
     import sys
@@ -352,6 +1464,13 @@ if __name__ == "__main__":
         log("🏁 Testing complete, exiting...", "INFO")
         sys.exit(0)
     
+    # Reload the training registry so runs from before a restart keep being tracked
+    try:
+        get_training_scheduler()
+        get_training_watchdog().start()
+    except Exception as e:
+        log(f"⚠️ Training registry not loaded: {e}", "WARN")
+    
     # Start RunPod serverless
     log("🚀 Starting serverless worker...", "INFO")
     runpod.serverless.start({"handler": handler})
\ No newline at end of file
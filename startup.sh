@@ -51,7 +51,7 @@ python -m pip install --upgrade pip
 
 # Install minimal requirements (fast)
 echo "📦 Installing minimal requirements..."
-pip install --no-cache-dir runpod pyyaml Pillow python-dotenv
+pip install --no-cache-dir runpod pyyaml Pillow numpy python-dotenv
 
 # Install HuggingFace CLI (upgraded version)
 pip install --upgrade "huggingface_hub[cli]"
@@ -88,6 +88,12 @@ if __name__ == "__main__":
 EOF
 }
 
+# Handler modules (imported lazily by handler_fast.py)
+HANDLER_MODULES="dataset_upload.py dataset_prepare.py dataset_index.py dataset_images.py dataset_dedupe.py dataset_shard.py dataset_thumbnails.py dataset_normalize.py dataset_latents.py dataset_captions.py dataset_crops.py training_manager.py training_scheduler.py training_watchdog.py training_config.py training_checkpoints.py training_sweep.py"
+for module in ${HANDLER_MODULES}; do
+    curl -fso "/workspace/${module}" "${REPO_URL}/${module}" || echo "⚠️ Failed to download ${module}"
+done
+
 # Optional: Download additional modules
 curl -o /workspace/full_handler.py "${REPO_URL}/full_handler.py" 2>/dev/null || echo "⚠️ Full handler not found (optional)"
 
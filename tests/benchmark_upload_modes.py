@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark: per-file base64 upload vs single archive upload
+Compares payload size and worker-side processing time of upload_training_data
+
+Usage: python tests/benchmark_upload_modes.py [--files 50] [--size-kb 300]
+"""
+
+import sys
+import os
+import io
+import json
+import time
+import base64
+import tarfile
+import zipfile
+import argparse
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from dataset_images import MIN_IMAGE_SIDE
+
+def noise_jpeg(size_kb):
+    """Real JPEG roughly size_kb on disk (noise costs ~1 byte/pixel at quality 90)
+
+    The side never drops below MIN_IMAGE_SIDE so uploads pass validation; for
+    small sizes only the top rows are noise and the flat gray rest is nearly free.
+    """
+    side = max(MIN_IMAGE_SIDE, int((size_kb * 1024) ** 0.5))
+    noise_rows = max(1, min(side, size_kb * 1024 // side))
+    image = Image.new("RGB", (side, side), (128, 128, 128))
+    image.paste(Image.frombytes("RGB", (side, noise_rows), os.urandom(side * noise_rows * 3)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+def build_dataset(file_count, size_kb):
+    """Synthetic dataset: noise JPEGs (which pass header validation) plus short captions"""
+    dataset = {}
+    for i in range(file_count):
+        dataset[f"img_{i:04d}.jpg"] = noise_jpeg(size_kb)
+        dataset[f"img_{i:04d}.txt"] = f"Matt, photo, sample {i}".encode()
+    return dataset
+
+def per_file_payload(dataset):
+    return {
+        "training_name": "bench_files",
+        "files": [
+            {"filename": name, "content": base64.b64encode(data).decode()}
+            for name, data in dataset.items()
+        ]
+    }
+
+def archive_payload(dataset, archive_name):
+    buffer = io.BytesIO()
+    if archive_name.endswith(".zip"):
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, data in dataset.items():
+                archive.writestr(name, data)
+    else:
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for name, data in dataset.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+    return {
+        "training_name": "bench_archive",
+        "archive": {"filename": archive_name, "content": base64.b64encode(buffer.getvalue()).decode()}
+    }
+
+def run_mode(label, job_input, raw_bytes, repeats):
+    from handler_fast import handle_upload_training_data
+
+    payload_size = len(json.dumps({"input": job_input}).encode())
+    timings = []
+    for _ in range(repeats):
+        work_dir = tempfile.mkdtemp()
+        try:
+            with patch("handler_fast.TRAINING_DATA_DIR", work_dir), patch("handler_fast.log"), \
+                    patch("handler_fast.THUMBNAIL_CACHE_DIR", os.path.join(work_dir, ".thumbnails")):
+                start = time.perf_counter()
+                result = handle_upload_training_data(job_input, {"base64": base64})
+                timings.append(time.perf_counter() - start)
+            assert result["status"] == "success", result
+            assert result["uploaded_files"], result
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    best = min(timings)
+    print(f"{label:<12} payload {payload_size / 1024 / 1024:8.2f} MB "
+          f"({payload_size / raw_bytes * 100:5.1f}% of raw)  "
+          f"worker {best * 1000:8.1f} ms  "
+          f"{raw_bytes / best / 1024 / 1024:8.1f} MB/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark upload_training_data modes")
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--size-kb", type=int, default=300)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    dataset = build_dataset(args.files, args.size_kb)
+    raw_bytes = sum(len(data) for data in dataset.values())
+
+    print("⏱️ Upload mode benchmark")
+    print("=" * 80)
+    print(f"📦 {len(dataset)} files, {raw_bytes / 1024 / 1024:.2f} MB raw")
+    print("=" * 80)
+
+    run_mode("per-file", per_file_payload(dataset), raw_bytes, args.repeats)
+    run_mode("zip", archive_payload(dataset, "dataset.zip"), raw_bytes, args.repeats)
+    run_mode("tar.gz", archive_payload(dataset, "dataset.tar.gz"), raw_bytes, args.repeats)
+
+if __name__ == "__main__":
+    main()
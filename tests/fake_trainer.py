@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+🎭 Stand-in for ai-toolkit's run.py in training manager tests
+Reads the "fake" section of the config: output lines, sleep, exit_code, ignore_sigterm and an optional orphaned child
+"""
+
+import signal
+import subprocess
+import sys
+import time
+
+import yaml
+
+
+def main(config_path):
+    try:
+        with open(config_path) as f:
+            fake = (yaml.safe_load(f) or {}).get("fake", {})
+    except FileNotFoundError:
+        fake = {}
+
+    if fake.get("ignore_sigterm"):
+        # A trainer hung in CUDA code that never handles SIGTERM
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    if fake.get("child_sleep"):
+        # Child in the same process group that outlives the runner
+        # (child_ignore_sigterm: a dataloader worker that survives the runner's SIGTERM)
+        ignore = "signal.signal(signal.SIGTERM, signal.SIG_IGN); " if fake.get("child_ignore_sigterm") else ""
+        subprocess.Popen([sys.executable, "-c",
+                          f"import signal, time; {ignore}time.sleep({float(fake['child_sleep'])})"])
+
+    print(f"fake trainer running {config_path}", flush=True)
+    for line in fake.get("output", []):
+        print(line, end=fake.get("line_end", "\n"), flush=True)
+        time.sleep(float(fake.get("line_delay", 0)))
+    time.sleep(float(fake.get("sleep", 0)))
+    return int(fake.get("exit_code", 0))
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1]))
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+🖼️ Image fixtures shared by the dataset tests
+Encoded test images in any PIL format and mode, with optional EXIF orientation
+"""
+
+import sys
+import os
+import io
+
+# Add parent directory to path for importing the dataset modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from dataset_index import EXIF_ORIENTATION_TAG
+
+
+def image_bytes(size=(512, 512), image_format="JPEG", mode="RGB", orientation=None, color=None, alpha=128):
+    """Encoded image of size: noise (so encoders do real work) unless a solid color is given
+
+    Noise RGBA images get a uniform alpha; orientation is written as the EXIF
+    orientation tag.
+    """
+    if color is not None:
+        image = Image.new(mode, size, color)
+    else:
+        image = Image.effect_noise(size, 40).convert(mode)
+        if mode == "RGBA":
+            image.putalpha(alpha)
+    options = {}
+    if orientation:
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION_TAG] = orientation
+        options["exif"] = exif
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
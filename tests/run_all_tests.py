@@ -26,6 +26,23 @@ def discover_and_run_tests():
         'test_deployment_methods', 
         'test_local_testing',
         'test_with_matt_dataset',  # Add Matt dataset tests
+        'test_dataset_upload',
+        'test_dataset_prepare',
+        'test_dataset_index',
+        'test_dataset_images',
+        'test_dataset_dedupe',
+        'test_dataset_shard',
+        'test_dataset_thumbnails',
+        'test_dataset_normalize',
+        'test_dataset_latents',
+        'test_dataset_captions',
+        'test_dataset_crops',
+        'test_training_manager',
+        'test_training_scheduler',
+        'test_training_watchdog',
+        'test_training_config',
+        'test_training_checkpoints',
+        'test_training_sweep',
         'test_all_integration'
     ]
     
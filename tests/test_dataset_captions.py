@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for dataset_captions.py and the caption_stats handler
+Tokenizer plug-ins, cached tokenizations and corpus statistics
+"""
+
+import sys
+import os
+import time
+import sqlite3
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import dataset_index
+import dataset_captions
+
+
+class CharTokenizer:
+    """Test tokenizer: one token per character, BOS/EOS counted"""
+
+    name = "chars"
+    max_length = 12
+
+    def tokenize(self, text):
+        return list(text.replace(" ", ""))
+
+    def count(self, tokens):
+        return len(tokens) + 2
+
+
+def failing_tokenizer():
+    failing_tokenizer.calls += 1
+    raise OSError("model files not found")
+
+
+failing_tokenizer.calls = 0
+
+
+class TestCaptionStats(unittest.TestCase):
+    """Test statistics and caching over an indexed folder"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.captions = {
+            "a": "Matt, photo",
+            "b": "Matt, portrait, upper body, studio lighting, smiling, looking at viewer",
+            "c": "Matt, photo",
+            "d": None,
+        }
+        for stem, caption in self.captions.items():
+            Image.new("RGB", (64, 64)).save(os.path.join(self.test_dir, f"{stem}.jpg"))
+            if caption:
+                self.write_caption(stem, caption)
+        dataset_index.update_index(self.test_dir)
+        dataset_captions.register_tokenizer("chars", CharTokenizer)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def write_caption(self, stem, caption):
+        with open(os.path.join(self.test_dir, f"{stem}.txt"), "w") as f:
+            f.write(caption)
+
+    def test_whitespace_stats(self):
+        """Histogram, truncation and vocabulary with the fallback tokenizer"""
+        stats = dataset_captions.caption_stats(self.test_dir, "whitespace", max_length=5, bin_size=4)
+
+        self.assertEqual((stats["captioned"], stats["uncaptioned"]), (3, 1))
+        self.assertEqual(stats["length_histogram"], {"0-3": 2, "8-11": 1})
+        self.assertEqual(stats["truncated"], [{"filename": "b.jpg", "token_count": 10}])
+        self.assertEqual(stats["vocabulary"]["matt"], 3)
+        self.assertEqual(stats["vocabulary"]["photo"], 2)
+        self.assertEqual(stats["max_observed_length"], 10)
+        self.assertIsNone(stats["tokenizer_fallback"])
+
+    def test_registered_tokenizer(self):
+        """Custom tokenizers plug in with their own window and special tokens"""
+        stats = dataset_captions.caption_stats(self.test_dir, "chars")
+        self.assertEqual(stats["max_length"], 12)
+        # "Matt,photo" = 10 characters + 2 special tokens
+        self.assertEqual(stats["length_histogram"]["0-15"], 2)
+        self.assertEqual([t["filename"] for t in stats["truncated"]], ["b.jpg"])
+        self.assertEqual(stats["vocabulary"][","], 2 + 5)
+
+    def test_fallback(self):
+        """Tokenizers that cannot load fall back to whitespace"""
+        failing_tokenizer.calls = 0
+        dataset_captions.register_tokenizer("broken", failing_tokenizer)
+        stats = dataset_captions.caption_stats(self.test_dir, "broken")
+        self.assertEqual(stats["tokenizer"], "whitespace")
+        self.assertIn("model files not found", stats["tokenizer_fallback"])
+        # The failed load is remembered instead of retried on every call
+        again = dataset_captions.caption_stats(self.test_dir, "broken")
+        self.assertEqual(again["tokenizer_fallback"], stats["tokenizer_fallback"])
+        self.assertEqual(failing_tokenizer.calls, 1)
+        with self.assertRaises(ValueError):
+            dataset_captions.caption_stats(self.test_dir, "no_such_tokenizer")
+        with self.assertRaises(ValueError):
+            dataset_captions.caption_stats(self.test_dir, "whitespace", bin_size=0)
+
+    def test_tokenizations_cached(self):
+        """Each distinct caption is tokenized once; edits only retokenize what changed"""
+        first = dataset_captions.caption_stats(self.test_dir, "whitespace")
+        self.assertEqual(first["newly_tokenized"], 2)
+
+        with patch.object(dataset_captions.WhitespaceTokenizer, "tokenize") as mock_tokenize:
+            second = dataset_captions.caption_stats(self.test_dir, "whitespace")
+            mock_tokenize.assert_not_called()
+        self.assertEqual(second["length_histogram"], first["length_histogram"])
+
+        time.sleep(0.01)
+        self.write_caption("b", "Matt, photo, outdoors")
+        dataset_index.update_index(self.test_dir)
+        third = dataset_captions.caption_stats(self.test_dir, "whitespace")
+        self.assertEqual(third["newly_tokenized"], 1)
+        self.assertEqual(third["max_observed_length"], 3)
+
+        conn = sqlite3.connect(dataset_index.index_path(self.test_dir))
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM caption_tokens").fetchone()[0], 2)
+        conn.close()
+
+    def test_handler(self):
+        """caption_stats job picks up caption edits through the index"""
+        from handler_fast import handle_heavy_operation
+
+        training_data_dir = os.path.dirname(self.test_dir)
+        training_name = os.path.basename(self.test_dir)
+        self.write_caption("d", "Matt")
+        with patch("handler_fast.TRAINING_DATA_DIR", training_data_dir):
+            result = handle_heavy_operation("caption_stats", {
+                "training_name": training_name, "tokenizer": "whitespace", "caption_dropout_rate": 0.5
+            }, {})
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["captioned"], 4)
+        self.assertEqual(result["expected_dropped_per_epoch"], 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
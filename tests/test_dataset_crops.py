@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for dataset_crops.py and smart crops in prepare_dataset
+Edge-energy crop placement, index caching and bucketed variants
+"""
+
+import sys
+import os
+import sqlite3
+import unittest
+import tempfile
+import shutil
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+import dataset_index
+import dataset_prepare
+import dataset_crops
+
+
+def subject_image(size, subject_box):
+    """Flat gray image with a detailed checkerboard where the subject is"""
+    image = Image.new("RGB", size, (128, 128, 128))
+    draw = ImageDraw.Draw(image)
+    left, top, right, bottom = subject_box
+    for x in range(left, right, 16):
+        for y in range(top, bottom, 16):
+            if (x // 16 + y // 16) % 2:
+                draw.rectangle((x, y, x + 15, y + 15), fill=(255, 255, 255))
+            else:
+                draw.rectangle((x, y, x + 15, y + 15), fill=(0, 0, 0))
+    return image
+
+
+class TestSmartCropBox(unittest.TestCase):
+    """Test crop placement on edge energy"""
+
+    def test_follows_subject(self):
+        """The crop window moves onto an off-center subject"""
+        image = subject_image((2000, 1000), (1500, 300, 1900, 700))
+        box = dataset_crops.smart_crop_boxes(image, [(512, 512)])["512x512"]
+        self.assertEqual(box[2] - box[0], 1000)
+        self.assertEqual((box[1], box[3]), (0, 1000))
+        self.assertLessEqual(box[0], 1500)
+        self.assertGreaterEqual(box[2], 1900)
+
+        tall = subject_image((800, 1600), (100, 50, 700, 400))
+        box = dataset_crops.smart_crop_boxes(tall, [(512, 512)])["512x512"]
+        self.assertEqual(box[3] - box[1], 800)
+        self.assertLessEqual(box[1], 50)
+        self.assertGreaterEqual(box[3], 400)
+
+    def test_flat_image_crops_center(self):
+        """Without edges the center prior wins, matching center_crop_box"""
+        image = Image.new("RGB", (2000, 1000), (90, 90, 90))
+        self.assertEqual(
+            dataset_crops.smart_crop_boxes(image, [(512, 512)])["512x512"],
+            dataset_prepare.center_crop_box(2000, 1000, (512, 512))
+        )
+
+    def test_matching_aspect_is_uncropped(self):
+        """Images already at the bucket aspect ratio keep every pixel"""
+        image = subject_image((1024, 1024), (0, 0, 200, 200))
+        self.assertEqual(dataset_crops.smart_crop_boxes(image, [(512, 512)])["512x512"], (0, 0, 1024, 1024))
+
+
+class TestPrepareSmartCrops(unittest.TestCase):
+    """Test that prepare_dataset applies and caches smart crops"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        # 2000x1000 lands in the 704x320 bucket: ~90 rows are cropped, the subject sits in the bottom 32
+        subject_image((2000, 1000), (0, 968, 2000, 1000)).save(os.path.join(self.test_dir, "bottom.png"))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def variant(self, resolution=512):
+        path = os.path.join(self.test_dir, dataset_prepare.PREPARED_DIRNAME, str(resolution), "bottom.png")
+        with Image.open(path) as image:
+            return image.convert("L")
+
+    def test_variants_use_boxes(self):
+        """The subject survives the crop and the boxes land in the index"""
+        summary = dataset_prepare.prepare_dataset(self.test_dir, resolutions=[512], max_workers=1)
+        self.assertEqual(summary["errors"], [])
+        self.assertEqual(self.variant().getextrema(), (0, 255))
+
+        conn = sqlite3.connect(dataset_index.index_path(self.test_dir))
+        rows = conn.execute("SELECT bucket, upright FROM crop_boxes").fetchall()
+        conn.close()
+        self.assertEqual(rows, [("704x320", 0)])
+
+    def test_cached_boxes_reused(self):
+        """A forced rebuild takes boxes from the index instead of recomputing them"""
+        dataset_prepare.prepare_dataset(self.test_dir, resolutions=[512], max_workers=1)
+        # Move the stored box to the top edge; the rebuilt variant must follow it
+        conn = sqlite3.connect(dataset_index.index_path(self.test_dir))
+        conn.execute("UPDATE crop_boxes SET bottom_px = bottom_px - top_px, top_px = 0")
+        conn.commit()
+        conn.close()
+
+        summary = dataset_prepare.prepare_dataset(self.test_dir, resolutions=[512], force=True, max_workers=1)
+        self.assertEqual(summary["errors"], [])
+        self.assertEqual(self.variant().getextrema(), (128, 128))
+
+    def test_center_opt_out(self):
+        """crop="center" keeps the plain center crop and skips the index"""
+        dataset_prepare.prepare_dataset(self.test_dir, resolutions=[512], crop="center", max_workers=1)
+        self.assertEqual(self.variant().getextrema(), (128, 128))
+        self.assertFalse(os.path.exists(dataset_index.index_path(self.test_dir)))
+        with self.assertRaises(ValueError):
+            dataset_prepare.prepare_dataset(self.test_dir, crop="saliency")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for dataset_dedupe.py and the dataset_dedupe_report handler
+Perceptual hashes, vectorized Hamming distances and duplicate clusters
+"""
+
+import sys
+import os
+import sqlite3
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import dataset_index
+import dataset_dedupe
+
+
+def make_scene(seed, size=(640, 480)):
+    """Random shapes on a gradient, distinct enough per seed to hash apart"""
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, size[0], dtype=np.uint8)[None, :].repeat(size[1], axis=0)
+    image = Image.fromarray(gradient).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.integers(0, size[0]), rng.integers(0, size[1])
+        r = int(rng.integers(20, 120))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(int(c) for c in rng.integers(0, 256, 3)))
+    return image
+
+
+class TestHashing(unittest.TestCase):
+    """Test hash functions and the vectorized comparison"""
+
+    def test_hashes_stable_under_resize_and_recompression(self):
+        """Resized/recompressed copies stay close, different scenes do not"""
+        original = make_scene(1).convert("L")
+        resized = make_scene(1).resize((320, 240)).convert("L")
+        other = make_scene(2).convert("L")
+
+        for hash_function in (dataset_dedupe.dhash, dataset_dedupe.phash):
+            a, b, c = (np.frombuffer(hash_function(image), dtype=">u8").astype(np.uint64)
+                       for image in (original, resized, other))
+            self.assertEqual(len(hash_function(original)), 8)
+            self.assertLessEqual(int(dataset_dedupe.popcount(a ^ b)[0]), dataset_dedupe.DEFAULT_THRESHOLD)
+            self.assertGreater(int(dataset_dedupe.popcount(a ^ c)[0]), dataset_dedupe.DEFAULT_THRESHOLD)
+
+    def test_popcount_fallback(self):
+        """Table-based popcount matches np.bitwise_count"""
+        values = np.array([0, 1, 0xFFFFFFFFFFFFFFFF, 0x8000000000000001], dtype=np.uint64)
+        expected = [0, 1, 64, 2]
+        self.assertEqual(dataset_dedupe.popcount(values).tolist(), expected)
+        self.assertEqual(dataset_dedupe.popcount_lookup(values).tolist(), expected)
+        matrix = values[:, None] ^ values[None, ::-1]
+        self.assertEqual(dataset_dedupe.popcount_lookup(matrix).tolist(),
+                         dataset_dedupe.popcount(matrix).tolist())
+
+    def test_pairs_match_brute_force(self):
+        """Blocked all-pairs comparison finds exactly the brute-force pairs"""
+        rng = np.random.default_rng(0)
+        hashes = rng.integers(0, 2**63, size=300, dtype=np.uint64)
+        # Plant near copies by flipping a few bits
+        hashes[10] = hashes[5] ^ np.uint64(0b101)
+        hashes[200] = hashes[5] ^ np.uint64(1 << 40)
+        hashes[299] = hashes[42]
+
+        pairs_i, pairs_j, distances = dataset_dedupe.near_duplicate_pairs(hashes, threshold=4, block_size=64)
+        found = set(zip(pairs_i.tolist(), pairs_j.tolist(), distances.tolist()))
+
+        expected = set()
+        for i in range(len(hashes)):
+            for j in range(i + 1, len(hashes)):
+                distance = bin(int(hashes[i]) ^ int(hashes[j])).count("1")
+                if distance <= 4:
+                    expected.add((i, j, distance))
+        self.assertEqual(found, expected)
+        self.assertIn((5, 10, 2), found)
+        self.assertIn((42, 299, 0), found)
+
+
+class TestDedupeReport(unittest.TestCase):
+    """Test report generation over an indexed folder"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        make_scene(1).save(os.path.join(self.test_dir, "a.jpg"), quality=95)
+        make_scene(1).resize((480, 360)).save(os.path.join(self.test_dir, "a_small.jpg"), quality=60)
+        make_scene(1).save(os.path.join(self.test_dir, "a_copy.png"))
+        make_scene(2).save(os.path.join(self.test_dir, "b.jpg"))
+        make_scene(3).save(os.path.join(self.test_dir, "c.jpg"))
+        dataset_index.update_index(self.test_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_clusters(self):
+        """Near-duplicates form one cluster with pairwise distances"""
+        for hash_type in dataset_dedupe.HASH_TYPES:
+            report = dataset_dedupe.dedupe_report(self.test_dir, hash_type=hash_type, max_workers=1)
+
+            self.assertEqual(report["image_count"], 5)
+            self.assertEqual(len(report["clusters"]), 1)
+            cluster = report["clusters"][0]
+            self.assertEqual(cluster["images"], ["a.jpg", "a_copy.png", "a_small.jpg"])
+            self.assertEqual(report["duplicate_images"], 2)
+            for pair in cluster["pairs"]:
+                self.assertLessEqual(pair["distance"], report["threshold"])
+                self.assertEqual(pair["distance"], pair[f"{hash_type}_distance"])
+
+    def test_hashes_cached_in_index(self):
+        """Hashes are stored by content and only computed once"""
+        first = dataset_dedupe.dedupe_report(self.test_dir, max_workers=1)
+        with patch("dataset_dedupe.compute_hashes") as mock_compute:
+            second = dataset_dedupe.dedupe_report(self.test_dir, max_workers=1)
+            mock_compute.assert_not_called()
+
+        self.assertEqual(first["hashed"], 5)
+        self.assertEqual(second["hashed"], 0)
+        self.assertEqual(first["clusters"], second["clusters"])
+
+        os.remove(os.path.join(self.test_dir, "c.jpg"))
+        dataset_index.update_index(self.test_dir)
+        dataset_dedupe.update_hashes(self.test_dir)
+        conn = sqlite3.connect(dataset_index.index_path(self.test_dir))
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM image_hashes").fetchone()[0], 4)
+        conn.close()
+
+    def test_migrates_version_1_index(self):
+        """Indexes created before hashes existed gain the hash table"""
+        conn = sqlite3.connect(dataset_index.index_path(self.test_dir))
+        conn.execute("DROP TABLE image_hashes")
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        conn.close()
+
+        report = dataset_dedupe.dedupe_report(self.test_dir, max_workers=1)
+        self.assertEqual(report["hashed"], 5)
+
+    def test_handler(self):
+        """dataset_dedupe_report job returns clusters and rejects bad input"""
+        from handler_fast import handle_heavy_operation
+
+        training_data_dir = os.path.dirname(self.test_dir)
+        training_name = os.path.basename(self.test_dir)
+        with patch("handler_fast.TRAINING_DATA_DIR", training_data_dir):
+            result = handle_heavy_operation(
+                "dataset_dedupe_report", {"training_name": training_name, "threshold": 0}, {}
+            )
+            invalid = handle_heavy_operation(
+                "dataset_dedupe_report", {"training_name": training_name, "hash_type": "ahash"}, {}
+            )
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["threshold"], 0)
+        self.assertEqual(invalid["status"], "error")
+        self.assertIn("hash_type", invalid["error"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for dataset_images.py
+Header-only validation, full decodes and upload-time rejection
+"""
+
+import sys
+import os
+import base64
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dataset_images
+from image_fixtures import image_bytes
+
+
+class TestImageValidation(unittest.TestCase):
+    """Test check_image and validate_images"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def write(self, name, data):
+        path = os.path.join(self.test_dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_valid_images(self):
+        """JPEG, PNG and WebP files pass the header check"""
+        for name, image_format in (("a.jpg", "JPEG"), ("b.png", "PNG"), ("c.webp", "WEBP")):
+            result = dataset_images.check_image(self.write(name, image_bytes(image_format=image_format)))
+            self.assertTrue(result["valid"], result)
+            self.assertEqual((result["width"], result["height"]), (512, 512))
+
+    def test_jpeg_check_uses_draft_mode(self):
+        """JPEG decodability is checked at reduced scale, not with a full decode"""
+        from PIL import JpegImagePlugin
+
+        path = self.write("a.jpg", image_bytes((1024, 1024)))
+        original_draft = JpegImagePlugin.JpegImageFile.draft
+        requested = []
+
+        def spy(image, mode, size):
+            requested.append(size)
+            return original_draft(image, mode, size)
+
+        with patch.object(JpegImagePlugin.JpegImageFile, "draft", spy):
+            result = dataset_images.check_image(path)
+
+        self.assertTrue(result["valid"])
+        self.assertEqual(requested, [(128, 128)])
+        # Dimensions are reported from the header, not the draft decode
+        self.assertEqual((result["width"], result["height"]), (1024, 1024))
+
+    def test_truncated_jpeg_rejected(self):
+        """A truncated JPEG fails even the cheap check"""
+        data = image_bytes((1024, 1024))
+        path = self.write("cut.jpg", data[:len(data) // 2])
+
+        result = dataset_images.check_image(path)
+        self.assertFalse(result["valid"])
+        self.assertIn("truncated", result["error"])
+
+    def test_corrupted_png_rejected(self):
+        """PNG CRC errors are found without inflating pixels"""
+        data = bytearray(image_bytes(image_format="PNG"))
+        data[60] ^= 0xFF
+        result = dataset_images.check_image(self.write("bad.png", bytes(data)))
+        self.assertFalse(result["valid"])
+
+    def test_dimension_and_format_limits(self):
+        """Too small, too large and unsupported images are rejected"""
+        small = dataset_images.check_image(self.write("small.jpg", image_bytes((100, 100))))
+        self.assertIn("too small", small["error"])
+
+        with patch("dataset_images.MAX_IMAGE_PIXELS", 1000 * 1000):
+            large = dataset_images.check_image(self.write("large.jpg", image_bytes((1200, 1200))))
+        self.assertIn("too large", large["error"])
+
+        gif = dataset_images.check_image(self.write("anim.jpg", image_bytes(image_format="GIF", mode="P")))
+        self.assertIn("Unsupported image format", gif["error"])
+
+        text = dataset_images.check_image(self.write("notes.jpg", b"hello"))
+        self.assertFalse(text["valid"])
+
+    def test_validate_images_parallel_modes(self):
+        """Header and full-decode validation agree on a mixed folder"""
+        self.write("ok.jpg", image_bytes())
+        self.write("ok.png", image_bytes(image_format="PNG"))
+        data = image_bytes((1024, 1024))
+        self.write("cut.jpg", data[:len(data) // 2])
+        self.write("ok.txt", b"caption")
+
+        for full_decode in (False, True):
+            results = dataset_images.validate_images(self.test_dir, full_decode=full_decode, max_workers=2)
+            invalid = sorted(r["filename"] for r in results if not r["valid"])
+            self.assertEqual(len(results), 3)
+            self.assertEqual(invalid, ["cut.jpg"])
+
+
+class TestUploadValidation(unittest.TestCase):
+    """Test rejection of bad images during upload"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_upload_rejects_bad_images(self):
+        """Bad images and their captions are removed before indexing"""
+        from handler_fast import handle_heavy_operation
+
+        data = image_bytes((1024, 1024))
+        files = [
+            {"filename": "good.jpg", "content": base64.b64encode(data).decode(), "caption": "Matt"},
+            {"filename": "cut.jpg", "content": base64.b64encode(data[:5000]).decode(), "caption": "Matt"},
+        ]
+        with patch("handler_fast.TRAINING_DATA_DIR", self.test_dir), \
+             patch("handler_fast.THUMBNAIL_CACHE_DIR", os.path.join(self.test_dir, ".thumbnails")):
+            result = handle_heavy_operation("upload_training_data", {"training_name": "ds", "files": files}, {})
+            info = handle_heavy_operation("dataset_info", {"training_name": "ds"}, {})
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual([r["filename"] for r in result["rejected_files"]], ["cut.jpg"])
+        self.assertEqual(sorted(f["filename"] for f in result["uploaded_files"]), ["good.jpg", "good.txt"])
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, "ds", "cut.txt")))
+        self.assertEqual(info["image_count"], 1)
+
+    def test_validate_dataset_job(self):
+        """validate_dataset reports and optionally removes invalid images"""
+        from handler_fast import handle_heavy_operation
+
+        folder = os.path.join(self.test_dir, "ds")
+        os.makedirs(folder)
+        with open(os.path.join(folder, "good.jpg"), "wb") as f:
+            f.write(image_bytes())
+        with open(os.path.join(folder, "bad.jpg"), "wb") as f:
+            f.write(b"garbage")
+
+        with patch("handler_fast.TRAINING_DATA_DIR", self.test_dir):
+            report = handle_heavy_operation("validate_dataset", {"training_name": "ds", "full_decode": True}, {})
+            cleaned = handle_heavy_operation("validate_dataset", {"training_name": "ds", "remove_invalid": True}, {})
+
+        self.assertEqual([r["filename"] for r in report["invalid"]], ["bad.jpg"])
+        self.assertEqual(report["removed"], [])
+        self.assertEqual(cleaned["removed"], ["bad.jpg"])
+        self.assertFalse(os.path.exists(os.path.join(folder, "bad.jpg")))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
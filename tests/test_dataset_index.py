@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for dataset_index.py and the dataset_info handler
+Index building during upload, incremental refresh and index-only queries
+"""
+
+import sys
+import os
+import time
+import base64
+import hashlib
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dataset_index
+from image_fixtures import image_bytes
+
+
+class TestDatasetIndex(unittest.TestCase):
+    """Test index building and queries"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def write(self, name, data):
+        path = os.path.join(self.test_dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def rows(self):
+        conn = dataset_index.open_index(self.test_dir)
+        try:
+            return {row["filename"]: dict(row) for row in conn.execute("SELECT * FROM images")}
+        finally:
+            conn.close()
+
+    def test_metadata_columns(self):
+        """Index rows hold size, hash, dimensions, mode, EXIF orientation, caption and bucket"""
+        data = image_bytes((1200, 1600), orientation=6)
+        self.write("IMG_0405.jpg", data)
+        self.write("IMG_0405.txt", b"Matt, photo")
+        self.write("logo.png", image_bytes((512, 512), "PNG", mode="L"))
+
+        result = dataset_index.update_index(self.test_dir)
+        rows = self.rows()
+
+        self.assertEqual(result["indexed"], 2)
+        photo = rows["IMG_0405.jpg"]
+        self.assertEqual(photo["size"], len(data))
+        self.assertEqual(photo["sha256"], hashlib.sha256(data).hexdigest())
+        self.assertEqual((photo["width"], photo["height"]), (1200, 1600))
+        self.assertEqual((photo["mode"], photo["format"]), ("RGB", "JPEG"))
+        self.assertEqual(photo["exif_orientation"], 6)
+        self.assertEqual(photo["caption"], "Matt, photo")
+        # Rotated by EXIF: displayed landscape, so the bucket is wider than tall
+        width, height = map(int, photo["bucket"].split("x"))
+        self.assertGreater(width, height)
+        self.assertEqual(rows["logo.png"]["mode"], "L")
+        self.assertIsNone(rows["logo.png"]["caption"])
+
+    def test_incremental_refresh(self):
+        """Unchanged images are not re-read; captions and removals are picked up"""
+        self.write("a.jpg", image_bytes((800, 800)))
+        self.write("b.jpg", image_bytes((800, 600)))
+        dataset_index.update_index(self.test_dir)
+
+        time.sleep(0.01)
+        self.write("a.txt", b"new caption")
+        os.remove(os.path.join(self.test_dir, "b.jpg"))
+        with patch("dataset_index.read_image_metadata") as mock_read:
+            result = dataset_index.update_index(self.test_dir)
+            mock_read.assert_not_called()
+
+        self.assertEqual(result["removed"], ["b.jpg"])
+        self.assertEqual(result["captions_refreshed"], 1)
+        self.assertEqual(self.rows()["a.jpg"]["caption"], "new caption")
+
+    def test_known_hashes_skip_rehash(self):
+        """Hashes computed during upload are reused"""
+        self.write("a.jpg", image_bytes((600, 600)))
+        dataset_index.update_index(self.test_dir, known_hashes={"a.jpg": "f" * 64})
+        self.assertEqual(self.rows()["a.jpg"]["sha256"], "f" * 64)
+
+    def test_dataset_info(self):
+        """Counts, histograms and missing captions come from the index"""
+        self.write("small.jpg", image_bytes((400, 400)))
+        self.write("mid.jpg", image_bytes((800, 800)))
+        self.write("big.jpg", image_bytes((1300, 1300)))
+        self.write("big.txt", b"Matt")
+        self.write("broken.jpg", b"not an image")
+        dataset_index.update_index(self.test_dir)
+
+        info = dataset_index.dataset_info(self.test_dir)
+
+        self.assertEqual(info["image_count"], 4)
+        self.assertEqual(info["resolution_histogram"],
+                         {"below_512": 1, "512": 0, "768": 1, "1024": 0, "1280": 1})
+        self.assertEqual(info["missing_captions"], ["broken.jpg", "mid.jpg", "small.jpg"])
+        self.assertEqual([e["filename"] for e in info["unreadable"]], ["broken.jpg"])
+        self.assertEqual(sum(info["bucket_histogram"].values()), 3)
+
+
+class TestDatasetInfoHandler(unittest.TestCase):
+    """Test the upload -> dataset_info flow through the handler"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_upload_builds_index(self):
+        """Uploading indexes images so dataset_info needs no file reads"""
+        from handler_fast import handle_heavy_operation
+
+        files = [
+            {"filename": "a.jpg", "content": base64.b64encode(image_bytes((1024, 1024))).decode(),
+             "caption": "Matt, photo"},
+            {"filename": "b.jpg", "content": base64.b64encode(image_bytes((640, 960))).decode()},
+        ]
+        with patch("handler_fast.TRAINING_DATA_DIR", self.test_dir), \
+             patch("handler_fast.THUMBNAIL_CACHE_DIR", os.path.join(self.test_dir, ".thumbnails")):
+            upload = handle_heavy_operation("upload_training_data", {"training_name": "ds", "files": files}, {})
+            self.assertEqual(upload["status"], "success")
+
+            with patch("dataset_index.read_image_metadata") as mock_read:
+                info = handle_heavy_operation("dataset_info", {"training_name": "ds"}, {})
+                mock_read.assert_not_called()
+
+        self.assertEqual(info["status"], "success")
+        self.assertTrue(info["dataset_complete"])
+        self.assertEqual(info["image_count"], 2)
+        self.assertEqual(info["missing_captions"], ["b.jpg"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
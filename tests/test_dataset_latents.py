@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for dataset_latents.py and the latent_cache handler
+Latent keys, harvesting finished runs, planning and linking - no GPU needed
+"""
+
+import sys
+import os
+import json
+import struct
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yaml
+from PIL import Image
+
+import dataset_prepare
+import dataset_latents
+
+VAE = dataset_latents.vae_identity("black-forest-labs/FLUX.1-dev")
+
+
+def write_latent(path, bucket, channels=16):
+    """Minimal .safetensors file shaped like a cached latent for bucket"""
+    width, height = bucket[0] // 8, bucket[1] // 8
+    size = channels * height * width * 2
+    header = json.dumps({
+        "latent": {"dtype": "F16", "shape": [channels, height, width], "data_offsets": [0, size]}
+    }).encode()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(header)) + header + b"\0" * size)
+
+
+class TestLatentCache(unittest.TestCase):
+    """Test harvest, plan and link across datasets"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.store = os.path.join(self.test_dir, "store")
+        self.images = {
+            "a.jpg": Image.new("RGB", (1024, 1024), (10, 20, 30)),
+            "b.jpg": Image.new("RGB", (1024, 768), (40, 50, 60)),
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def make_dataset(self, name, renames=None):
+        folder = os.path.join(self.test_dir, name)
+        os.makedirs(folder)
+        for filename, image in self.images.items():
+            image.save(os.path.join(folder, (renames or {}).get(filename, filename)))
+        return folder
+
+    def simulate_run(self, folder, resolution=512):
+        """Write latents the way a cache_latents_to_disk run would"""
+        for filename, image in self.images.items():
+            bucket = dataset_prepare.assign_bucket(image.width, image.height, resolution)
+            stem = os.path.splitext(filename)[0]
+            write_latent(os.path.join(folder, "_latent_cache", f"{stem}_Xy9{bucket[0]}.safetensors"), bucket)
+
+    def test_vae_identity(self):
+        """VAE ids are stable and change with the VAE"""
+        self.assertEqual(VAE, dataset_latents.vae_identity_from_model(
+            {"name_or_path": "black-forest-labs/FLUX.1-dev", "quantize": True}
+        ))
+        self.assertNotEqual(VAE, dataset_latents.vae_identity("black-forest-labs/FLUX.1-dev", vae_path="other/vae"))
+
+    def test_latent_bucket_from_header(self):
+        """The bucket is read from the tensor shape in the safetensors header"""
+        path = os.path.join(self.test_dir, "x.safetensors")
+        write_latent(path, (576, 448))
+        self.assertEqual(dataset_latents.latent_bucket(path), (576, 448))
+
+    def test_reuse_across_runs(self):
+        """Latents of a finished run are reused by a new dataset with the same images"""
+        first = self.make_dataset("first")
+        plan = dataset_latents.plan_latents(first, self.store, VAE, [512])
+        self.assertEqual((plan["total"], plan["missing"]), (2, 2))
+
+        self.simulate_run(first)
+        harvest = dataset_latents.harvest_latents(first, self.store, VAE)
+        self.assertEqual((harvest["harvested"], harvest["unmatched"]), (2, []))
+        for name in os.listdir(os.path.join(first, "_latent_cache")):
+            self.assertTrue(os.path.islink(os.path.join(first, "_latent_cache", name)))
+        self.assertEqual(dataset_latents.plan_latents(first, self.store, VAE, [512])["linked"], 2)
+
+        second = self.make_dataset("second")
+        plan = dataset_latents.plan_latents(second, self.store, VAE, [512, 1024])
+        self.assertEqual((plan["reusable"], plan["missing"]), (2, 1))
+
+        linked = dataset_latents.link_latents(second, plan)
+        self.assertEqual(sorted(linked), sorted(os.listdir(os.path.join(first, "_latent_cache"))))
+        for name in linked:
+            self.assertEqual(dataset_latents.latent_bucket(os.path.join(second, "_latent_cache", name))[0] % 64, 0)
+        self.assertEqual(dataset_latents.plan_latents(second, self.store, VAE, [512])["linked"], 2)
+
+        # Harvesting again only sees symlinks, nothing is moved twice
+        self.assertEqual(dataset_latents.harvest_latents(second, self.store, VAE)["harvested"], 0)
+
+    def test_other_vae_and_renamed_files(self):
+        """A different VAE never reuses latents; renamed files are reusable but unlinkable"""
+        first = self.make_dataset("first")
+        self.simulate_run(first)
+        dataset_latents.harvest_latents(first, self.store, VAE)
+
+        other_vae = dataset_latents.vae_identity("stabilityai/sdxl-vae")
+        self.assertEqual(dataset_latents.plan_latents(first, self.store, other_vae, [512])["missing"], 2)
+
+        renamed = self.make_dataset("renamed", {"a.jpg": "portrait_01.jpg"})
+        plan = dataset_latents.plan_latents(renamed, self.store, VAE, [512])
+        self.assertEqual((plan["reusable"], plan["unlinkable"]), (2, 1))
+        self.assertEqual(dataset_latents.link_latents(renamed, plan), [
+            e["cache_name"] for e in plan["entries"] if e["filename"] == "b.jpg"
+        ])
+
+    def test_unmatched_latents(self):
+        """Latents without a matching image stay where they are"""
+        first = self.make_dataset("first")
+        write_latent(os.path.join(first, "_latent_cache", "ghost_abc.safetensors"), (512, 512))
+        harvest = dataset_latents.harvest_latents(first, self.store, VAE)
+        self.assertEqual(harvest["unmatched"], ["ghost_abc.safetensors"])
+        self.assertFalse(os.path.islink(os.path.join(first, "_latent_cache", "ghost_abc.safetensors")))
+
+
+class TestLatentCacheHandler(unittest.TestCase):
+    """Test the latent_cache job"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.test_dir, "ds"))
+        Image.new("RGB", (1024, 1024)).save(os.path.join(self.test_dir, "ds", "a.jpg"))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def run_job(self, job_input):
+        from handler_fast import handle_heavy_operation
+        with patch("handler_fast.TRAINING_DATA_DIR", self.test_dir), \
+             patch("handler_fast.LATENT_CACHE_DIR", os.path.join(self.test_dir, ".latents")):
+            return handle_heavy_operation("latent_cache", job_input, {"yaml": yaml})
+
+    def test_plan_from_yaml(self):
+        """VAE and resolutions come from the training config"""
+        config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "training.yaml")
+        with open(config_path) as f:
+            yaml_config = f.read()
+
+        result = self.run_job({"training_name": "ds", "yaml_config": yaml_config})
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["vae_id"], VAE)
+        self.assertEqual(sorted({e["resolution"] for e in result["entries"]}), [512, 768, 1024])
+        self.assertEqual(result["missing"], 3)
+
+    def test_errors(self):
+        """Missing VAE identity and unknown actions are rejected"""
+        self.assertEqual(self.run_job({"training_name": "ds"})["status"], "error")
+        result = self.run_job({"training_name": "ds", "model": {"name_or_path": "x"}, "action": "purge"})
+        self.assertEqual(result["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for dataset_normalize.py
+EXIF transpose, mode conversion, content-hash caching and pipeline integration
+"""
+
+import sys
+import os
+import io
+import base64
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import dataset_index
+import dataset_normalize
+from image_fixtures import image_bytes
+
+
+class TestNormalizeImage(unittest.TestCase):
+    """Test the per-image normalization"""
+
+    def open(self, data):
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        return image
+
+    def test_exif_transpose(self):
+        """Rotated phone photos come out upright"""
+        result = dataset_normalize.normalize_image(self.open(image_bytes((400, 300), orientation=6)))
+        self.assertEqual((result.size, result.mode), ((300, 400), "RGB"))
+
+    def test_modes(self):
+        """RGBA/P are flattened onto white, CMYK and L become RGB"""
+        rgba = dataset_normalize.normalize_image(self.open(image_bytes((64, 64), "PNG", "RGBA", alpha=0)))
+        self.assertEqual((rgba.mode, rgba.getpixel((0, 0))), ("RGB", (255, 255, 255)))
+
+        palette = Image.new("P", (64, 64), 0)
+        palette.info["transparency"] = 0
+        self.assertEqual(dataset_normalize.normalize_image(palette).getpixel((5, 5)), (255, 255, 255))
+
+        cmyk = dataset_normalize.normalize_image(self.open(image_bytes((64, 64), mode="CMYK", color=(0, 255, 255, 0))))
+        self.assertEqual(cmyk.mode, "RGB")
+        red, green, blue = cmyk.getpixel((0, 0))
+        self.assertGreater(red, 200)
+        self.assertLess(green, 60)
+
+        gray = dataset_normalize.normalize_image(Image.new("L", (64, 64), 128))
+        self.assertEqual(gray.getpixel((0, 0)), (128, 128, 128))
+
+    def test_needs_normalization(self):
+        """Clean RGB JPEGs are left alone"""
+        with tempfile.TemporaryDirectory() as folder:
+            cases = {
+                "clean.jpg": (image_bytes((64, 64)), False),
+                "rotated.jpg": (image_bytes((64, 64), orientation=8), True),
+                "alpha.png": (image_bytes((64, 64), "PNG", "RGBA"), True),
+                "cmyk.jpg": (image_bytes((64, 64), mode="CMYK"), True),
+            }
+            for name, (data, expected) in cases.items():
+                path = os.path.join(folder, name)
+                with open(path, "wb") as f:
+                    f.write(data)
+                self.assertEqual(dataset_normalize.needs_normalization(path), expected, name)
+
+
+class TestNormalizeImages(unittest.TestCase):
+    """Test folder normalization and the cache"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.test_dir, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def make_folder(self, name, files):
+        folder = os.path.join(self.test_dir, name)
+        os.makedirs(folder)
+        for filename, data in files.items():
+            with open(os.path.join(folder, filename), "wb") as f:
+                f.write(data)
+        return folder
+
+    def test_normalize_folder(self):
+        """Images are replaced in place, renamed to .jpg where needed"""
+        files = {
+            "logo.png": image_bytes((300, 300), "PNG", "RGBA"),
+            "logo.txt": b"Matt, logo",
+            "clean.jpg": image_bytes((300, 300)),
+            "phone.jpg": image_bytes((400, 300), orientation=6),
+        }
+        folder = self.make_folder("ds", files)
+
+        normalized, errors = dataset_normalize.normalize_images(
+            folder, self.cache_dir, ["logo.png", "clean.jpg", "phone.jpg"], max_workers=2
+        )
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted((n["filename"], n["normalized_filename"]) for n in normalized),
+                         [("logo.png", "logo.jpg"), ("phone.jpg", "phone.jpg")])
+        self.assertEqual(sorted(os.listdir(folder)), ["clean.jpg", "logo.jpg", "logo.txt", "phone.jpg"])
+        with open(os.path.join(folder, "clean.jpg"), "rb") as f:
+            self.assertEqual(f.read(), files["clean.jpg"])
+        with Image.open(os.path.join(folder, "phone.jpg")) as image:
+            self.assertEqual(image.size, (300, 400))
+            self.assertIsNone(image.getexif().get(dataset_index.EXIF_ORIENTATION_TAG))
+
+    def test_cache_reused_across_datasets(self):
+        """The same content is only decoded and re-encoded once"""
+        data = image_bytes((400, 300), orientation=3)
+        first = self.make_folder("one", {"a.jpg": data})
+        second = self.make_folder("two", {"b.jpg": data})
+
+        dataset_normalize.normalize_images(first, self.cache_dir, ["a.jpg"])
+        with patch("dataset_normalize.normalize_to_cache") as mock_normalize:
+            normalized, errors = dataset_normalize.normalize_images(second, self.cache_dir, ["b.jpg"])
+            mock_normalize.assert_not_called()
+
+        self.assertEqual(errors, [])
+        with open(os.path.join(first, "a.jpg"), "rb") as a, open(os.path.join(second, "b.jpg"), "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+        # A different quality is a different cache entry
+        other = self.make_folder("three", {"c.jpg": data})
+        dataset_normalize.normalize_images(other, self.cache_dir, ["c.jpg"], quality=70)
+        self.assertTrue(os.path.exists(
+            dataset_normalize.normalized_cache_path(self.cache_dir, normalized[0]["source_sha256"], 70)
+        ))
+
+    def test_name_collision(self):
+        """An image whose .jpg name is taken is kept and reported"""
+        folder = self.make_folder("ds", {
+            "x.png": image_bytes((64, 64), "PNG", "RGBA"),
+            "x.jpg": image_bytes((64, 64)),
+        })
+        normalized, errors = dataset_normalize.normalize_images(folder, self.cache_dir, ["x.png", "x.jpg"])
+
+        self.assertEqual(normalized, [])
+        self.assertEqual([e["filename"] for e in errors], ["x.png"])
+        self.assertTrue(os.path.exists(os.path.join(folder, "x.png")))
+
+
+class TestNormalizePipeline(unittest.TestCase):
+    """Test the normalize options of upload and prepare"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def run_job(self, job_type, job_input):
+        from handler_fast import handle_heavy_operation
+        with patch("handler_fast.TRAINING_DATA_DIR", self.test_dir), \
+             patch("handler_fast.THUMBNAIL_CACHE_DIR", os.path.join(self.test_dir, ".thumbnails")), \
+             patch("handler_fast.NORMALIZE_CACHE_DIR", os.path.join(self.test_dir, ".normalized")):
+            return handle_heavy_operation(job_type, job_input, {})
+
+    def test_upload_normalize(self):
+        """Uploaded images are normalized before indexing"""
+        files = [
+            {"filename": "phone.jpg", "content": base64.b64encode(image_bytes((1200, 900), orientation=6)).decode(),
+             "caption": "Matt"},
+            {"filename": "logo.png", "content": base64.b64encode(image_bytes((600, 600), "PNG", "RGBA")).decode()},
+        ]
+        upload = self.run_job("upload_training_data",
+                              {"training_name": "ds", "files": files, "normalize": True, "normalize_quality": 90})
+        info = self.run_job("dataset_info", {"training_name": "ds"})
+
+        self.assertEqual(upload["status"], "success")
+        self.assertEqual(len(upload["normalized_files"]), 2)
+        self.assertIn("logo.jpg", [f["filename"] for f in upload["uploaded_files"]])
+        self.assertEqual(info["exif_rotated"], 0)
+        self.assertEqual(info["modes"], {"RGB": 2})
+
+    def test_prepare_normalize(self):
+        """prepare_dataset with normalize buckets the upright image"""
+        folder = os.path.join(self.test_dir, "ds")
+        os.makedirs(folder)
+        with open(os.path.join(folder, "phone.jpg"), "wb") as f:
+            f.write(image_bytes((1200, 900), orientation=6))
+
+        raw = self.run_job("prepare_dataset", {"training_name": "ds", "resolutions": [512]})
+        normalized = self.run_job("prepare_dataset", {"training_name": "ds", "resolutions": [512], "normalize": True})
+
+        self.assertEqual(normalized["processed"], 1)
+        raw_width, raw_height = map(int, list(raw["buckets"]["512"])[0].split("x"))
+        width, height = map(int, list(normalized["buckets"]["512"])[0].split("x"))
+        self.assertGreater(raw_width, raw_height)
+        self.assertLess(width, height)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for dataset_prepare.py and the prepare_dataset handler
+Aspect-ratio buckets, resized variants and incremental re-runs
+"""
+
+import sys
+import os
+import time
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import dataset_prepare
+
+
+def make_image(folder, name, size, mode="RGB", color=(200, 120, 40)):
+    path = os.path.join(folder, name)
+    if mode == "RGBA":
+        color = color + (128,)
+    Image.new(mode, size, color).save(path)
+    return path
+
+
+class TestBuckets(unittest.TestCase):
+    """Test bucket generation and assignment"""
+
+    def test_bucket_sizes(self):
+        """Buckets are divisible by 64 and close to the target area"""
+        for resolution in dataset_prepare.DEFAULT_RESOLUTIONS:
+            buckets = dataset_prepare.bucket_sizes(resolution)
+            self.assertIn((resolution, resolution), buckets)
+            for width, height in buckets:
+                self.assertEqual(width % 64, 0)
+                self.assertEqual(height % 64, 0)
+                self.assertLessEqual(width * height, resolution * resolution)
+                self.assertLessEqual(max(width / height, height / width), 4.0)
+
+    def test_assign_bucket(self):
+        """Images land in the bucket with the closest aspect ratio"""
+        self.assertEqual(dataset_prepare.assign_bucket(1000, 1000, 1024), (1024, 1024))
+        width, height = dataset_prepare.assign_bucket(1600, 2000, 1024)
+        self.assertLess(width, height)
+        self.assertAlmostEqual(width / height, 0.8, delta=0.05)
+        width, height = dataset_prepare.assign_bucket(4000, 1000, 512)
+        self.assertAlmostEqual(width / height, 4.0, delta=0.5)
+
+    def test_center_crop_box(self):
+        """Crop boxes keep the bucket aspect ratio"""
+        box = dataset_prepare.center_crop_box(2000, 1000, (512, 512))
+        self.assertEqual(box, (500, 0, 1500, 1000))
+        box = dataset_prepare.center_crop_box(1000, 2000, (512, 512))
+        self.assertEqual(box, (0, 500, 1000, 1500))
+
+
+class TestPrepareDataset(unittest.TestCase):
+    """Test the prepare pipeline on a small dataset"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        make_image(self.test_dir, "portrait.jpg", (1600, 2000))
+        make_image(self.test_dir, "wide.png", (2400, 800), mode="RGBA")
+        make_image(self.test_dir, "small.jpg", (600, 600))
+        with open(os.path.join(self.test_dir, "portrait.txt"), "w") as f:
+            f.write("Matt, photo")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def prepared(self, resolution, name):
+        return os.path.join(self.test_dir, "_prepared", str(resolution), name)
+
+    def test_variants_written_per_resolution(self):
+        """Each resolution gets bucketed variants and caption copies"""
+        summary = dataset_prepare.prepare_dataset(self.test_dir, resolutions=[512, 1024], max_workers=2)
+
+        self.assertEqual(summary["processed"], 3)
+        self.assertEqual(summary["errors"], [])
+        with Image.open(self.prepared(1024, "portrait.jpg")) as image:
+            self.assertEqual(image.size, dataset_prepare.assign_bucket(1600, 2000, 1024))
+        with open(self.prepared(512, "portrait.txt")) as f:
+            self.assertEqual(f.read(), "Matt, photo")
+
+        # small.jpg is never upscaled to 1024
+        self.assertTrue(os.path.exists(self.prepared(512, "small.jpg")))
+        self.assertFalse(os.path.exists(self.prepared(1024, "small.jpg")))
+        self.assertEqual(sum(summary["buckets"]["1024"].values()), 2)
+        self.assertEqual(len(summary["dataset_entries"]), 2)
+
+    def test_incremental_rerun(self):
+        """Unchanged images are skipped, changed and removed ones are handled"""
+        dataset_prepare.prepare_dataset(self.test_dir, resolutions=[512], max_workers=1)
+
+        summary = dataset_prepare.prepare_dataset(self.test_dir, resolutions=[512], max_workers=1)
+        self.assertEqual((summary["processed"], summary["skipped"]), (0, 3))
+
+        time.sleep(0.01)
+        make_image(self.test_dir, "small.jpg", (800, 400))
+        os.remove(os.path.join(self.test_dir, "wide.png"))
+        with open(os.path.join(self.test_dir, "portrait.txt"), "w") as f:
+            f.write("Matt, portrait")
+
+        summary = dataset_prepare.prepare_dataset(self.test_dir, resolutions=[512], max_workers=1)
+        self.assertEqual((summary["processed"], summary["skipped"]), (1, 1))
+        self.assertEqual(summary["removed"], ["wide.png"])
+        self.assertFalse(os.path.exists(self.prepared(512, "wide.png")))
+        with open(self.prepared(512, "portrait.txt")) as f:
+            self.assertEqual(f.read(), "Matt, portrait")
+
+    def test_settings_change_rebuilds(self):
+        """Changing resolutions reprocesses every image"""
+        dataset_prepare.prepare_dataset(self.test_dir, resolutions=[512], max_workers=1)
+        summary = dataset_prepare.prepare_dataset(self.test_dir, resolutions=[768], max_workers=1)
+
+        self.assertEqual(summary["processed"], 3)
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, "_prepared", "512")))
+
+    def test_corrupted_image_reported(self):
+        """Unreadable images are reported, not fatal"""
+        with open(os.path.join(self.test_dir, "broken.jpg"), "wb") as f:
+            f.write(b"not an image")
+
+        summary = dataset_prepare.prepare_dataset(self.test_dir, resolutions=[512], max_workers=1)
+
+        self.assertEqual([e["filename"] for e in summary["errors"]], ["broken.jpg"])
+        self.assertEqual(summary["processed"], 3)
+
+    def test_prepare_dataset_handler(self):
+        """prepare_dataset job runs against a training folder"""
+        from handler_fast import handle_heavy_operation
+
+        training_data_dir = os.path.dirname(self.test_dir)
+        training_name = os.path.basename(self.test_dir)
+        with patch("handler_fast.TRAINING_DATA_DIR", training_data_dir):
+            result = handle_heavy_operation(
+                "prepare_dataset", {"training_name": training_name, "resolutions": [512]}, {}
+            )
+            missing = handle_heavy_operation("prepare_dataset", {"training_name": "missing_ds"}, {})
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["processed"], 3)
+        self.assertEqual(missing["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for dataset_shard.py and the dataset_shard handler
+Packing, zero-copy mmap reads and unpacking back to files
+"""
+
+import sys
+import os
+import time
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import dataset_shard
+
+
+class TestShardFormat(unittest.TestCase):
+    """Test pack_folder, ShardReader and unpack_shard"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.folder = os.path.join(self.test_dir, "ds")
+        os.makedirs(self.folder)
+        self.contents = {}
+        for i in range(5):
+            self.write(f"img_{i}.jpg", os.urandom(1000 + i * 37))
+            self.write(f"img_{i}.txt", f"Matt, photo {i}".encode())
+        self.write(".dataset_index.sqlite", b"hidden files are not packed")
+        self.shard = os.path.join(self.test_dir, "out", "ds.shard")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def write(self, name, data):
+        with open(os.path.join(self.folder, name), "wb") as f:
+            f.write(data)
+        if not name.startswith("."):
+            self.contents[name] = data
+
+    def test_pack_and_read(self):
+        """Every file is readable from the mmap as a zero-copy view"""
+        summary = dataset_shard.pack_folder(self.folder, self.shard)
+
+        self.assertEqual(summary["file_count"], 10)
+        self.assertEqual(summary["data_bytes"], sum(len(d) for d in self.contents.values()))
+        with dataset_shard.ShardReader(self.shard) as reader:
+            self.assertEqual(len(reader), 10)
+            # Images sit next to their captions
+            self.assertEqual(reader.names()[:2], ["img_0.jpg", "img_0.txt"])
+            for name, data in self.contents.items():
+                view = reader.read(name)
+                self.assertIsInstance(view, memoryview)
+                self.assertTrue(view.readonly)
+                self.assertEqual(view.tobytes(), data)
+                view.release()
+
+            samples = list(reader.samples())
+            self.assertEqual([s[0] for s in samples], [f"img_{i}.jpg" for i in range(5)])
+            self.assertEqual(samples[3][2], "Matt, photo 3")
+            self.assertEqual(samples[3][1].tobytes(), self.contents["img_3.jpg"])
+            for sample in samples:
+                sample[1].release()
+            self.assertEqual(reader.verify(), [])
+
+    def test_repack_only_on_change(self):
+        """Unchanged folders are not rewritten"""
+        dataset_shard.pack_folder(self.folder, self.shard)
+        self.assertTrue(dataset_shard.pack_folder(self.folder, self.shard)["skipped"])
+
+        time.sleep(0.01)
+        self.write("img_9.jpg", b"new image")
+        summary = dataset_shard.pack_folder(self.folder, self.shard)
+        self.assertFalse(summary["skipped"])
+        self.assertEqual(summary["file_count"], 11)
+
+    def test_corruption_detected(self):
+        """verify() and unpack catch bytes that changed inside the shard"""
+        dataset_shard.pack_folder(self.folder, self.shard)
+        entry = dataset_shard.read_shard_index(self.shard)["files"][2]
+        with open(self.shard, "r+b") as f:
+            f.seek(entry["offset"])
+            f.write(b"\0" * 4)
+
+        with dataset_shard.ShardReader(self.shard) as reader:
+            self.assertEqual(reader.verify(), [entry["name"]])
+        with self.assertRaises(ValueError):
+            dataset_shard.unpack_shard(self.shard, os.path.join(self.test_dir, "restored"))
+
+    def test_not_a_shard(self):
+        """Random files are rejected"""
+        path = os.path.join(self.test_dir, "random.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(100))
+        with self.assertRaises(ValueError):
+            dataset_shard.ShardReader(path)
+
+    def test_unpack(self):
+        """Unpacking restores the folder layout and skips files already present"""
+        dataset_shard.pack_folder(self.folder, self.shard)
+        restored = os.path.join(self.test_dir, "restored")
+
+        summary = dataset_shard.unpack_shard(self.shard, restored)
+        self.assertEqual(len(summary["unpacked"]), 10)
+        for name, data in self.contents.items():
+            with open(os.path.join(restored, name), "rb") as f:
+                self.assertEqual(f.read(), data)
+
+        os.remove(os.path.join(restored, "img_1.txt"))
+        summary = dataset_shard.unpack_shard(self.shard, restored)
+        self.assertEqual(summary["unpacked"], ["img_1.txt"])
+        self.assertEqual(len(summary["skipped"]), 9)
+
+        # Same size, different content: replaced, not skipped
+        stale = os.path.join(restored, "img_2.txt")
+        with open(stale, "wb") as f:
+            f.write(bytes(len(self.contents["img_2.txt"])))
+        summary = dataset_shard.unpack_shard(self.shard, restored)
+        self.assertEqual(summary["unpacked"], ["img_2.txt"])
+        with open(stale, "rb") as f:
+            self.assertEqual(f.read(), self.contents["img_2.txt"])
+
+
+class TestShardHandler(unittest.TestCase):
+    """Test the dataset_shard job"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.folder = os.path.join(self.test_dir, "ds")
+        os.makedirs(self.folder)
+        for i in range(3):
+            Image.new("RGB", (600, 600), (i * 40, 80, 120)).save(os.path.join(self.folder, f"{i}.jpg"))
+            with open(os.path.join(self.folder, f"{i}.txt"), "w") as f:
+                f.write(f"Matt {i}")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def run_job(self, job_type, job_input):
+        from handler_fast import handle_heavy_operation
+        with patch("handler_fast.TRAINING_DATA_DIR", self.test_dir):
+            return handle_heavy_operation(job_type, job_input, {})
+
+    def test_pack_unpack_dataset(self):
+        """Originals round-trip through a shard and the dataset is re-committed"""
+        packed = self.run_job("dataset_shard", {"training_name": "ds"})
+        self.assertEqual(packed["status"], "success")
+        self.assertEqual(packed["file_count"], 6)
+        self.assertTrue(packed["shard_path"].endswith(os.path.join("_shards", "dataset.shard")))
+
+        os.remove(os.path.join(self.folder, "1.jpg"))
+        unpacked = self.run_job("dataset_shard", {"training_name": "ds", "action": "unpack"})
+        info = self.run_job("dataset_info", {"training_name": "ds"})
+
+        self.assertEqual(unpacked["unpacked"], ["1.jpg"])
+        self.assertEqual(info["image_count"], 3)
+        self.assertTrue(info["dataset_complete"])
+
+    def test_pack_prepared_resolution(self):
+        """A prepared resolution is packed into its own shard"""
+        missing = self.run_job("dataset_shard", {"training_name": "ds", "resolution": 512})
+        self.assertEqual(missing["status"], "error")
+
+        self.run_job("prepare_dataset", {"training_name": "ds", "resolutions": [512]})
+        packed = self.run_job("dataset_shard", {"training_name": "ds", "resolution": 512})
+
+        self.assertEqual(packed["status"], "success")
+        self.assertEqual(packed["file_count"], 6)
+        self.assertTrue(packed["shard_path"].endswith("512.shard"))
+
+        invalid = self.run_job("dataset_shard", {"training_name": "ds", "action": "explode"})
+        self.assertEqual(invalid["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
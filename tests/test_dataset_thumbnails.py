@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for dataset_thumbnails.py and the dataset_thumbnails handler
+Thumbnail generation, content-hash caching and paged responses
+"""
+
+import sys
+import os
+import io
+import base64
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import dataset_index
+import dataset_thumbnails
+from image_fixtures import image_bytes
+
+
+class TestThumbnails(unittest.TestCase):
+    """Test thumbnail generation and caching"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.folder = os.path.join(self.test_dir, "ds")
+        self.cache_dir = os.path.join(self.test_dir, "cache")
+        os.makedirs(self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def write(self, name, data):
+        with open(os.path.join(self.folder, name), "wb") as f:
+            f.write(data)
+
+    def test_make_thumbnail(self):
+        """Thumbnails fit the box, follow EXIF rotation and keep alpha"""
+        self.write("phone.jpg", image_bytes((1600, 1200), orientation=6))
+        self.write("logo.png", image_bytes((800, 400), "PNG", mode="RGBA"))
+        target = os.path.join(self.cache_dir, "t.webp")
+
+        self.assertEqual(dataset_thumbnails.make_thumbnail(os.path.join(self.folder, "phone.jpg"), target),
+                         (192, 256))
+        with Image.open(target) as image:
+            self.assertEqual(image.format, "WEBP")
+        self.assertLess(os.path.getsize(target), 50 * 1024)
+
+        dataset_thumbnails.make_thumbnail(os.path.join(self.folder, "logo.png"), target, size=128)
+        with Image.open(target) as image:
+            self.assertEqual((image.size, image.mode), ((128, 64), "RGBA"))
+
+    def test_cached_by_content_hash(self):
+        """Identical images share one thumbnail and are never regenerated"""
+        data = image_bytes((800, 800))
+        self.write("a.jpg", data)
+        self.write("a_copy.jpg", data)
+        self.write("b.jpg", image_bytes((640, 480)))
+        self.write("broken.jpg", b"not an image")
+        dataset_index.update_index(self.folder)
+
+        first = dataset_thumbnails.generate_thumbnails(self.folder, self.cache_dir, max_workers=2)
+        self.assertEqual((first["generated"], first["cached"], first["errors"]), (2, 0, []))
+
+        with patch("dataset_thumbnails.make_thumbnail") as mock_make:
+            second = dataset_thumbnails.generate_thumbnails(self.folder, self.cache_dir)
+            mock_make.assert_not_called()
+        self.assertEqual((second["generated"], second["cached"]), (0, 3))
+
+    def test_pages(self):
+        """Pages cover the dataset in filename order and generate missing thumbnails"""
+        for i in range(5):
+            self.write(f"{i}.jpg", image_bytes((700, 500)))
+        self.write("2.txt", b"Matt, photo")
+        self.write("broken.jpg", b"not an image")
+        dataset_index.update_index(self.folder)
+
+        first = dataset_thumbnails.thumbnail_page(self.folder, self.cache_dir, page=1, page_size=4)
+        last = dataset_thumbnails.thumbnail_page(self.folder, self.cache_dir, page=2, page_size=4)
+
+        self.assertEqual((first["total"], first["pages"]), (6, 2))
+        self.assertEqual([t["filename"] for t in first["thumbnails"]], ["0.jpg", "1.jpg", "2.jpg", "3.jpg"])
+        self.assertEqual(first["generated"], 4)
+        self.assertEqual(first["thumbnails"][2]["caption"], "Matt, photo")
+        with Image.open(io.BytesIO(base64.b64decode(first["thumbnails"][0]["content"]))) as image:
+            self.assertEqual(image.size, (256, 183))
+
+        self.assertEqual([t["filename"] for t in last["thumbnails"]], ["4.jpg", "broken.jpg"])
+        self.assertIn("content", last["thumbnails"][0])
+        self.assertNotIn("content", last["thumbnails"][1])
+        self.assertIn("error", last["thumbnails"][1])
+
+
+class TestThumbnailHandler(unittest.TestCase):
+    """Test upload post-processing and the dataset_thumbnails job"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.test_dir, ".thumbnails")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def run_job(self, job_type, job_input):
+        from handler_fast import handle_heavy_operation
+        with patch("handler_fast.TRAINING_DATA_DIR", self.test_dir), \
+             patch("handler_fast.THUMBNAIL_CACHE_DIR", self.cache_dir):
+            return handle_heavy_operation(job_type, job_input, {})
+
+    def test_upload_generates_thumbnails(self):
+        """Thumbnails exist right after upload and pages are small"""
+        raw = [image_bytes((1024, 1024)) for _ in range(3)]
+        files = [{"filename": f"{i}.jpg", "content": base64.b64encode(data).decode()} for i, data in enumerate(raw)]
+        upload = self.run_job("upload_training_data", {"training_name": "ds", "files": files})
+        self.assertEqual(upload["thumbnails"]["generated"], 3)
+
+        with patch("dataset_thumbnails.make_thumbnail") as mock_make:
+            page = self.run_job("dataset_thumbnails", {"training_name": "ds", "page_size": 2})
+            mock_make.assert_not_called()
+
+        self.assertEqual(page["status"], "success")
+        self.assertEqual((page["total"], page["pages"], len(page["thumbnails"])), (3, 2, 2))
+        self.assertLess(page["payload_bytes"], sum(len(data) for data in raw[:2]) // 4)
+
+    def test_upload_without_thumbnails(self):
+        """thumbnails=False skips post-processing"""
+        files = [{"filename": "0.jpg", "content": base64.b64encode(image_bytes((600, 600))).decode()}]
+        upload = self.run_job("upload_training_data", {"training_name": "ds", "files": files, "thumbnails": False})
+        self.assertIsNone(upload["thumbnails"])
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_invalid_size(self):
+        """Out-of-range sizes are rejected"""
+        os.makedirs(os.path.join(self.test_dir, "ds"))
+        result = self.run_job("dataset_thumbnails", {"training_name": "ds", "size": 4096})
+        self.assertEqual(result["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,611 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for dataset_upload.py and the upload_training_data handler
+Archive extraction, encodings, remote fetch, captions, atomic writes and size limits
+"""
+
+import sys
+import os
+import io
+import base64
+import gzip
+import hashlib
+import threading
+import tarfile
+import zipfile
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dataset_upload
+from dataset_upload import UploadError
+
+
+def make_zip(members):
+    """Build a base64 zip archive from {name: bytes}"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def make_tar(members, mode="w:gz"):
+    """Build a base64 tar archive from {name: bytes}"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def jpeg_bytes(size=(512, 512)):
+    """A small valid JPEG (uploads validate image headers)"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (120, 80, 40)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def has_zstd():
+    try:
+        dataset_upload.open_zstd_stream(io.BytesIO())
+        return True
+    except UploadError:
+        return False
+
+
+class TestArchiveExtraction(unittest.TestCase):
+    """Test streaming archive extraction"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_extract_zip_flattens_folders(self):
+        """Zip members land flat in the training folder, junk is skipped"""
+        content = make_zip({
+            "10_Matt/img1.jpg": b"image-1",
+            "10_Matt/img1.txt": b"Matt, photo",
+            "__MACOSX/10_Matt/._img1.jpg": b"junk",
+            "10_Matt/.DS_Store": b"junk",
+        })
+
+        extracted = dataset_upload.extract_archive(content, "dataset.zip", self.test_dir)
+
+        self.assertEqual(sorted(e["filename"] for e in extracted), ["img1.jpg", "img1.txt"])
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ["img1.jpg", "img1.txt"])
+        with open(os.path.join(self.test_dir, "img1.txt"), "rb") as f:
+            self.assertEqual(f.read(), b"Matt, photo")
+
+    def test_extract_zip_data_url(self):
+        """Zip content is decoded like any other upload; bad payloads are UploadErrors"""
+        content = make_zip({"a.jpg": b"image"})
+        wrapped = "data:application/zip;base64," + "\n".join(content[i:i + 76] for i in range(0, len(content), 76))
+        extracted = dataset_upload.extract_archive(wrapped, "dataset.zip", self.test_dir)
+        self.assertEqual([e["filename"] for e in extracted], ["a.jpg"])
+
+        for bad in ["not base64!", base64.b64encode(b"not a zip").decode()]:
+            with self.assertRaises(UploadError):
+                dataset_upload.extract_archive(bad, "dataset.zip", self.test_dir)
+
+    def test_extract_tar_gz(self):
+        """tar.gz archives are read as a stream"""
+        content = make_tar({"a.png": b"x" * 5000, "a.txt": b"caption"})
+
+        extracted = dataset_upload.extract_archive(content, "dataset.tar.gz", self.test_dir)
+
+        sizes = {e["filename"]: e["size"] for e in extracted}
+        self.assertEqual(sizes, {"a.png": 5000, "a.txt": 7})
+
+    @unittest.skipUnless(has_zstd(), "zstd support not installed")
+    def test_extract_tar_zst(self):
+        """tar.zst archives are decompressed as a stream"""
+        raw = base64.b64decode(make_tar({"a.jpg": b"y" * 1000}, mode="w"))
+        try:
+            from backports import zstd
+            compressed = zstd.compress(raw)
+        except ImportError:
+            import zstandard
+            compressed = zstandard.ZstdCompressor().compress(raw)
+        content = base64.b64encode(compressed).decode()
+
+        extracted = dataset_upload.extract_archive(content, "dataset.tar.zst", self.test_dir)
+        self.assertEqual(extracted[0]["size"], 1000)
+
+    def test_path_traversal_rejected(self):
+        """Members escaping the training folder reject the archive"""
+        for name in ["../evil.txt", "/etc/evil.txt", "a/../../evil.txt"]:
+            content = make_tar({"ok.txt": b"ok", name: b"evil"})
+            with self.assertRaises(UploadError):
+                dataset_upload.extract_archive(content, "dataset.tar.gz", self.test_dir)
+
+        self.assertEqual(os.listdir(self.test_dir), [])
+        self.assertFalse(os.path.exists(os.path.join(os.path.dirname(self.test_dir), "evil.txt")))
+
+    def test_symlink_rejected(self):
+        """Symlinks inside tar archives are not extracted"""
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as archive:
+            info = tarfile.TarInfo("link.jpg")
+            info.type = tarfile.SYMTYPE
+            info.linkname = "/etc/passwd"
+            archive.addfile(info)
+        content = base64.b64encode(buffer.getvalue()).decode()
+
+        with self.assertRaises(UploadError):
+            dataset_upload.extract_archive(content, "dataset.tar", self.test_dir)
+
+    def test_size_limits(self):
+        """Per-file and total limits are enforced while streaming"""
+        content = make_zip({"big.jpg": b"z" * 2048})
+        with self.assertRaises(UploadError):
+            dataset_upload.extract_archive(content, "d.zip", self.test_dir, max_file_bytes=1024)
+
+        content = make_zip({"a.jpg": b"z" * 800, "b.jpg": b"z" * 800})
+        with self.assertRaises(UploadError):
+            dataset_upload.extract_archive(content, "d.zip", self.test_dir, max_total_bytes=1000)
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+        content = make_zip({"a.jpg": b"1", "b.jpg": b"2", "c.jpg": b"3"})
+        with self.assertRaises(UploadError):
+            dataset_upload.extract_archive(content, "d.zip", self.test_dir, max_members=2)
+
+    def test_unsupported_format(self):
+        """Unknown archive extensions are rejected"""
+        with self.assertRaises(UploadError):
+            dataset_upload.extract_archive("", "dataset.rar", self.test_dir)
+
+    def test_base64_reader_chunks(self):
+        """Chunked base64 decoding matches a one-shot decode"""
+        data = os.urandom(3 * 1024 * 1024 + 7)
+        encoded = base64.b64encode(data).decode()
+
+        self.assertEqual(dataset_upload.open_base64_stream(encoded).read(), data)
+
+        wrapped = "\n".join(encoded[i:i + 76] for i in range(0, len(encoded), 76))
+        self.assertEqual(dataset_upload.open_base64_stream(wrapped).read(), data)
+
+
+class TestEncodedFiles(unittest.TestCase):
+    """Test per-file content encodings"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_gzip_encoding(self):
+        """base64+gzip content is decompressed to disk"""
+        data = b"Matt, photo, portrait " * 100
+        files = [
+            {"filename": "a.txt", "content": base64.b64encode(gzip.compress(data)).decode(),
+             "encoding": "base64+gzip"},
+            {"filename": "b.txt", "content": base64.b64encode(data).decode()},
+        ]
+
+        written = dataset_upload.write_uploaded_files(files, self.test_dir)
+
+        self.assertEqual([w["size"] for w in written], [len(data), len(data)])
+        self.assertEqual([w["encoding"] for w in written], ["base64+gzip", "base64"])
+        with open(os.path.join(self.test_dir, "a.txt"), "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    @unittest.skipUnless(has_zstd(), "zstd support not installed")
+    def test_zstd_encoding(self):
+        """base64+zstd content is decompressed to disk"""
+        data = bytes(range(256)) * 64
+        try:
+            from backports import zstd
+            compressed = zstd.compress(data)
+        except ImportError:
+            import zstandard
+            compressed = zstandard.ZstdCompressor().compress(data)
+        files = [{"filename": "a.png", "content": base64.b64encode(compressed).decode(),
+                  "encoding": "base64+zstd"}]
+
+        written = dataset_upload.write_uploaded_files(files, self.test_dir)
+        self.assertEqual(written[0]["size"], len(data))
+
+    def test_compression_bomb_rejected(self):
+        """The size limit applies to decompressed bytes"""
+        bomb = gzip.compress(bytes(64 * 1024 * 1024))
+        files = [
+            {"filename": "ok.txt", "content": base64.b64encode(b"ok").decode()},
+            {"filename": "bomb.png", "content": base64.b64encode(bomb).decode(),
+             "encoding": "base64+gzip"},
+        ]
+
+        with self.assertRaises(UploadError):
+            dataset_upload.write_uploaded_files(files, self.test_dir, max_file_bytes=1024 * 1024)
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+    def test_total_limit_stops_inflating(self):
+        """Bombs under the per-file limit fail once their running total passes the upload limit"""
+        bomb = base64.b64encode(gzip.compress(bytes(4 * 1024 * 1024))).decode()
+        files = [{"filename": f"{i}.png", "content": bomb, "encoding": "base64+gzip"} for i in range(16)]
+        inflated = []
+        original_copy = dataset_upload.copy_limited
+
+        def counting_copy(src, dst, limit, digest=None, budget=None):
+            try:
+                return original_copy(src, dst, limit, digest, budget)
+            finally:
+                inflated.append(dst.tell())
+
+        with patch("dataset_upload.copy_limited", side_effect=counting_copy):
+            with self.assertRaisesRegex(UploadError, "total size limit"):
+                dataset_upload.write_uploaded_files(files, self.test_dir, max_file_bytes=8 * 1024 * 1024,
+                                                    max_total_bytes=6 * 1024 * 1024)
+        # Every worker stops within a chunk of the shared limit, not after 64 MB
+        self.assertLessEqual(sum(inflated), 6 * 1024 * 1024 + dataset_upload.UPLOAD_WORKERS * (1024 * 1024))
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+    def test_invalid_encodings(self):
+        """Unknown encodings and corrupted gzip data are rejected"""
+        files = [{"filename": "a.txt", "content": "YQ==", "encoding": "base64+brotli"}]
+        with self.assertRaises(UploadError):
+            dataset_upload.write_uploaded_files(files, self.test_dir)
+
+        files = [{"filename": "a.txt", "content": base64.b64encode(b"not gzip").decode(),
+                  "encoding": "base64+gzip"}]
+        with self.assertRaises(UploadError):
+            dataset_upload.write_uploaded_files(files, self.test_dir)
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """Serves server.files with Range support; /flaky drops the first response midway"""
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("Range")))
+        data = self.server.files.get(self.path.lstrip("/"))
+        if data is None:
+            self.send_error(404)
+            return
+
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header:
+            start = int(range_header.split("=")[1].split("-")[0])
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+
+        body = data[start:]
+        if self.path == "/flaky" and not self.server.dropped:
+            self.server.dropped = True
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestRemoteFetch(unittest.TestCase):
+    """Test files entries with a url instead of inline content"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+        cls.server.files = {
+            "img1.jpg": os.urandom(300 * 1024),
+            "img2.jpg": os.urandom(10 * 1024),
+            "flaky": os.urandom(2 * 1024 * 1024),
+        }
+        cls.server.requests = []
+        cls.server.dropped = False
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.server.requests.clear()
+        self.server.dropped = False
+        self.patcher = patch("dataset_upload.FETCH_RETRY_DELAY", 0)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_fetch_http_with_checksum(self):
+        """URLs are fetched concurrently and verified against sha256"""
+        files = [
+            {"filename": name, "url": f"{self.base_url}/{name}",
+             "sha256": hashlib.sha256(self.server.files[name]).hexdigest()}
+            for name in ("img1.jpg", "img2.jpg")
+        ]
+
+        written = dataset_upload.write_uploaded_files(files, self.test_dir)
+
+        self.assertEqual([w["size"] for w in written], [300 * 1024, 10 * 1024])
+        with open(os.path.join(self.test_dir, "img1.jpg"), "rb") as f:
+            self.assertEqual(f.read(), self.server.files["img1.jpg"])
+
+    def test_fetch_resumes_with_range(self):
+        """An interrupted transfer resumes from the partial file"""
+        data = self.server.files["flaky"]
+        files = [{"filename": "flaky.png", "url": f"{self.base_url}/flaky",
+                  "sha256": hashlib.sha256(data).hexdigest()}]
+
+        written = dataset_upload.write_uploaded_files(files, self.test_dir)
+
+        self.assertEqual(written[0]["size"], len(data))
+        ranges = [r for path, r in self.server.requests if path == "/flaky"]
+        self.assertEqual(len(ranges), 2)
+        self.assertIsNone(ranges[0])
+        self.assertTrue(ranges[1].startswith("bytes="))
+        self.assertFalse(os.path.exists(dataset_upload.partial_path(os.path.join(self.test_dir, "flaky.png"))))
+
+    def test_downloads_share_total_limit(self):
+        """Downloads count against the upload total; resumed bytes are only counted once"""
+        data = self.server.files["flaky"]
+        files = [{"filename": "flaky.png", "url": f"{self.base_url}/flaky"}]
+        written = dataset_upload.write_uploaded_files(files, self.test_dir, max_total_bytes=len(data))
+        self.assertEqual(written[0]["size"], len(data))
+
+        # img1's Content-Length alone is over the limit, so its body is never streamed
+        budget = dataset_upload.ByteBudget(100 * 1024)
+        session = dataset_upload.create_fetch_session()
+        with self.assertRaisesRegex(UploadError, "total size limit"):
+            dataset_upload.fetch_url_to_file(session, f"{self.base_url}/img1.jpg",
+                                             os.path.join(self.test_dir, "img1.jpg"), budget=budget)
+        session.close()
+        self.assertEqual(budget.used, 0)
+
+    def test_checksum_mismatch_and_missing_file(self):
+        """Bad checksums and 404s fail the upload without leaving files"""
+        files = [{"filename": "img1.jpg", "url": f"{self.base_url}/img1.jpg", "sha256": "0" * 64}]
+        with self.assertRaises(UploadError):
+            dataset_upload.write_uploaded_files(files, self.test_dir)
+
+        files = [{"filename": "gone.jpg", "url": f"{self.base_url}/gone.jpg"}]
+        with self.assertRaises(UploadError):
+            dataset_upload.write_uploaded_files(files, self.test_dir)
+        self.assertEqual(os.listdir(self.test_dir), [])
+        self.assertEqual(len(self.server.requests), 2)  # 404 is not retried
+
+    def test_file_urls(self):
+        """file:// URLs are only accepted when enabled"""
+        source = os.path.join(self.test_dir, "source.jpg")
+        with open(source, "wb") as f:
+            f.write(b"local image")
+        dest_dir = os.path.join(self.test_dir, "dest")
+        os.makedirs(dest_dir)
+        files = [{"filename": "local.jpg", "url": f"file://{source}"}]
+
+        with self.assertRaises(UploadError):
+            dataset_upload.write_uploaded_files(files, dest_dir)
+
+        with patch("dataset_upload.ALLOW_FILE_URLS", True):
+            written = dataset_upload.write_uploaded_files(files, dest_dir)
+        self.assertEqual(written[0]["size"], len(b"local image"))
+
+
+class TestCaptions(unittest.TestCase):
+    """Test caption sidecars and bulk caption updates"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def read(self, name):
+        with open(os.path.join(self.test_dir, name), encoding="utf-8") as f:
+            return f.read()
+
+    def test_upload_writes_caption_sidecars(self):
+        """Captions sent with files become <basename>.txt sidecars"""
+        files = [
+            {"filename": "IMG_0405.jpg", "content": base64.b64encode(b"img").decode(),
+             "caption": "Matt, photo, smiling "},
+            {"filename": "IMG_0480.jpg", "content": base64.b64encode(b"img").decode(), "caption": ""},
+        ]
+
+        written = dataset_upload.write_uploaded_files(files, self.test_dir)
+
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ["IMG_0405.jpg", "IMG_0405.txt", "IMG_0480.jpg"])
+        self.assertEqual(self.read("IMG_0405.txt"), "Matt, photo, smiling")
+        sidecars = [w for w in written if "caption_for" in w]
+        self.assertEqual(sidecars[0]["caption_for"], "IMG_0405.jpg")
+
+    def test_caption_conflicts_with_uploaded_txt(self):
+        """A caption and an explicit caption file for the same image conflict"""
+        files = [
+            {"filename": "a.jpg", "content": "YQ==", "caption": "one"},
+            {"filename": "a.txt", "content": "YQ=="},
+        ]
+        with self.assertRaises(UploadError):
+            dataset_upload.write_uploaded_files(files, self.test_dir)
+
+    def test_update_captions_only_touches_sidecars(self):
+        """update_captions rewrites .txt files and leaves images alone"""
+        for name in ("a.jpg", "b.png"):
+            with open(os.path.join(self.test_dir, name), "wb") as f:
+                f.write(b"image")
+        with open(os.path.join(self.test_dir, "b.txt"), "w") as f:
+            f.write("old caption")
+        image_mtime = os.path.getmtime(os.path.join(self.test_dir, "a.jpg"))
+
+        updated, missing = dataset_upload.update_captions(
+            {"a.jpg": "Matt, portrait", "b.png": "", "c.jpg": "nope"}, self.test_dir
+        )
+
+        self.assertEqual(missing, ["c.jpg"])
+        self.assertEqual(len(updated), 2)
+        self.assertEqual(self.read("a.txt"), "Matt, portrait")
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, "b.txt")))
+        self.assertEqual(os.path.getmtime(os.path.join(self.test_dir, "a.jpg")), image_mtime)
+
+    def test_update_captions_handler(self):
+        """update_captions job routes through the heavy operation handler"""
+        from handler_fast import handle_heavy_operation
+
+        os.makedirs(os.path.join(self.test_dir, "ds"))
+        with open(os.path.join(self.test_dir, "ds", "a.jpg"), "wb") as f:
+            f.write(b"image")
+
+        job_input = {"training_name": "ds", "captions": [{"filename": "a.jpg", "caption": "Matt"}]}
+        with patch("handler_fast.TRAINING_DATA_DIR", self.test_dir):
+            result = handle_heavy_operation("update_captions", job_input, {})
+            missing = handle_heavy_operation("update_captions", {"training_name": "nope", "captions": {"a.jpg": "x"}}, {})
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["updated_captions"][0]["filename"], "a.txt")
+        self.assertEqual(missing["status"], "error")
+
+
+class TestAtomicWrites(unittest.TestCase):
+    """Test temp-file writes and the commit manifest"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_atomic_open_failure_leaves_nothing(self):
+        """A write interrupted by an error leaves neither target nor temp file"""
+        target = os.path.join(self.test_dir, "a.jpg")
+        with self.assertRaises(RuntimeError):
+            with dataset_upload.atomic_open(target) as f:
+                f.write(b"partial")
+                raise RuntimeError("preempted")
+
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+    def test_atomic_open_replaces_existing(self):
+        """Existing files are replaced in one rename"""
+        target = os.path.join(self.test_dir, "a.txt")
+        with open(target, "wb") as f:
+            f.write(b"old")
+        with dataset_upload.atomic_open(target) as f:
+            f.write(b"new")
+
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), b"new")
+        self.assertEqual(os.listdir(self.test_dir), ["a.txt"])
+
+    def test_commit_and_begin(self):
+        """commit_dataset marks the folder complete, begin_dataset_write clears it"""
+        for name in ("a.jpg", "a.txt"):
+            with open(os.path.join(self.test_dir, name), "wb") as f:
+                f.write(b"12345")
+        stale = os.path.join(self.test_dir, ".b.jpg.1234abcd.tmp")
+        with open(stale, "wb") as f:
+            f.write(b"truncated")
+
+        self.assertFalse(dataset_upload.is_dataset_complete(self.test_dir))
+        manifest = dataset_upload.commit_dataset(self.test_dir)
+        self.assertTrue(dataset_upload.is_dataset_complete(self.test_dir))
+        self.assertEqual(manifest["files"], {"a.jpg": 5, "a.txt": 5})
+        self.assertEqual(manifest["total_bytes"], 10)
+
+        dataset_upload.begin_dataset_write(self.test_dir)
+        self.assertFalse(dataset_upload.is_dataset_complete(self.test_dir))
+        self.assertFalse(os.path.exists(stale))
+
+    def test_failed_upload_is_not_committed(self):
+        """An upload that fails midway leaves the dataset marked incomplete"""
+        from handler_fast import handle_upload_training_data
+
+        good = {"filename": "a.jpg", "content": base64.b64encode(jpeg_bytes()).decode()}
+        with patch("handler_fast.TRAINING_DATA_DIR", self.test_dir), \
+             patch("handler_fast.THUMBNAIL_CACHE_DIR", os.path.join(self.test_dir, ".thumbnails")):
+            result = handle_upload_training_data({"training_name": "ds", "files": [good]}, {})
+            self.assertTrue(result["dataset_complete"])
+            self.assertTrue(dataset_upload.is_dataset_complete(os.path.join(self.test_dir, "ds")))
+
+            bad = {"filename": "b.jpg", "content": "YQ==", "encoding": "base64+gzip"}
+            result = handle_upload_training_data({"training_name": "ds", "files": [bad]}, {})
+
+        self.assertEqual(result["status"], "error")
+        self.assertFalse(dataset_upload.is_dataset_complete(os.path.join(self.test_dir, "ds")))
+        visible = [name for name in os.listdir(os.path.join(self.test_dir, "ds")) if not name.startswith(".")]
+        self.assertEqual(visible, ["a.jpg"])
+
+    def test_failed_reupload_keeps_existing_file(self):
+        """A re-upload that fails never removes the copy committed earlier"""
+        existing = os.path.join(self.test_dir, "a.png")
+        with open(existing, "wb") as f:
+            f.write(b"committed")
+
+        with self.assertRaises(dataset_upload.UploadError):
+            dataset_upload.write_uploaded_files(
+                [{"filename": "a.png", "content": "YQ==", "encoding": "base64+gzip"}], self.test_dir
+            )
+        with open(existing, "rb") as f:
+            self.assertEqual(f.read(), b"committed")
+        self.assertEqual(os.listdir(self.test_dir), ["a.png"])
+
+
+class TestUploadHandler(unittest.TestCase):
+    """Test handle_upload_training_data with archives"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_upload_archive(self):
+        """Archive uploads are extracted into the training folder"""
+        from handler_fast import handle_upload_training_data
+
+        job_input = {
+            "training_name": "archive_test",
+            "archive": {"filename": "dataset.zip", "content": make_zip({"img.jpg": jpeg_bytes()})}
+        }
+
+        with patch("handler_fast.TRAINING_DATA_DIR", self.test_dir), \
+             patch("handler_fast.THUMBNAIL_CACHE_DIR", os.path.join(self.test_dir, ".thumbnails")):
+            result = handle_upload_training_data(job_input, {"base64": base64})
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["uploaded_files"][0]["filename"], "img.jpg")
+        self.assertTrue(os.path.exists(os.path.join(self.test_dir, "archive_test", "img.jpg")))
+
+    def test_upload_rejects_bad_training_name(self):
+        """Training names cannot escape the training data directory"""
+        from handler_fast import handle_upload_training_data
+
+        job_input = {
+            "training_name": "../escape",
+            "files": [{"filename": "a.txt", "content": base64.b64encode(b"a").decode()}]
+        }
+
+        with patch("handler_fast.TRAINING_DATA_DIR", self.test_dir), \
+             patch("handler_fast.THUMBNAIL_CACHE_DIR", os.path.join(self.test_dir, ".thumbnails")):
+            result = handle_upload_training_data(job_input, {"base64": base64})
+
+        self.assertEqual(result["status"], "error")
+        self.assertIn("Invalid training name", result["error"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -16,6 +16,13 @@ from datetime import datetime
 # Add parent directory to path for importing handler
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+
+def fake_process_manager():
+    """Process manager running tests/fake_trainer.py instead of ai-toolkit"""
+    import training_manager
+    fake_trainer = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_trainer.py")
+    return training_manager.ProcessManager([sys.executable, fake_trainer])
+
 class TestHandlerMethods(unittest.TestCase):
     """Test all methods in handler_fast.py"""
     
@@ -184,13 +191,15 @@ class TestHandlerMethods(unittest.TestCase):
             "training_name": "test_training"
         }
         
-        with patch('os.makedirs'):
-            with patch('builtins.open', unittest.mock.mock_open()) as mock_file:
-                result = handle_upload_training_data(job_input, modules)
-                
-                self.assertEqual(result["status"], "success")
-                self.assertIn("uploaded_files", result)
-                self.assertEqual(len(result["uploaded_files"]), 1)
+        # Uploads are written atomically (temp file + fsync + rename), so use a
+        # real temporary training data directory instead of mocking open()
+        with patch('handler_fast.TRAINING_DATA_DIR', self.test_dir), \
+             patch('handler_fast.THUMBNAIL_CACHE_DIR', os.path.join(self.test_dir, '.thumbnails')):
+            result = handle_upload_training_data(job_input, modules)
+            
+            self.assertEqual(result["status"], "success")
+            self.assertIn("uploaded_files", result)
+            self.assertEqual(len(result["uploaded_files"]), 1)
     
     def test_handle_upload_training_data_no_files(self):
         """Test upload with no files provided"""
@@ -223,10 +232,13 @@ class TestHandlerMethods(unittest.TestCase):
         }
         
         job_input = {
-            "yaml_config": yaml.dump(test_config)
+            "yaml_config": yaml.dump(test_config),
+            "validate": False
         }
         
-        with patch('builtins.open', unittest.mock.mock_open()):
+        with patch('builtins.open', unittest.mock.mock_open()), \
+             patch('handler_fast.TRAINING_RUNS_DIR', self.test_dir), \
+             patch('handler_fast.PROCESS_MANAGER', fake_process_manager()):
             result = handle_train_with_yaml(job_input, modules)
             
             self.assertEqual(result["status"], "success")
@@ -353,8 +365,9 @@ class TestHandlerIntegration(unittest.TestCase):
         
         with patch('handler_fast.setup_environment', return_value=True):
             with patch('handler_fast.lazy_import_heavy_modules', return_value={'base64': base64}):
-                with patch('os.makedirs'):
-                    with patch('builtins.open', unittest.mock.mock_open()):
+                with tempfile.TemporaryDirectory() as training_data_dir:
+                    with patch('handler_fast.TRAINING_DATA_DIR', training_data_dir), \
+                         patch('handler_fast.THUMBNAIL_CACHE_DIR', os.path.join(training_data_dir, '.thumbnails')):
                         result = handler(job)
                         
                         # Should successfully process upload
@@ -380,13 +393,16 @@ class TestHandlerIntegration(unittest.TestCase):
         training_job = {
             "input": {
                 "type": "train_with_yaml",
-                "yaml_config": "model: test\ntraining:\n  epochs: 1"
+                "yaml_config": "model: test\ntraining:\n  epochs: 1",
+                "validate": False
             }
         }
         
         with patch('handler_fast.setup_environment', return_value=True):
             with patch('handler_fast.lazy_import_heavy_modules', return_value={'yaml': __import__('yaml'), 'uuid': __import__('uuid')}):
-                with patch('builtins.open', unittest.mock.mock_open()):
+                with patch('builtins.open', unittest.mock.mock_open()), \
+                     patch('handler_fast.TRAINING_RUNS_DIR', tempfile.mkdtemp()), \
+                     patch('handler_fast.PROCESS_MANAGER', fake_process_manager()):
                     training_result = handler(training_job)
                     self.assertEqual(training_result["status"], "success")
 
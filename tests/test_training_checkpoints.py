@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for training_checkpoints.py and resumed train_with_yaml runs
+Checkpoint steps, the incremental index, newest save lookup and config rewriting
+"""
+
+import sys
+import os
+import json
+import struct
+import time
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yaml
+from PIL import Image
+
+import training_checkpoints
+import training_manager
+
+FAKE_TRAINER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_trainer.py")
+
+
+def write_safetensors(path, metadata=None, mtime=None):
+    header = json.dumps({"__metadata__": metadata or {}}).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(header)) + header)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def write_optimizer(folder, mtime):
+    path = os.path.join(folder, training_checkpoints.OPTIMIZER_FILENAME)
+    with open(path, "wb") as f:
+        f.write(b"state")
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+class TestCheckpointIndex(unittest.TestCase):
+    """Test indexing and finding saves"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.now = time.time()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def save(self, filename, age, metadata=None):
+        return write_safetensors(os.path.join(self.test_dir, filename), metadata, self.now - age)
+
+    def test_checkpoint_step(self):
+        """Steps come from the filename, or from training_info for the final save"""
+        step = training_checkpoints.checkpoint_step
+        self.assertEqual(step(self.save("lora_000002000.safetensors", 0), "lora"), 2000)
+        final = self.save("lora.safetensors", 0, {"training_info": json.dumps({"step": 3000})})
+        self.assertEqual(step(final, "lora"), 3000)
+        self.assertIsNone(step(self.save("other.safetensors", 0), "lora"))
+
+    def test_numbered_run_name(self):
+        """The final save of a sweep run ending in _<index> is not read as a step"""
+        final = self.save("matt_ab12cd34_03.safetensors", 0)
+        self.assertIsNone(training_checkpoints.checkpoint_step(final, "matt_ab12cd34_03"))
+        self.assertIsNone(training_checkpoints.checkpoint_step(final, "matt_ab12cd34"))
+
+        folder = os.path.join(self.test_dir, "matt_ab12cd34_03")
+        os.makedirs(folder)
+        write_safetensors(os.path.join(folder, "matt_ab12cd34_03_000000500.safetensors"), mtime=self.now - 10)
+        write_safetensors(os.path.join(folder, "matt_ab12cd34_03.safetensors"), mtime=self.now)
+        latest = training_checkpoints.latest_checkpoint(folder)
+        self.assertEqual(latest["step"], 500)
+        self.assertTrue(latest["checkpoint"].endswith("_000000500.safetensors"))
+
+    def test_latest_with_optimizer(self):
+        """The highest step wins; optimizer state only counts if written with it"""
+        self.save("lora_000001000.safetensors", 300)
+        self.save("lora_000002000.safetensors", 200)
+        write_optimizer(self.test_dir, self.now - 100)
+        latest = training_checkpoints.latest_checkpoint(self.test_dir, "lora")
+        self.assertEqual(latest["step"], 2000)
+        self.assertTrue(latest["checkpoint"].endswith("lora_000002000.safetensors"))
+        self.assertTrue(latest["optimizer_state"].endswith("optimizer.pt"))
+
+        self.save("lora_000003000.safetensors", 50)
+        latest = training_checkpoints.latest_checkpoint(self.test_dir, "lora")
+        self.assertEqual((latest["step"], latest["optimizer_state"]), (3000, None))
+        self.assertIsNone(training_checkpoints.latest_checkpoint(os.path.join(self.test_dir, "missing")))
+
+    def test_incremental_index(self):
+        """Unchanged saves are not read again; deleted ones drop out"""
+        self.save("lora_000001000.safetensors", 10)
+        self.save("lora.safetensors", 5, {"training_info": json.dumps({"step": 1500})})
+        self.assertEqual(training_checkpoints.update_index(self.test_dir, "lora")["indexed"], 2)
+
+        with patch("training_checkpoints.read_safetensors_metadata", side_effect=AssertionError("re-read")):
+            self.assertEqual(training_checkpoints.update_index(self.test_dir, "lora")["unchanged"], 2)
+        self.assertEqual(training_checkpoints.latest_checkpoint(self.test_dir, "lora")["step"], 1500)
+
+        os.remove(os.path.join(self.test_dir, "lora.safetensors"))
+        self.assertEqual(training_checkpoints.latest_checkpoint(self.test_dir, "lora")["step"], 1000)
+
+    def test_prepare_resume(self):
+        """The launch config is pointed at the checkpoint and its step"""
+        folder = os.path.join(self.test_dir, "output", "matt")
+        os.makedirs(folder)
+        write_safetensors(os.path.join(folder, "matt_000002000.safetensors"))
+        config = {"config": {"name": "matt", "process": [{"training_folder": "output", "train": {"steps": 5000}}]}}
+
+        config, resume = training_checkpoints.prepare_resume(config, self.test_dir)
+        process = config["config"]["process"][0]
+        self.assertEqual(process["training_folder"], os.path.join(self.test_dir, "output"))
+        self.assertEqual(process["train"]["start_step"], 2000)
+        self.assertEqual(process["network"]["pretrained_lora_path"], resume["checkpoint"])
+        self.assertEqual((resume["resumed"], resume["steps_saved"], resume["steps_remaining"]), (True, 2000, 3000))
+
+        fresh = {"config": {"name": "new", "process": [{"train": {"steps": 10}}]}}
+        self.assertEqual(training_checkpoints.prepare_resume(fresh, self.test_dir)[1]["resumed"], False)
+
+
+class TestResumeHandler(unittest.TestCase):
+    """Test train_with_yaml with resume"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.dataset = os.path.join(self.test_dir, "data")
+        os.makedirs(self.dataset)
+        Image.new("RGB", (64, 64)).save(os.path.join(self.dataset, "a.png"))
+        self.output = os.path.join(self.test_dir, "output")
+        os.makedirs(os.path.join(self.output, "matt"))
+        write_safetensors(os.path.join(self.output, "matt", "matt_000002000.safetensors"))
+
+        self.manager = training_manager.ProcessManager([sys.executable, FAKE_TRAINER])
+        self.patches = [
+            patch("handler_fast.TRAINING_RUNS_DIR", os.path.join(self.test_dir, "runs")),
+            patch("handler_fast.PROCESS_MANAGER", self.manager)
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for record in self.manager.list():
+            if record["status"] == training_manager.RUNNING:
+                self.manager.kill(record["process_id"])
+                self.manager.wait(record["process_id"], timeout=10)
+        for p in self.patches:
+            p.stop()
+        self.manager.logs.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def run_job(self, job_type, job_input):
+        import uuid
+        from handler_fast import handle_heavy_operation
+        return handle_heavy_operation(job_type, job_input, {"yaml": yaml, "uuid": uuid})
+
+    def yaml_config(self, steps):
+        return yaml.dump({"config": {"name": "matt", "process": [{
+            "training_folder": self.output,
+            "network": {"linear": 16},
+            "datasets": [{"folder_path": self.dataset}],
+            "train": {"steps": steps, "lr": 1e-4},
+            "model": {"name_or_path": "sd15"}
+        }]}})
+
+    def test_resume(self):
+        """A resumed run starts from the saved step and reports what it skipped"""
+        started = self.run_job("train_with_yaml", {"yaml_config": self.yaml_config(5000), "resume": True})
+        self.assertEqual(started["status"], "success")
+        self.assertEqual((started["resume"]["steps_saved"], started["resume"]["steps_remaining"]), (2000, 3000))
+        with open(started["config_path"]) as f:
+            train = yaml.safe_load(f)["config"]["process"][0]["train"]
+        self.assertEqual(train["start_step"], 2000)
+
+        finished = self.run_job("train_with_yaml", {"yaml_config": self.yaml_config(2000), "resume": True,
+                                                    "dry_run": True})
+        self.assertEqual(finished["status"], "error")
+        self.assertIn("already reached train.steps", finished["errors"][0])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
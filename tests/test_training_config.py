@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for training_config.py and overlay submissions to train_with_yaml
+Path parsing, deep merges, the base config cache, schema validation and dry runs
+"""
+
+import sys
+import os
+import json
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yaml
+from PIL import Image
+
+import training_config
+import training_manager
+
+FAKE_TRAINER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_trainer.py")
+
+BASE = {
+    "job": "extension",
+    "config": {
+        "name": "base_lora",
+        "process": [{
+            "network": {"type": "lora", "linear": 16, "linear_alpha": 16},
+            "datasets": [{"folder_path": "/workspace/training_data/a", "resolution": [512, 768]}],
+            "train": {"steps": 1000, "lr": 1e-4, "optimizer": "adamw8bit", "batch_size": 1},
+            "save": {"save_every": 250},
+            "model": {"name_or_path": "black-forest-labs/FLUX.1-dev", "is_flux": True, "quantize": True}
+        }]
+    }
+}
+
+
+def make_dataset(folder, count=2, captions=True):
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        Image.new("RGB", (64, 64), (i * 40, 0, 0)).save(os.path.join(folder, f"img_{i}.png"))
+        if captions:
+            with open(os.path.join(folder, f"img_{i}.txt"), "w") as f:
+                f.write(f"photo {i}")
+    return folder
+
+
+class TestOverlay(unittest.TestCase):
+    """Test applying JSON-path overlays to a config"""
+
+    def test_parse_path(self):
+        """Dotted paths with list indexes, an optional $. prefix and shortcuts"""
+        self.assertEqual(training_config.parse_path("$.config.process[0].train.lr"),
+                         ["config", "process", 0, "train", "lr"])
+        self.assertEqual(training_config.parse_path("steps"), ["config", "process", 0, "train", "steps"])
+        for bad in ("", "config..name", "process[0]x", "config.process[a]"):
+            with self.assertRaises(training_config.ConfigError):
+                training_config.parse_path(bad)
+
+    def test_apply_overlay(self):
+        """Leaves are replaced, mappings deep-merged, the base left untouched"""
+        config = training_config.apply_overlay(BASE, {
+            "name": "run_2",
+            "lr": 2e-4,
+            "steps": 1500,
+            "config.process[0].network": {"linear": 32},
+            "config.process[0].train.gradient_checkpointing": True
+        })
+        process = config["config"]["process"][0]
+        self.assertEqual(config["config"]["name"], "run_2")
+        self.assertEqual((process["train"]["lr"], process["train"]["steps"]), (2e-4, 1500))
+        self.assertEqual(process["network"], {"type": "lora", "linear": 32, "linear_alpha": 16})
+        self.assertTrue(process["train"]["gradient_checkpointing"])
+        self.assertEqual(BASE["config"]["process"][0]["train"]["lr"], 1e-4)
+
+    def test_rejects_overlays_that_do_not_fit(self):
+        """Missing intermediate keys, out-of-range indexes and type changes are errors"""
+        for overlay in ({"config.process[0].trian.lr": 1e-4},
+                        {"config.process[3].train.lr": 1e-4},
+                        {"steps": "many"},
+                        {"lr": True},
+                        {"config.process[0].datasets": {"folder_path": "x"}}):
+            with self.assertRaises(training_config.ConfigError, msg=overlay):
+                training_config.apply_overlay(BASE, overlay)
+        # Ints are fine where the base has a float
+        self.assertEqual(training_config.apply_overlay(BASE, {"lr": 1})["config"]["process"][0]["train"]["lr"], 1)
+
+
+class TestBaseConfigStore(unittest.TestCase):
+    """Test registering and reloading base configs"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_register_and_reload(self):
+        """A registered base survives a new store and is only parsed once"""
+        store = training_config.BaseConfigStore(self.test_dir)
+        entry = store.register("flux", yaml.dump(BASE), yaml)
+        self.assertEqual(entry["config_name"], "base_lora")
+        store.get("flux")["config"]["name"] = "changed"
+        self.assertEqual(store.build("flux", {"steps": 10})["config"]["name"], "base_lora")
+
+        reloaded = training_config.BaseConfigStore(self.test_dir)
+        with patch.object(yaml, "safe_load", side_effect=AssertionError("parsed again")):
+            self.assertEqual(reloaded.build("flux", {"steps": 10})["config"]["process"][0]["train"]["steps"], 10)
+        self.assertEqual(reloaded.names(), ["flux"])
+
+    def test_invalid_registrations(self):
+        """Bad names, unparsable YAML and configs without a process list are refused"""
+        store = training_config.BaseConfigStore(self.test_dir)
+        for name, text in (("../x", yaml.dump(BASE)), ("ok", "config: [unclosed"), ("ok", "config: {}")):
+            with self.assertRaises(training_config.ConfigError):
+                store.register(name, text, yaml)
+        with self.assertRaises(training_config.ConfigError):
+            store.get("missing")
+
+
+class TestValidateConfig(unittest.TestCase):
+    """Test schema checks, defaults, combinations and dataset lookups"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.folder = make_dataset(os.path.join(self.test_dir, "data"))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def validate(self, overlay, check_datasets=True):
+        config = training_config.apply_overlay(BASE, {"folder_path": self.folder, **overlay})
+        return training_config.validate_config(config, check_datasets=check_datasets)
+
+    def errors(self, overlay, check_datasets=True):
+        with self.assertRaises(training_config.ConfigError) as caught:
+            self.validate(overlay, check_datasets)
+        return caught.exception.errors
+
+    def test_defaults_filled(self):
+        """Missing optional settings resolve to the schema defaults"""
+        report = self.validate({"config.process[0].train.noise_scheduler": "flowmatch"})
+        process = report["config"]["config"]["process"][0]
+        self.assertEqual(process["type"], "sd_trainer")
+        self.assertEqual(process["train"]["gradient_accumulation_steps"], 1)
+        self.assertEqual(process["save"]["dtype"], "float16")
+        self.assertEqual(process["datasets"][0]["caption_ext"], "txt")
+        self.assertNotIn("sample", process)
+        self.assertEqual(report["datasets"], [{"folder_path": self.folder, "image_count": 2, "missing_captions": 0}])
+
+    def test_schema_errors(self):
+        """Typos in values, wrong types, ranges and missing required keys are all reported"""
+        errors = self.errors({"optimizer": "adamw8bti", "batch_size": 0,
+                              "config.process[0].train.noise_scheduler": "flowmatch",
+                              "resolution": [512, 700]}, check_datasets=False)
+        self.assertEqual(len(errors), 3)
+        self.assertIn("resolution[1]: 700 is not a multiple of 64", errors[0])
+        self.assertIn("batch_size: 0 is below 1", errors[1])
+        self.assertIn("did you mean adamw8bit?", errors[2])
+
+        config = training_config.apply_overlay(BASE, {})
+        del config["config"]["process"][0]["train"]["lr"]
+        with self.assertRaises(training_config.ConfigError) as caught:
+            training_config.validate_config(config, check_datasets=False)
+        self.assertEqual(caught.exception.errors, ["config.process[0].train.lr: required"])
+
+    def test_impossible_combinations(self):
+        """FLUX with a non-flowmatch scheduler or text encoder training is rejected"""
+        errors = self.errors({"config.process[0].train.train_text_encoder": True}, check_datasets=False)
+        self.assertTrue(any("train_text_encoder" in e for e in errors))
+        self.assertTrue(any("needs flowmatch" in e for e in errors))
+
+        report = self.validate({"config.process[0].train.noise_scheduler": "flowmatch", "save_every": 5000})
+        self.assertIn("only the final step is saved", report["warnings"][0])
+
+    def test_dataset_checks(self):
+        """Missing folders and datasets smaller than a batch are caught through the index"""
+        flowmatch = {"config.process[0].train.noise_scheduler": "flowmatch"}
+        missing = os.path.join(self.test_dir, "nope")
+        self.assertIn("dataset folder not found", self.errors({**flowmatch, "folder_path": missing})[0])
+        self.assertIn("fewer than train.batch_size", self.errors({**flowmatch, "batch_size": 4})[0])
+
+        uncaptioned = make_dataset(os.path.join(self.test_dir, "raw"), captions=False)
+        report = self.validate({**flowmatch, "folder_path": uncaptioned})
+        self.assertIn("2 images have no caption", report["warnings"][0])
+
+
+class TestOverlayHandlers(unittest.TestCase):
+    """Test register_base_config and train_with_yaml with base_config + overlay"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.folder = make_dataset(os.path.join(self.test_dir, "data"))
+        self.manager = training_manager.ProcessManager([sys.executable, FAKE_TRAINER])
+        self.patches = [
+            patch("handler_fast.TRAINING_RUNS_DIR", self.test_dir),
+            patch("handler_fast.BASE_CONFIG_DIR", os.path.join(self.test_dir, "configs")),
+            patch("handler_fast.PROCESS_MANAGER", self.manager)
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for record in self.manager.list():
+            if record["status"] == training_manager.RUNNING:
+                self.manager.kill(record["process_id"])
+                self.manager.wait(record["process_id"], timeout=10)
+        for p in self.patches:
+            p.stop()
+        self.manager.logs.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def run_job(self, job_type, job_input):
+        import uuid
+        from handler_fast import handle_heavy_operation
+        return handle_heavy_operation(job_type, job_input, {"yaml": yaml, "uuid": uuid})
+
+    def test_train_from_overlay(self):
+        """The launched config is the base with the overlay merged in"""
+        registered = self.run_job("register_base_config", {"name": "flux", "yaml_config": yaml.dump(BASE)})
+        self.assertEqual(registered["status"], "success")
+        self.assertEqual(registered["base_configs"], ["flux"])
+
+        overlay = {"name": "run_2", "steps": 20, "folder_path": self.folder,
+                   "config.process[0].train.noise_scheduler": "flowmatch"}
+        started = self.run_job("train_with_yaml", {"base_config": "flux", "overlay": json.dumps(overlay)})
+        self.assertEqual(started["status"], "success")
+        self.assertEqual(started["name"], "run_2")
+        with open(started["config_path"]) as f:
+            launched = yaml.safe_load(f)
+        self.assertEqual(launched["config"]["process"][0]["train"]["steps"], 20)
+        self.assertEqual(launched["config"]["process"][0]["network"]["linear"], 16)
+
+        self.assertIn("Unknown base config", self.run_job("train_with_yaml", {"base_config": "nope"})["error"])
+        self.assertEqual(self.run_job("train_with_yaml", {"base_config": "flux", "overlay": {"lr": "x"}})["status"],
+                         "error")
+        self.assertEqual(self.run_job("train_with_yaml", {})["status"], "error")
+
+    def test_dry_run_and_rejection(self):
+        """dry_run returns the resolved config; invalid configs never reach the scheduler"""
+        yaml_config = yaml.dump(BASE)
+        overlay = {"folder_path": self.folder, "config.process[0].train.noise_scheduler": "flowmatch"}
+        dry = self.run_job("train_with_yaml", {"yaml_config": yaml_config, "overlay": overlay, "dry_run": True})
+        self.assertEqual((dry["status"], dry["dry_run"], dry["steps"]), ("success", True, 1000))
+        self.assertEqual(dry["config"]["config"]["process"][0]["train"]["dtype"], "fp32")
+        self.assertEqual(dry["datasets"][0]["image_count"], 2)
+
+        rejected = self.run_job("train_with_yaml", {"yaml_config": yaml_config, "overlay": {"folder_path": self.folder}})
+        self.assertEqual(rejected["status"], "error")
+        self.assertIn("needs flowmatch", rejected["errors"][0])
+        self.assertEqual(self.manager.list(), [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for training_manager.py and the training process handlers
+Detached runs of a fake trainer script: status, progress, exit codes, kills, logs, restarts and cleanup
+"""
+
+import sys
+import os
+import time
+import signal
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yaml
+
+import training_manager
+
+FAKE_TRAINER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_trainer.py")
+
+
+def fake_manager():
+    return training_manager.ProcessManager([sys.executable, FAKE_TRAINER])
+
+
+class TestProcessManager(unittest.TestCase):
+    """Test launching and tracking fake trainer runs"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.manager = fake_manager()
+
+    def tearDown(self):
+        for record in self.manager.list():
+            if record["status"] == training_manager.RUNNING:
+                self.manager.kill(record["process_id"])
+                self.manager.wait(record["process_id"], timeout=10)
+        self.manager.cleanup_stuck()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def start(self, process_id, **fake):
+        config_path = os.path.join(self.test_dir, f"{process_id}.yaml")
+        with open(config_path, "w") as f:
+            yaml.dump({"fake": fake}, f)
+        return self.manager.start(process_id, config_path, name=process_id)
+
+    def test_exit_codes(self):
+        """Exit codes are recorded and mapped to completed / failed"""
+        self.start("ok")
+        self.start("bad", exit_code=3)
+        self.assertEqual(self.manager.wait("ok", timeout=10)["status"], training_manager.COMPLETED)
+        bad = self.manager.wait("bad", timeout=10)
+        self.assertEqual((bad["status"], bad["exit_code"]), (training_manager.FAILED, 3))
+        self.assertIsNotNone(bad["ended_at"])
+        self.assertEqual([r["process_id"] for r in self.manager.list()], ["ok", "bad"])
+
+    def test_detached_process_group(self):
+        """Runs get their own process group and status answers immediately"""
+        record = self.start("long", sleep=30)
+        self.assertEqual(record["pgid"], os.getpgid(record["pid"]))
+        self.assertNotEqual(record["pgid"], os.getpgrp())
+
+        start = time.time()
+        status = self.manager.status("long")
+        self.assertLess(time.time() - start, 0.1)
+        self.assertEqual(status["status"], training_manager.RUNNING)
+        self.assertIsNone(status["exit_code"])
+        self.assertIsNone(self.manager.status("nope"))
+
+    def test_kill_whole_group(self):
+        """force_kill takes down the trainer and its children"""
+        record = self.start("long", sleep=30, child_sleep=30)
+        deadline = time.time() + 10
+        while len(training_manager.group_members(record["pgid"])) < 2 and time.time() < deadline:
+            time.sleep(0.05)
+
+        self.manager.kill("long", signal.SIGTERM)
+        status = self.manager.wait("long", timeout=10)
+        self.assertEqual((status["status"], status["kill_signal"]), (training_manager.KILLED, "SIGTERM"))
+        self.assertEqual(status["exit_code"], -signal.SIGTERM)
+        deadline = time.time() + 5
+        while training_manager.group_members(record["pgid"]) and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(training_manager.group_members(record["pgid"]), [])
+
+    def test_cleanup_orphaned_children(self):
+        """cleanup_stuck kills children that outlive their trainer"""
+        record = self.start("leaky", child_sleep=30)
+        self.manager.wait("leaky", timeout=10)
+        self.assertTrue(training_manager.group_members(record["pgid"]))
+
+        cleaned = self.manager.cleanup_stuck()
+        self.assertEqual([c["process_id"] for c in cleaned], ["leaky"])
+        deadline = time.time() + 5
+        while training_manager.group_members(record["pgid"]) and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.manager.cleanup_stuck(), [])
+
+    def test_start_errors(self):
+        """Missing trainer directories and duplicate ids are rejected"""
+        manager = training_manager.ProcessManager(cwd=os.path.join(self.test_dir, "no-toolkit"))
+        with self.assertRaises(training_manager.TrainingError):
+            manager.start("x", "config.yaml")
+        self.start("dup")
+        with self.assertRaises(training_manager.TrainingError):
+            self.start("dup")
+
+
+class TestPersistentRegistry(unittest.TestCase):
+    """Test the journaled registry across simulated handler restarts"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.journal = os.path.join(self.test_dir, "registry.jsonl")
+        self.managers = []
+
+    def tearDown(self):
+        for manager in self.managers:
+            for record in manager.list():
+                if record["status"] == training_manager.RUNNING:
+                    manager.kill(record["process_id"])
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def manager(self):
+        manager = training_manager.ProcessManager([sys.executable, FAKE_TRAINER], journal_path=self.journal)
+        self.managers.append(manager)
+        return manager
+
+    def start(self, manager, process_id, **fake):
+        config_path = os.path.join(self.test_dir, f"{process_id}.yaml")
+        with open(config_path, "w") as f:
+            yaml.dump({"fake": fake}, f)
+        log_path = os.path.join(self.test_dir, process_id, "train.log")
+        return manager.start(process_id, config_path, name=process_id, log_path=log_path)
+
+    def journal_lines(self):
+        with open(self.journal) as f:
+            return f.read().splitlines()
+
+    def test_finished_runs_survive_restart(self):
+        """Exit codes written before a restart are reloaded; the journal is compacted on boot"""
+        first = self.manager()
+        self.start(first, "ok")
+        self.start(first, "bad", exit_code=2)
+        first.wait("ok", timeout=10)
+        first.wait("bad", timeout=10)
+        self.assertEqual(len(self.journal_lines()), 4)
+        with open(self.journal, "a") as f:
+            f.write('{"process_id": "torn", "sta')
+
+        restarted = self.manager()
+        statuses = {r["process_id"]: (r["status"], r["exit_code"]) for r in restarted.list()}
+        self.assertEqual(statuses, {"ok": ("completed", 0), "bad": ("failed", 2)})
+        self.assertEqual(len(self.journal_lines()), 2)
+
+    def test_final_progress_survives_restart(self):
+        """The last loss and speed of a finished run are journaled with it"""
+        first = self.manager()
+        self.start(first, "ok", output=["lora: 10/10 [00:05<00:00,  2.00it/s, lr: 1e-04 loss: 0.250]"])
+        self.assertEqual(first.wait("ok", timeout=10)["final_progress"]["last_loss"], 0.25)
+
+        progress = self.manager().status("ok")["final_progress"]
+        self.assertEqual((progress["step"], progress["total_steps"], progress["last_loss"], progress["it_per_sec"]),
+                         (10, 10, 0.25, 2.0))
+
+    def test_cleanup_ignores_reused_pgids(self):
+        """A reloaded run's pgid that now belongs to an unrelated group is left alone"""
+        import subprocess
+        unrelated = subprocess.Popen(["sleep", "30"], start_new_session=True)
+        self.addCleanup(unrelated.wait)
+        self.addCleanup(unrelated.kill)
+        ticks = training_manager.process_start_ticks(unrelated.pid)
+        base = {"status": "completed", "pid": unrelated.pid, "pgid": unrelated.pid, "command": [],
+                "config_path": None, "log_path": None, "started_at": "2024-01-01T00:00:00",
+                "start_time": time.time() - 60, "end_time": time.time() - 30, "exit_code": 0,
+                "kill_signal": None, "boot_id": training_manager.boot_id()}
+        journal = training_manager.ProcessJournal(self.journal)
+        # Ended before the unrelated process started; and one whose end was never observed
+        journal.append({**base, "process_id": "old", "start_ticks": ticks - 200, "end_ticks": ticks - 100}, 1)
+        journal.append({**base, "process_id": "lost", "start_ticks": ticks - 200}, 2)
+
+        self.assertEqual(self.manager().cleanup_stuck(), [])
+        self.assertIsNone(unrelated.poll())
+
+    def test_running_run_adopted(self):
+        """A trainer still running after a restart is adopted, followed and killable"""
+        first = self.manager()
+        record = self.start(first, "long", sleep=30, output=["lora: 3/9 [00:01<00:02,  3.00it/s, lr: 1e-04 loss: 0.500]"])
+
+        restarted = self.manager()
+        adopted = restarted.status("long")
+        self.assertEqual((adopted["status"], adopted["pid"]), ("running", record["pid"]))
+        deadline = time.time() + 10
+        while not restarted.status("long")["progress"] and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(restarted.status("long")["progress"]["step"], 3)
+
+        restarted.kill("long")
+        self.assertEqual(restarted.wait("long", timeout=10)["status"], training_manager.KILLED)
+        self.assertEqual(self.manager().status("long")["status"], training_manager.KILLED)
+
+    def test_dead_and_recycled_pids(self):
+        """Runs whose pid is gone or reused by another process (or another boot) are marked exited"""
+        journal = training_manager.ProcessJournal(self.journal)
+        base = {"status": "running", "start_time": time.time(), "log_path": None, "kill_signal": None,
+                "exit_code": None}
+        journal.compact([
+            {**base, "process_id": "gone", "pid": 2 ** 22 + 1, "pgid": 2 ** 22 + 1, "start_ticks": 1},
+            {**base, "process_id": "recycled", "pid": os.getpid(), "pgid": os.getpid(), "start_ticks": -1},
+            # Same pid and start ticks, but journaled before a reboot
+            {**base, "process_id": "rebooted", "pid": os.getpid(), "pgid": os.getpid(),
+             "start_ticks": training_manager.process_start_ticks(os.getpid()), "boot_id": "another-boot"},
+        ])
+        restarted = self.manager()
+        self.assertEqual({r["status"] for r in restarted.list()}, {training_manager.EXITED})
+        self.assertIsNone(restarted.status("gone")["exit_code"])
+
+    def test_compaction_threshold(self):
+        """The journal is rewritten once it holds enough lines per record"""
+        manager = self.manager()
+        with patch.object(training_manager, "JOURNAL_MIN_LINES", 3), \
+             patch.object(training_manager, "JOURNAL_COMPACT_RATIO", 1):
+            for i in range(3):
+                self.start(manager, f"run{i}")
+                manager.wait(f"run{i}", timeout=10)
+        self.assertEqual(len(self.journal_lines()), 3)
+        self.assertEqual(len(self.manager().list()), 3)
+
+
+class TestLogReader(unittest.TestCase):
+    """Test offset-based log tailing"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "train.log")
+        self.reader = training_manager.LogReader(max_open=1)
+
+    def tearDown(self):
+        self.reader.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def append(self, data):
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+    def test_incremental_reads(self):
+        """Each read returns only new complete lines and the offset to continue from"""
+        self.append(b"step 1\nstep 2\nstep")
+        first = self.reader.read(self.path)
+        self.assertEqual(first["lines"], ["step 1", "step 2"])
+        self.assertEqual(first["next_offset"], 14)
+        self.assertFalse(first["eof"])
+
+        self.append(b" 3\n")
+        second = self.reader.read(self.path, first["next_offset"])
+        self.assertEqual((second["lines"], second["eof"]), (["step 3"], True))
+        self.assertEqual(self.reader.read(self.path, second["next_offset"])["lines"], [])
+
+    def test_max_bytes_and_final(self):
+        """Reads are capped at max_bytes; a finished log also returns its partial last line"""
+        self.append(b"aaaa\nbbbb\ncc")
+        chunk = self.reader.read(self.path, 0, max_bytes=7)
+        self.assertEqual((chunk["lines"], chunk["next_offset"]), (["aaaa"], 5))
+        final = self.reader.read(self.path, 5, final=True)
+        self.assertEqual((final["lines"], final["eof"]), (["bbbb", "cc"], True))
+        # A line longer than max_bytes is split instead of stalling the reader
+        self.assertEqual(self.reader.read(self.path, 5, max_bytes=2)["lines"], ["bb"])
+
+    def test_cached_handle_and_reset(self):
+        """Handles are reused between polls; an offset past the end restarts at 0"""
+        self.append(b"one\n")
+        with patch("builtins.open", wraps=open) as mock_open:
+            self.reader.read(self.path)
+            self.reader.read(self.path, 4)
+            self.assertEqual(mock_open.call_count, 1)
+        chunk = self.reader.read(self.path, 100)
+        self.assertEqual((chunk["lines"], chunk["reset"]), (["one"], True))
+        missing = self.reader.read(os.path.join(self.test_dir, "none.log"))
+        self.assertEqual(missing["lines"], [])
+
+
+class TestProgress(unittest.TestCase):
+    """Test progress parsing and the sample ring buffer"""
+
+    def test_parse_tqdm_line(self):
+        """Step, total, rate, lr and loss come out of ai-toolkit's progress bar"""
+        line = "matt_lora:  12%|█▏        | 245/2000 [05:12<37:10,  1.25s/it, lr: 1.0e-04 loss: 4.123e-01]"
+        self.assertEqual(training_manager.parse_progress(line), (245, 2000, 0.8, 1e-4, 0.4123))
+        fast = training_manager.parse_progress("  3/10 [00:01<00:02,  3.50it/s, loss: 0.5]")
+        self.assertEqual(fast, (3, 10, 3.5, None, 0.5))
+        self.assertIsNone(training_manager.parse_progress("Loading transformer 2/3 shards"))
+
+    def test_ignores_other_bars(self):
+        """Latent caching, sampling and checkpoint loading bars are not training progress"""
+        for line in ("Caching latents to disk: 100%|██████████| 30/30 [00:12<00:00,  2.41it/s]",
+                     "Generating Images:  33%|███▎      | 1/3 [00:09<00:18,  9.12s/it]",
+                     "Loading checkpoint shards: 100%|██████████| 2/2 [00:01<00:00,  1.20it/s]"):
+            self.assertIsNone(training_manager.parse_progress(line), line)
+
+        buffer = training_manager.ProgressBuffer()
+        for line in ("matt: 100%|██████████| 2000/2000 [41:02<00:00,  1.23s/it, lr: 1e-04 loss: 3.1e-01]",
+                     "Generating Images: 100%|██████████| 3/3 [00:27<00:00,  9.10s/it]"):
+            progress = training_manager.parse_progress(line)
+            if progress:
+                buffer.add(*progress)
+        summary = buffer.summary()
+        self.assertEqual((summary["step"], summary["total_steps"], summary["loss"]), (2000, 2000, 0.31))
+
+    def test_ring_buffer_summary(self):
+        """Rates come from the sample window; evicted samples leave the loss average"""
+        buffer = training_manager.ProgressBuffer(capacity=3)
+        self.assertIsNone(buffer.summary())
+        buffer.add(10, 100, it_per_sec=9.0, loss=4.0, now=100.0)
+        self.assertEqual(buffer.summary()["it_per_sec"], 9.0)
+
+        buffer.add(10, 100, loss=3.0, now=100.5)  # repaint of the same step
+        buffer.add(20, 100, loss=2.0, now=105.0)
+        buffer.add(30, 100, loss=1.0, now=110.0)
+        buffer.add(40, 100, loss=0.0, now=115.0)
+        summary = buffer.summary()
+        self.assertEqual(summary["samples"], 3)
+        self.assertEqual((summary["step"], summary["percent"]), (40, 40.0))
+        self.assertEqual(summary["it_per_sec"], 2.0)
+        self.assertEqual(summary["eta_seconds"], 30.0)
+        self.assertEqual(summary["loss_avg"], 1.0)
+
+        buffer.add(41, 100, now=116.0)  # a step drawn before its postfix is set
+        summary = buffer.summary()
+        self.assertEqual((summary["loss"], summary["last_loss"]), (None, 0.0))
+
+
+class TestTrainingHandlers(unittest.TestCase):
+    """Test train_with_yaml, process_status, processes, process_logs, force_kill and cleanup_stuck"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.manager = fake_manager()
+        self.patches = [
+            patch("handler_fast.TRAINING_RUNS_DIR", self.test_dir),
+            patch("handler_fast.PROCESS_MANAGER", self.manager)
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.manager.logs.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def run_job(self, job_type, job_input):
+        import uuid
+        from handler_fast import handle_heavy_operation
+        return handle_heavy_operation(job_type, job_input, {"yaml": yaml, "uuid": uuid})
+
+    def test_train_and_follow(self):
+        """A training run is launched, listed, queried and killed"""
+        yaml_config = yaml.dump({"config": {"name": "matt_lora"}, "fake": {"sleep": 30}})
+        started = self.run_job("train_with_yaml", {"yaml_config": yaml_config, "validate": False})
+        self.assertEqual(started["status"], "success")
+        self.assertEqual(started["name"], "matt_lora")
+        self.assertTrue(os.path.exists(started["config_path"]))
+        process_id = started["process_id"]
+
+        status = self.run_job("process_status", {"process_id": process_id})
+        self.assertEqual(status["process_status"], "running")
+        listing = self.run_job("processes", {})
+        self.assertEqual((listing["total_count"], listing["running"]), (1, 1))
+
+        killed = self.run_job("force_kill", {"process_id": process_id})
+        self.assertEqual(killed["status"], "success")
+        self.assertEqual(self.manager.wait(process_id, timeout=10)["status"], "killed")
+        self.assertEqual(self.run_job("cleanup_stuck", {})["cleaned_count"], 0)
+
+    def test_follow_logs(self):
+        """process_logs returns trainer output incrementally"""
+        yaml_config = yaml.dump({"fake": {"output": [f"step {i}" for i in range(5)]}})
+        process_id = self.run_job("train_with_yaml", {"yaml_config": yaml_config, "validate": False})["process_id"]
+        self.manager.wait(process_id, timeout=10)
+
+        first = self.run_job("process_logs", {"process_id": process_id, "max_bytes": 40})
+        self.assertEqual(first["status"], "success")
+        self.assertTrue(first["lines"][0].startswith("fake trainer running"))
+        rest = self.run_job("process_logs", {"process_id": process_id, "offset": first["next_offset"]})
+        self.assertEqual((first["lines"] + rest["lines"])[-5:], [f"step {i}" for i in range(5)])
+        self.assertTrue(rest["eof"])
+        self.assertEqual(rest["process_status"], "completed")
+        self.assertEqual(rest["next_offset"], os.path.getsize(os.path.join(self.test_dir, process_id, "train.log")))
+
+    def test_progress_in_status(self):
+        """process_status reports progress parsed from carriage-return redraws"""
+        output = [f"lora: {i}/8 [00:0{i}<00:08,  2.00it/s, lr: 1e-04 loss: 0.{9 - i}00]" for i in range(1, 5)]
+        yaml_config = yaml.dump({"fake": {"output": output, "line_end": "\r"}})
+        process_id = self.run_job("train_with_yaml", {"yaml_config": yaml_config, "validate": False})["process_id"]
+        self.manager.wait(process_id, timeout=10)
+
+        progress = self.run_job("process_status", {"process_id": process_id})["progress"]
+        self.assertEqual((progress["step"], progress["total_steps"]), (4, 8))
+        self.assertEqual((progress["loss"], progress["lr"]), (0.5, 1e-4))
+        self.assertEqual((progress["it_per_sec"], progress["eta_seconds"]), (2.0, 2.0))
+
+    def test_errors(self):
+        """Unknown processes and missing fields are reported as errors"""
+        self.assertEqual(self.run_job("train_with_yaml", {})["status"], "error")
+        self.assertEqual(self.run_job("process_status", {"process_id": "nope"})["status"], "error")
+        self.assertEqual(self.run_job("force_kill", {"process_id": "nope"})["status"], "error")
+        self.assertEqual(self.run_job("process_logs", {"process_id": "nope"})["status"], "error")
+        self.assertEqual(self.run_job("force_kill", {"process_id": "x", "signal": "SIGSTOP"})["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for training_scheduler.py and queued train_with_yaml runs
+Admission control, priorities, cancellation and start-time estimates with a fake trainer
+"""
+
+import sys
+import os
+import time
+import unittest
+import tempfile
+import shutil
+from datetime import datetime
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yaml
+
+import training_manager
+import training_scheduler
+
+FAKE_TRAINER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_trainer.py")
+
+
+class TestTrainingScheduler(unittest.TestCase):
+    """Test queueing runs in front of the process manager"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.manager = training_manager.ProcessManager([sys.executable, FAKE_TRAINER])
+        self.scheduler = training_scheduler.TrainingScheduler(self.manager)
+
+    def tearDown(self):
+        for record in self.scheduler.queue():
+            self.scheduler.cancel(record["process_id"])
+        for record in self.manager.list():
+            if record["status"] == training_manager.RUNNING:
+                self.manager.kill(record["process_id"])
+                self.manager.wait(record["process_id"], timeout=10)
+        self.manager.logs.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def submit(self, process_id, priority=0, estimated_seconds=None, **fake):
+        config_path = os.path.join(self.test_dir, f"{process_id}.yaml")
+        with open(config_path, "w") as f:
+            yaml.dump({"fake": fake}, f)
+        log_path = os.path.join(self.test_dir, process_id, "train.log")
+        return self.scheduler.submit(process_id, config_path, name=process_id, log_path=log_path,
+                                     priority=priority, estimated_seconds=estimated_seconds)
+
+    def test_one_at_a_time_by_priority(self):
+        """Only one trainer runs; higher priority jumps the queue"""
+        self.assertEqual(self.submit("a", sleep=30)["status"], "running")
+        self.assertEqual(self.submit("b", sleep=30)["status"], "queued")
+        urgent = self.submit("c", priority=5, sleep=30)
+        self.assertEqual((urgent["status"], urgent["position"]), ("queued", 1))
+        self.assertEqual([e["process_id"] for e in self.scheduler.queue()], ["c", "b"])
+
+        self.manager.kill("a")
+        self.manager.wait("a", timeout=10)
+        self.assertEqual(self.scheduler.status("c")["status"], "running")
+        self.assertEqual(self.scheduler.status("b")["position"], 1)
+        self.assertEqual(sum(1 for r in self.scheduler.list() if r["status"] == "running"), 1)
+
+    def test_next_run_starts_on_exit(self):
+        """A queued run is started as soon as the previous trainer is reaped"""
+        self.submit("first", sleep=0.3)
+        self.submit("second", sleep=30)
+        first = self.manager.wait("first", timeout=10)
+        second = self.scheduler.status("second")
+        self.assertEqual(second["status"], "running")
+        idle = datetime.fromisoformat(second["started_at"]) - datetime.fromisoformat(first["ended_at"])
+        self.assertLess(idle.total_seconds(), 0.5)
+
+    def test_cancel(self):
+        """Cancelled entries never start; running runs cannot be cancelled"""
+        self.submit("a", sleep=0.3)
+        self.submit("b", sleep=30)
+        self.assertEqual(self.scheduler.cancel("b")["status"], "cancelled")
+        with self.assertRaises(training_manager.TrainingError):
+            self.scheduler.cancel("a")
+        with self.assertRaises(training_manager.TrainingError):
+            self.scheduler.cancel("b")
+
+        self.manager.wait("a", timeout=10)
+        self.assertIsNone(self.manager.status("b"))
+        self.assertEqual(self.scheduler.queue(), [])
+
+    def test_start_estimates(self):
+        """Queued runs are scheduled after the running ETA and the estimated durations ahead"""
+        self.submit("a", sleep=30, output=["lora: 1/11 [00:01<00:10,  1.00it/s, lr: 1e-04 loss: 0.500]"])
+        deadline = time.time() + 10
+        while not self.manager.status("a")["progress"] and time.time() < deadline:
+            time.sleep(0.05)
+
+        self.submit("b", estimated_seconds=100)
+        self.submit("c")
+        self.submit("d")
+        queue = {e["process_id"]: e for e in self.scheduler.queue()}
+        self.assertAlmostEqual(queue["b"]["estimated_start_seconds"], 10, delta=1)
+        self.assertAlmostEqual(queue["c"]["estimated_start_seconds"], 110, delta=1)
+        # c has no duration estimate, so nothing after it can be planned
+        self.assertIsNone(queue["d"]["estimated_start_seconds"])
+
+    def test_max_concurrent(self):
+        """More slots admit more runs at once"""
+        self.scheduler.max_concurrent = 2
+        self.assertEqual(self.submit("a", sleep=30)["status"], "running")
+        self.assertEqual(self.submit("b", sleep=30)["status"], "running")
+        self.assertEqual(self.submit("c", sleep=30)["status"], "queued")
+
+    def test_queue_survives_restart(self):
+        """A new scheduler on the same journal restores queued and cancelled entries"""
+        journal_path = os.path.join(self.test_dir, "queue.jsonl")
+        self.scheduler = training_scheduler.TrainingScheduler(self.manager, journal_path=journal_path)
+        self.submit("a", sleep=0.3)
+        self.submit("b", sleep=30)
+        self.submit("c", sleep=30)
+        self.scheduler.cancel("c")
+        self.manager.wait("a", timeout=10)
+        self.assertEqual(self.scheduler.status("b")["status"], "running")
+        self.submit("d", sleep=30)
+
+        # A restarted worker: b is in the manager's registry now, d only in the queue journal
+        manager = training_manager.ProcessManager([sys.executable, FAKE_TRAINER])
+        restored = training_scheduler.TrainingScheduler(manager, journal_path=journal_path)
+
+        def stop_restored():
+            manager.kill("d")
+            manager.wait("d", timeout=10)
+            manager.logs.close()
+        self.addCleanup(stop_restored)
+        self.assertEqual(restored.status("d")["status"], "running")
+        self.assertEqual(restored.status("c")["status"], "cancelled")
+        self.assertIsNone(restored.status("b"))
+        self.assertEqual(restored.queue(), [])
+
+    def test_finished_entries_pruned(self):
+        """Only the newest cancelled entries are kept across compactions and restarts"""
+        journal_path = os.path.join(self.test_dir, "queue.jsonl")
+        self.scheduler = training_scheduler.TrainingScheduler(self.manager, journal_path=journal_path)
+        self.submit("running", sleep=30)
+        with patch.object(training_scheduler, "MAX_FINISHED_ENTRIES", 2), \
+             patch.object(training_manager, "JOURNAL_MIN_LINES", 3), \
+             patch.object(training_manager, "JOURNAL_COMPACT_RATIO", 1):
+            for i in range(5):
+                self.submit(f"c{i}", sleep=30)
+                self.scheduler.cancel(f"c{i}")
+            self.assertEqual([e["process_id"] for e in self.scheduler.list()[1:]], ["c3", "c4"])
+
+            restored = training_scheduler.TrainingScheduler(self.manager, journal_path=journal_path)
+            self.assertEqual([e["process_id"] for e in restored.list()[1:]], ["c3", "c4"])
+
+    def test_restore_registers_exit_callback_first(self):
+        """A run started from the journal can already start the next one when it exits"""
+        journal_path = os.path.join(self.test_dir, "queue.jsonl")
+        self.scheduler = training_scheduler.TrainingScheduler(self.manager, journal_path=journal_path)
+        self.submit("a", sleep=30)
+        self.submit("b", sleep=30)
+
+        manager = training_manager.ProcessManager([sys.executable, FAKE_TRAINER])
+        callbacks_at_start = []
+        original_start = manager.start
+
+        def start(*args, **kwargs):
+            callbacks_at_start.append(len(manager.exit_callbacks))
+            return original_start(*args, **kwargs)
+
+        def stop_restored():
+            manager.kill("b")
+            manager.wait("b", timeout=10)
+            manager.logs.close()
+        with patch.object(manager, "start", side_effect=start):
+            training_scheduler.TrainingScheduler(manager, journal_path=journal_path)
+        self.addCleanup(stop_restored)
+        self.assertEqual(callbacks_at_start, [1])
+
+
+class TestQueuedTrainingHandlers(unittest.TestCase):
+    """Test train_with_yaml queueing, processes and cancel_training"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.manager = training_manager.ProcessManager([sys.executable, FAKE_TRAINER])
+        self.patches = [
+            patch("handler_fast.TRAINING_RUNS_DIR", self.test_dir),
+            patch("handler_fast.PROCESS_MANAGER", self.manager)
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for record in self.manager.list():
+            if record["status"] == training_manager.RUNNING:
+                self.manager.kill(record["process_id"])
+                self.manager.wait(record["process_id"], timeout=10)
+        for p in self.patches:
+            p.stop()
+        self.manager.logs.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def run_job(self, job_type, job_input):
+        import uuid
+        from handler_fast import handle_heavy_operation
+        return handle_heavy_operation(job_type, job_input, {"yaml": yaml, "uuid": uuid})
+
+    def test_queue_and_cancel(self):
+        """A second submission waits for the GPU and can be cancelled"""
+        yaml_config = yaml.dump({"fake": {"sleep": 30}, "config": {"process": [{"train": {"steps": 500}}]}})
+        first = self.run_job("train_with_yaml", {"yaml_config": yaml_config, "validate": False})
+        second = self.run_job("train_with_yaml", {"yaml_config": yaml_config, "validate": False, "priority": 1})
+        self.assertEqual((first["process_status"], second["process_status"]), ("running", "queued"))
+        self.assertEqual(second["steps"], 500)
+
+        listing = self.run_job("processes", {})
+        self.assertEqual((listing["running"], listing["queued"]), (1, 1))
+        self.assertEqual(self.run_job("process_status", {"process_id": second["process_id"]})["position"], 1)
+
+        cancelled = self.run_job("cancel_training", {"process_id": second["process_id"]})
+        self.assertEqual(cancelled["process_status"], "cancelled")
+        self.assertEqual(self.run_job("cancel_training", {"process_id": first["process_id"]})["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
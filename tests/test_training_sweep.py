@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for training_sweep.py and the train_sweep / sweep_status jobs
+Axis expansion, summary tables and sweeps run through the scheduler with a fake trainer
+"""
+
+import sys
+import os
+import unittest
+import tempfile
+import shutil
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yaml
+from PIL import Image
+
+import training_config
+import training_manager
+import training_sweep
+
+FAKE_TRAINER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_trainer.py")
+SAMPLING_LINE = "Generating Images: 100%|██████████| 3/3 [00:27<00:00,  9.10s/it]"
+
+
+def step_line(loss):
+    return f"lora: 10/10 [00:05<00:00,  2.00it/s, lr: 1e-04 loss: {loss}]"
+
+
+class TestExpandAxes(unittest.TestCase):
+    """Test grid and random expansion"""
+
+    def test_grid(self):
+        """The Cartesian product in itertools.product order"""
+        variants = training_sweep.expand_axes({"train.lr": [1, 2], "network.linear": [8, 16, 32]})
+        self.assertEqual(len(variants), 6)
+        self.assertEqual(variants[0], {"train.lr": 1, "network.linear": 8})
+        self.assertEqual(variants[1], {"train.lr": 1, "network.linear": 16})
+        self.assertEqual(variants[-1], {"train.lr": 2, "network.linear": 32})
+
+    def test_random(self):
+        """Seeded samples are reproducible, distinct and capped at the grid size"""
+        axes = {"a": list(range(10)), "b": list(range(10))}
+        first = training_sweep.expand_axes(axes, "random", samples=5, seed=3)
+        self.assertEqual(first, training_sweep.expand_axes(axes, "random", samples=5, seed=3))
+        self.assertEqual(len({(v["a"], v["b"]) for v in first}), 5)
+        self.assertEqual(len(training_sweep.expand_axes({"a": [1, 2]}, "random", samples=9)), 2)
+
+    def test_invalid(self):
+        """Bad modes, empty axes and oversized grids are refused"""
+        for args in (({"a": [1]}, "spiral"), ({},), ({"a": []},), ({"a": [1]}, "random"),
+                     ({"a": list(range(9)), "b": list(range(9))},)):
+            with self.assertRaises(training_config.ConfigError, msg=args):
+                training_sweep.expand_axes(*args)
+
+    def test_axis_path(self):
+        """Axes are relative to the first process unless already absolute"""
+        self.assertEqual(training_sweep.axis_path("train.lr"), "config.process[0].train.lr")
+        self.assertEqual(training_sweep.axis_path("lr"), "lr")
+        self.assertEqual(training_sweep.axis_path("$.fake.output"), "$.fake.output")
+
+
+class TestSummarize(unittest.TestCase):
+    """Test the sweep summary"""
+
+    def test_sorted_by_final_loss(self):
+        """Completed runs rank by final loss; unfinished ones keep the sweep open"""
+        sweep = {"axes": {"train.lr": [1, 2, 3]}, "runs": [
+            {"process_id": p, "name": p, "params": {"train.lr": i}} for i, p in enumerate("abc")
+        ]}
+        records = {
+            "a": {"status": "completed", "progress": {"last_loss": 0.4, "loss_avg": 0.5, "step": 10,
+                                                      "total_steps": 10}, "runtime_seconds": 60.0},
+            # Reloaded after a restart: only the journaled final progress is left
+            "b": {"status": "completed", "progress": None, "final_progress": {
+                "last_loss": 0.2, "loss_avg": 0.3, "step": 10, "total_steps": 10}, "runtime_seconds": 30.0},
+            "c": {"status": "queued"}
+        }
+        summary = training_sweep.summarize(sweep, records)
+        self.assertEqual([row["process_id"] for row in summary["summary"]], ["b", "a", "c"])
+        self.assertEqual(summary["best"]["process_id"], "b")
+        self.assertEqual((summary["complete"], summary["finished"], summary["total_runtime_seconds"]),
+                         (False, 2, 90.0))
+        table = summary["table"].splitlines()
+        self.assertEqual(table[0].split(), ["train.lr", "status", "final_loss", "loss_avg", "step", "runtime_s"])
+        self.assertEqual(table[1].split(), ["1", "completed", "0.2000", "0.3000", "10/10", "30"])
+
+
+class TestSweepHandlers(unittest.TestCase):
+    """Test train_sweep and sweep_status against fake trainers"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.dataset = os.path.join(self.test_dir, "data")
+        os.makedirs(self.dataset)
+        Image.new("RGB", (64, 64)).save(os.path.join(self.dataset, "a.png"))
+        self.manager = training_manager.ProcessManager([sys.executable, FAKE_TRAINER])
+        self.patches = [
+            patch("handler_fast.TRAINING_RUNS_DIR", self.test_dir),
+            patch("handler_fast.PROCESS_MANAGER", self.manager)
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for record in self.manager.list():
+            if record["status"] == training_manager.RUNNING:
+                self.manager.kill(record["process_id"])
+                self.manager.wait(record["process_id"], timeout=10)
+        for p in self.patches:
+            p.stop()
+        self.manager.logs.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def run_job(self, job_type, job_input):
+        import uuid
+        from handler_fast import handle_heavy_operation
+        return handle_heavy_operation(job_type, job_input, {"yaml": yaml, "uuid": uuid})
+
+    def yaml_config(self):
+        fake = {"output": [step_line(0.5), SAMPLING_LINE]}
+        return yaml.dump({"fake": fake, "config": {"name": "matt", "process": [{
+            "network": {"linear": 16},
+            "datasets": [{"folder_path": self.dataset}],
+            "train": {"steps": 10, "lr": 1e-4},
+            "model": {"name_or_path": "sd15"}
+        }]}})
+
+    def test_sweep_to_summary(self):
+        """Every variant is queued, the dataset is checked once, and wait returns the table"""
+        # Every run samples after its last step, as training.yaml does
+        axes = {"network.linear": [8, 16],
+                "$.fake.output": [[step_line(0.4), SAMPLING_LINE], [step_line(0.2), SAMPLING_LINE]]}
+        with patch("training_config.dataset_summary", wraps=training_config.dataset_summary) as summary:
+            result = self.run_job("train_sweep", {"yaml_config": self.yaml_config(), "axes": axes, "wait": True,
+                                                  "wait_timeout": 30})
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(summary.call_count, 1)
+        self.assertTrue(result["complete"])
+        self.assertEqual(len(result["summary"]), 4)
+        self.assertEqual(result["best"]["final_loss"], 0.2)
+        self.assertEqual({row["status"] for row in result["summary"]}, {"completed"})
+
+        config_path = self.manager.status(result["runs"][0]["process_id"])["config_path"]
+        with open(config_path) as f:
+            launched = yaml.safe_load(f)
+        self.assertEqual(launched["config"]["name"], f"matt_{result['sweep_id']}_00")
+        self.assertTrue(launched["config"]["process"][0]["datasets"][0]["cache_latents_to_disk"])
+
+        status = self.run_job("sweep_status", {"sweep_id": result["sweep_id"]})
+        self.assertEqual(status["table"], result["table"])
+        self.assertEqual(self.run_job("sweep_status", {"sweep_id": "nope"})["status"], "error")
+
+    def test_dry_run_and_rejection(self):
+        """dry_run shows resolved variants; one bad variant stops the whole sweep"""
+        dry = self.run_job("train_sweep", {"yaml_config": self.yaml_config(), "mode": "random", "samples": 2,
+                                           "seed": 1, "axes": {"train.lr": [1e-4, 2e-4, 3e-4]}, "dry_run": True})
+        self.assertEqual(len(dry["runs"]), 2)
+        self.assertEqual(dry["runs"][0]["config"]["config"]["process"][0]["train"]["optimizer"], "adamw")
+
+        rejected = self.run_job("train_sweep", {"yaml_config": self.yaml_config(),
+                                                "axes": {"train.optimizer": ["adamw", "adamw9bit"]}})
+        self.assertEqual(rejected["status"], "error")
+        self.assertIn("_01: config.process[0].train.optimizer", rejected["errors"][0])
+        self.assertEqual(self.manager.list(), [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
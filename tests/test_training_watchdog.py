@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+🧪 Tests for training_watchdog.py and the cleanup_stuck sweep
+Stall detection from progress and log activity, SIGTERM → SIGKILL escalation and slot release
+"""
+
+import sys
+import os
+import time
+import unittest
+import tempfile
+import shutil
+from datetime import datetime
+from unittest.mock import patch
+
+# Add parent directory to path for importing handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yaml
+
+import training_manager
+import training_scheduler
+import training_watchdog
+
+FAKE_TRAINER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_trainer.py")
+STEP_LINE = "lora: 5/100 [00:05<01:35,  1.00it/s, lr: 1e-04 loss: 0.300]"
+
+
+def iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+class TestStallReason(unittest.TestCase):
+    """Test when a running record counts as stalled"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.test_dir, "train.log")
+        with open(self.log_path, "w") as f:
+            f.write("loading\n")
+        self.now = time.time()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def record(self, started_ago, advanced_ago=None, log_ago=0):
+        os.utime(self.log_path, (self.now - log_ago, self.now - log_ago))
+        progress = {"step": 5, "advanced_at": iso(self.now - advanced_ago)} if advanced_ago is not None else None
+        return {"started_at": iso(self.now - started_ago), "progress": progress, "log_path": self.log_path}
+
+    def test_progress_window(self):
+        """Steps that stop advancing trip the progress window even while the log grows"""
+        reason = training_watchdog.stall_reason(self.record(1000, advanced_ago=700), self.now, 600, 600)
+        self.assertIn("stuck at step 5", reason)
+        self.assertIsNone(training_watchdog.stall_reason(self.record(1000, advanced_ago=100), self.now, 600, 600))
+
+    def test_log_window(self):
+        """Before the first step only log growth counts, and never from before the start"""
+        self.assertIn("no log output", training_watchdog.stall_reason(self.record(1000, log_ago=700), self.now, 600, 600))
+        self.assertIsNone(training_watchdog.stall_reason(self.record(100, log_ago=700), self.now, 600, 600))
+
+
+class TestWatchdog(unittest.TestCase):
+    """Test sweeps against fake trainers"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.manager = training_manager.ProcessManager([sys.executable, FAKE_TRAINER])
+        self.watchdog = training_watchdog.Watchdog(self.manager, progress_window=0.5, log_window=60,
+                                                   grace_seconds=0.5)
+
+    def tearDown(self):
+        for record in self.manager.list():
+            if record["status"] == training_manager.RUNNING:
+                self.manager.kill(record["process_id"])
+                self.manager.wait(record["process_id"], timeout=10)
+        self.manager.logs.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def start(self, process_id, start=None, **fake):
+        config_path = os.path.join(self.test_dir, f"{process_id}.yaml")
+        with open(config_path, "w") as f:
+            yaml.dump({"fake": fake}, f)
+        log_path = os.path.join(self.test_dir, process_id, "train.log")
+        return (start or self.manager.start)(process_id, config_path, name=process_id, log_path=log_path)
+
+    def wait_for_step(self, process_id):
+        deadline = time.time() + 10
+        while not self.manager.status(process_id)["progress"] and time.time() < deadline:
+            time.sleep(0.05)
+
+    def test_escalates_to_sigkill(self):
+        """A stalled trainer that ignores SIGTERM is SIGKILLed after the grace period"""
+        self.start("hung", sleep=60, ignore_sigterm=True, output=[STEP_LINE])
+        self.wait_for_step("hung")
+        self.assertEqual(self.watchdog.sweep()["stalled"], [])
+
+        time.sleep(0.8)
+        sweep = self.watchdog.sweep()
+        self.assertEqual([s["process_id"] for s in sweep["stalled"]], ["hung"])
+        self.assertEqual(self.manager.status("hung")["kill_signal"], "SIGTERM")
+        # Already being stopped: the next sweep leaves it alone
+        self.assertEqual(self.watchdog.sweep()["stalled"], [])
+
+        record = self.manager.wait("hung", timeout=10)
+        self.assertEqual((record["status"], record["kill_signal"]), (training_manager.KILLED, "SIGKILL"))
+        self.assertIn("ignored SIGTERM", record["kill_reason"])
+        self.assertIn("stuck at step 5", record["kill_reason"])
+
+    def test_escalation_kills_surviving_children(self):
+        """Children that ignore SIGTERM are SIGKILLed even though the leader already exited"""
+        self.watchdog.grace_seconds = 2
+        record = self.start("leaky", sleep=60, child_sleep=60, child_ignore_sigterm=True, output=[STEP_LINE])
+        self.addCleanup(self.manager.cleanup_stuck)
+        self.wait_for_step("leaky")
+        time.sleep(0.5)
+
+        # stop_run alone: a sweep's cleanup_stuck pass could reap the child as an orphan first
+        self.watchdog.stop_run("leaky", "stalled")
+        self.assertEqual(self.manager.wait("leaky", timeout=10)["kill_signal"], "SIGTERM")
+        self.assertNotEqual(training_manager.group_members(record["pgid"]), [])
+        deadline = time.time() + 10
+        while training_manager.group_members(record["pgid"]) and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(training_manager.group_members(record["pgid"]), [])
+
+    def test_stall_frees_queue_slot(self):
+        """Stopping a stalled run starts the next queued one"""
+        scheduler = training_scheduler.TrainingScheduler(self.manager)
+        self.start("stalled", start=scheduler.submit, sleep=60, output=[STEP_LINE])
+        self.start("next", start=scheduler.submit, sleep=60)
+        self.wait_for_step("stalled")
+        time.sleep(0.8)
+
+        self.watchdog.sweep()
+        record = self.manager.wait("stalled", timeout=10)
+        self.assertEqual(record["kill_signal"], "SIGTERM")
+        self.assertTrue(record["kill_reason"].startswith("stalled:"))
+        self.assertEqual(scheduler.status("next")["status"], training_manager.RUNNING)
+
+
+class TestCleanupStuckHandler(unittest.TestCase):
+    """Test cleanup_stuck with windows from the job input"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.manager = training_manager.ProcessManager([sys.executable, FAKE_TRAINER])
+        self.patches = [
+            patch("handler_fast.TRAINING_RUNS_DIR", self.test_dir),
+            patch("handler_fast.PROCESS_MANAGER", self.manager)
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for record in self.manager.list():
+            if record["status"] == training_manager.RUNNING:
+                self.manager.kill(record["process_id"])
+                self.manager.wait(record["process_id"], timeout=10)
+        for p in self.patches:
+            p.stop()
+        self.manager.logs.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def run_job(self, job_type, job_input):
+        import uuid
+        from handler_fast import handle_heavy_operation
+        return handle_heavy_operation(job_type, job_input, {"yaml": yaml, "uuid": uuid})
+
+    def test_on_demand_sweep(self):
+        """A run with a silent log is stopped when the window is shortened"""
+        started = self.run_job("train_with_yaml", {"yaml_config": yaml.dump({"fake": {"sleep": 60}}), "validate": False})
+        self.assertEqual(self.run_job("cleanup_stuck", {})["cleaned_count"], 0)
+
+        time.sleep(0.5)
+        result = self.run_job("cleanup_stuck", {"log_stall_seconds": 0.2})
+        self.assertEqual(result["status"], "success")
+        self.assertEqual([s["process_id"] for s in result["stalled"]], [started["process_id"]])
+        self.assertIn("no log output", result["cleaned"][0]["reason"])
+        self.assertEqual(self.manager.wait(started["process_id"], timeout=10)["status"], "killed")
+        self.assertEqual(self.run_job("cleanup_stuck", {"stall_seconds": "soon"})["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
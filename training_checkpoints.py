@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+💾 Checkpoint index for training output folders
+Step-numbered LoRA saves and optimizer state recorded once per file, queried to resume interrupted runs
+"""
+
+import json
+import os
+import re
+import sqlite3
+import struct
+import time
+
+INDEX_FILENAME = ".checkpoint_index.sqlite"
+# 2: steps are only read from <name>_<9 digits> filenames; older rows are re-indexed
+SCHEMA_VERSION = 2
+
+# ai-toolkit saves <name>_<step:09d>.safetensors every save_every steps, <name>.safetensors at
+# the end, and the optimizer state of the latest save as optimizer.pt next to them
+OPTIMIZER_FILENAME = "optimizer.pt"
+STEP_DIGITS = 9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    filename TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    step INTEGER,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS checkpoints_step ON checkpoints (kind, step);
+"""
+
+
+def index_path(folder):
+    return os.path.join(folder, INDEX_FILENAME)
+
+
+def open_index(folder):
+    """Open (and create or migrate) the checkpoint index of a training output folder"""
+    conn = sqlite3.connect(index_path(folder), timeout=30)
+    conn.row_factory = sqlite3.Row
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        conn.executescript(SCHEMA)
+        if version:
+            conn.execute("DELETE FROM checkpoints")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    return conn
+
+
+def read_safetensors_metadata(path):
+    """__metadata__ of a safetensors file, read from its JSON header only"""
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        if header_size > 100 * 1024 * 1024:
+            raise ValueError(f"Implausible safetensors header size: {header_size}")
+        header = json.loads(f.read(header_size))
+    return header.get("__metadata__") or {}
+
+
+def step_pattern(name):
+    """Filename of a step-numbered save of run name: <name>_<9-digit step>.safetensors
+
+    Anchored on the run name, so a final save of a run whose own name ends in
+    _<digits> (e.g. sweep runs) is not mistaken for a step.
+    """
+    return re.compile(rf"^{re.escape(name)}_(\d{{{STEP_DIGITS}}})\.safetensors$")
+
+
+def checkpoint_step(path, name):
+    """Training step of a LoRA save of run name: from its filename, else from the training_info metadata"""
+    match = step_pattern(name).match(os.path.basename(path))
+    if match:
+        return int(match.group(1))
+    try:
+        training_info = json.loads(read_safetensors_metadata(path).get("training_info") or "{}")
+        return int(training_info["step"])
+    except (OSError, ValueError, KeyError, TypeError, struct.error):
+        return None
+
+
+def update_index(folder, name=None):
+    """Bring the index in line with the saves in folder (one scandir, no recursion)
+
+    name is the run the saves belong to (default: the folder name, as in
+    training_folder/<name>). Only files whose size/mtime changed are looked
+    at again, so the safetensors headers of old saves are never re-read.
+    """
+    name = name or os.path.basename(os.path.normpath(folder))
+    conn = open_index(folder)
+    try:
+        indexed = {row["filename"]: row for row in conn.execute("SELECT filename, size, mtime_ns FROM checkpoints")}
+        stats = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_file() and (entry.name.endswith(".safetensors") or entry.name == OPTIMIZER_FILENAME):
+                    stats[entry.name] = entry.stat()
+
+        rows = []
+        for filename, stat in stats.items():
+            known = indexed.get(filename)
+            if known and (known["size"], known["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            kind = "optimizer" if filename == OPTIMIZER_FILENAME else "lora"
+            step = checkpoint_step(os.path.join(folder, filename), name) if kind == "lora" else None
+            rows.append((filename, kind, stat.st_size, stat.st_mtime_ns, step, time.time()))
+        removed = sorted(set(indexed) - set(stats))
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO checkpoints (filename, kind, size, mtime_ns, step, indexed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+        conn.executemany("DELETE FROM checkpoints WHERE filename = ?", [(filename,) for filename in removed])
+        conn.commit()
+    finally:
+        conn.close()
+    return {"indexed": len(rows), "removed": removed, "unchanged": len(stats) - len(rows)}
+
+
+def latest_checkpoint(folder, name=None):
+    """Newest step-numbered save of run name (default: the folder name) and its optimizer state, or None"""
+    if not os.path.isdir(folder):
+        return None
+    update_index(folder, name)
+    conn = open_index(folder)
+    try:
+        save = conn.execute(
+            "SELECT filename, step, mtime_ns FROM checkpoints WHERE kind = 'lora' AND step IS NOT NULL "
+            "ORDER BY step DESC, mtime_ns DESC LIMIT 1"
+        ).fetchone()
+        optimizer = conn.execute(
+            "SELECT filename, mtime_ns FROM checkpoints WHERE kind = 'optimizer'"
+        ).fetchone()
+    finally:
+        conn.close()
+    if save is None:
+        return None
+    # optimizer.pt is rewritten on every save; an older one belongs to an earlier save
+    optimizer_path = (
+        os.path.join(folder, optimizer["filename"])
+        if optimizer and optimizer["mtime_ns"] >= save["mtime_ns"] else None
+    )
+    return {
+        "checkpoint": os.path.join(folder, save["filename"]),
+        "step": save["step"],
+        "optimizer_state": optimizer_path
+    }
+
+
+def run_folder(process, cwd):
+    """Absolute training_folder of a process config (relative ones resolve against the trainer cwd)"""
+    training_folder = process.get("training_folder") or "output"
+    return training_folder if os.path.isabs(training_folder) else os.path.join(cwd, training_folder)
+
+
+def prepare_resume(config, cwd):
+    """Point config at the newest checkpoint of its run; returns (config, resume report)
+
+    training_folder/<config.name> of the first process is searched. With a
+    checkpoint the process gets an absolute training_folder (so the trainer
+    writes to the same place), network.pretrained_lora_path and
+    train.start_step. Without one the config is left to start from step 0.
+    """
+    name = config["config"]["name"]
+    process = config["config"]["process"][0]
+    training_folder = run_folder(process, cwd)
+    folder = os.path.join(training_folder, name)
+    latest = latest_checkpoint(folder, name)
+    total_steps = (process.get("train") or {}).get("steps")
+
+    if latest is None:
+        return config, {"resumed": False, "folder": folder, "steps_saved": 0}
+
+    process["training_folder"] = training_folder
+    process.setdefault("network", {})["pretrained_lora_path"] = latest["checkpoint"]
+    process.setdefault("train", {})["start_step"] = latest["step"]
+    return config, {
+        "resumed": True,
+        "folder": folder,
+        **latest,
+        "steps_saved": latest["step"],
+        "steps_remaining": max(0, total_steps - latest["step"]) if isinstance(total_steps, int) else None
+    }
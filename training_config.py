@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+🧩 Base training configs, JSON-path overlays and config validation
+Register a full ai-toolkit YAML once, launch runs from small overlays, and reject broken configs before launch
+"""
+
+import copy
+import difflib
+import hashlib
+import json
+import os
+import re
+import threading
+
+# Short overlay keys for the fields that change between runs
+OVERLAY_SHORTCUTS = {
+    "name": "config.name",
+    "steps": "config.process[0].train.steps",
+    "lr": "config.process[0].train.lr",
+    "batch_size": "config.process[0].train.batch_size",
+    "optimizer": "config.process[0].train.optimizer",
+    "rank": "config.process[0].network.linear",
+    "alpha": "config.process[0].network.linear_alpha",
+    "folder_path": "config.process[0].datasets[0].folder_path",
+    "resolution": "config.process[0].datasets[0].resolution",
+    "save_every": "config.process[0].save.save_every",
+    "sample_every": "config.process[0].sample.sample_every",
+}
+
+BASE_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+PATH_TOKEN = re.compile(r"([^.\[\]]+)|\[(\d+)\]")
+
+
+class ConfigError(ValueError):
+    """Invalid base config, unknown base name, overlay that does not fit or config failing validation"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or [message]
+
+
+def parse_path(path):
+    """"config.process[0].train.lr" (optionally prefixed "$.") -> ["config", "process", 0, "train", "lr"]"""
+    path = OVERLAY_SHORTCUTS.get(path, path)
+    if path.startswith("$."):
+        path = path[2:]
+    tokens = []
+    position = 0
+    for match in PATH_TOKEN.finditer(path):
+        separator = path[position:match.start()]
+        if separator not in ("", ".") or (separator == "" and position and match.group(1)):
+            raise ConfigError(f"Invalid overlay path: {path}")
+        tokens.append(match.group(1) if match.group(1) is not None else int(match.group(2)))
+        position = match.end()
+    if not tokens or position != len(path):
+        raise ConfigError(f"Invalid overlay path: {path}")
+    return tokens
+
+
+def deep_merge(base, overlay):
+    """Copy of base with overlay merged in: dicts merge key by key, anything else replaces"""
+    if not isinstance(base, dict) or not isinstance(overlay, dict):
+        return copy.deepcopy(overlay)
+    merged = dict(base)
+    for key, value in overlay.items():
+        merged[key] = deep_merge(base[key], value) if key in base else copy.deepcopy(value)
+    return merged
+
+
+def _check_type(path, current, value):
+    """Overlay values must keep the base value's kind (number, string, bool, list, mapping)"""
+    if current is None or value is None:
+        return
+    kinds = ((bool,), (int, float), (str,), (list,), (dict,))
+    for kind in kinds:
+        if isinstance(current, kind) and not (isinstance(current, bool) and kind != (bool,)):
+            if not isinstance(value, kind) or (isinstance(value, bool) and kind != (bool,)):
+                raise ConfigError(
+                    f"{path}: expected {type(current).__name__}, got {type(value).__name__}"
+                )
+            return
+
+
+def apply_overlay(config, overlay):
+    """New config with every {path: value} of overlay applied
+
+    Paths must lead through existing mappings and list items of the base;
+    new keys may only be added at the last step. A mapping value is
+    deep-merged into the mapping already at that path.
+    """
+    config = copy.deepcopy(config)
+    for path, value in overlay.items():
+        tokens = parse_path(path)
+        parent = config
+        for depth, token in enumerate(tokens[:-1]):
+            try:
+                parent = parent[token]
+            except (KeyError, IndexError, TypeError):
+                raise ConfigError(f"{path}: {_format(tokens[:depth + 1])} not in base config") from None
+        last = tokens[-1]
+        if isinstance(last, int):
+            if not isinstance(parent, list) or last >= len(parent):
+                raise ConfigError(f"{path}: {_format(tokens)} not in base config")
+        elif not isinstance(parent, dict):
+            raise ConfigError(f"{path}: {_format(tokens[:-1])} is not a mapping")
+
+        current = parent[last] if isinstance(last, int) or last in parent else None
+        _check_type(path, current, value)
+        parent[last] = deep_merge(current, value) if isinstance(current, dict) else copy.deepcopy(value)
+    return config
+
+
+def _format(tokens):
+    return "".join(f"[{t}]" if isinstance(t, int) else (f".{t}" if i else t) for i, t in enumerate(tokens))
+
+
+def validate_base(config):
+    """Minimal shape every ai-toolkit job config has"""
+    if not isinstance(config, dict) or not isinstance(config.get("config"), dict):
+        raise ConfigError("Base config needs a top-level 'config' mapping")
+    processes = config["config"].get("process")
+    if not isinstance(processes, list) or not processes or not all(isinstance(p, dict) for p in processes):
+        raise ConfigError("Base config needs a non-empty 'config.process' list")
+
+
+class BaseConfigStore:
+    """Named base configs parsed once and kept in memory
+
+    register() parses the YAML and writes the parsed result as JSON next to
+    it, so a restarted worker reloads it without YAML parsing. get() hands
+    out deep copies; the cached dict is never modified.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def _path(self, name, suffix):
+        if not BASE_NAME_PATTERN.match(name or ""):
+            raise ConfigError(f"Invalid base config name: {name!r}")
+        return os.path.join(self.store_dir, f"{name}{suffix}")
+
+    def register(self, name, yaml_text, yaml_module):
+        """Parse, check and store yaml_text as base config name (replacing any previous one)"""
+        json_path = self._path(name, ".json")
+        try:
+            config = yaml_module.safe_load(yaml_text)
+        except yaml_module.YAMLError as e:
+            raise ConfigError(f"Invalid YAML: {e}") from e
+        validate_base(config)
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        with open(self._path(name, ".yaml"), "w", encoding="utf-8") as f:
+            f.write(yaml_text)
+        entry = {"name": name, "sha256": hashlib.sha256(yaml_text.encode("utf-8")).hexdigest(), "config": config}
+        with open(json_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(json_path + ".tmp", json_path)
+        with self._lock:
+            self._cache[name] = entry
+        return self.describe(name)
+
+    def _entry(self, name):
+        json_path = self._path(name, ".json")
+        with self._lock:
+            entry = self._cache.get(name)
+            if entry is None:
+                try:
+                    with open(json_path, encoding="utf-8") as f:
+                        entry = json.load(f)
+                except FileNotFoundError:
+                    raise ConfigError(f"Unknown base config: {name}") from None
+                self._cache[name] = entry
+            return entry
+
+    def get(self, name):
+        """Deep copy of base config name"""
+        return copy.deepcopy(self._entry(name)["config"])
+
+    def describe(self, name):
+        entry = self._entry(name)
+        return {"name": name, "sha256": entry["sha256"], "config_name": entry["config"]["config"].get("name")}
+
+    def names(self):
+        try:
+            return sorted(f[:-len(".json")] for f in os.listdir(self.store_dir) if f.endswith(".json"))
+        except FileNotFoundError:
+            return []
+
+    def build(self, name, overlay=None):
+        """Base config name with overlay applied"""
+        config = self._entry(name)["config"]
+        return apply_overlay(config, overlay or {})
+
+
+# Schema of one entry in config.process. Specs: "type" (python types), "default",
+# "required", "choices", "min"/"max", "multiple_of", "fields" (mappings) and
+# "items" (list elements). Keys the schema does not know are passed through.
+NUMBER = (int, float)
+OPTIMIZERS = (
+    "adam", "adamw", "adam8", "adam8bit", "adamw8", "adamw8bit", "ademamix8bit", "lion", "lion8bit",
+    "adagrad", "adafactor", "prodigy", "prodigy8bit", "dadaptation", "dadaptadam", "dadaptlion",
+    "automagic", "sgd"
+)
+NOISE_SCHEDULERS = ("ddpm", "ddim", "euler", "euler_a", "lms", "pndm", "dpmsolver", "lcm", "flowmatch")
+DTYPES = ("fp32", "float32", "fp16", "float16", "bf16", "bfloat16")
+
+PROCESS_SCHEMA = {
+    "type": {"type": str, "default": "sd_trainer", "choices": ("sd_trainer",)},
+    "training_folder": {"type": str, "default": "output"},
+    "device": {"type": str, "default": "cuda:0"},
+    "network": {"type": dict, "required": True, "fields": {
+        "type": {"type": str, "default": "lora", "choices": ("lora", "locon", "lokr")},
+        "linear": {"type": int, "required": True, "min": 1},
+        "linear_alpha": {"type": NUMBER, "min": 0},
+        "pretrained_lora_path": {"type": str},
+    }},
+    "save": {"type": dict, "fields": {
+        "dtype": {"type": str, "default": "float16", "choices": DTYPES},
+        "save_every": {"type": int, "default": 1000, "min": 1},
+        "max_step_saves_to_keep": {"type": int, "default": 5, "min": 1},
+        "push_to_hub": {"type": bool, "default": False},
+    }},
+    "datasets": {"type": list, "required": True, "min_items": 1, "items": {"type": dict, "fields": {
+        "folder_path": {"type": str, "required": True},
+        "caption_ext": {"type": str, "default": "txt"},
+        "caption_dropout_rate": {"type": NUMBER, "default": 0.05, "min": 0, "max": 1},
+        "shuffle_tokens": {"type": bool, "default": False},
+        "cache_latents_to_disk": {"type": bool, "default": False},
+        "resolution": {"type": (list, int), "default": [512, 768, 1024], "min_items": 1,
+                       "items": {"type": int, "min": 256, "multiple_of": 64}},
+    }}},
+    "train": {"type": dict, "required": True, "fields": {
+        "batch_size": {"type": int, "default": 1, "min": 1},
+        "steps": {"type": int, "required": True, "min": 1},
+        "start_step": {"type": int, "min": 0},
+        "gradient_accumulation_steps": {"type": int, "default": 1, "min": 1},
+        "train_unet": {"type": bool, "default": True},
+        "train_text_encoder": {"type": bool, "default": False},
+        "gradient_checkpointing": {"type": bool, "default": True},
+        "noise_scheduler": {"type": str, "default": "ddpm", "choices": NOISE_SCHEDULERS},
+        "optimizer": {"type": str, "default": "adamw", "choices": OPTIMIZERS},
+        "lr": {"type": NUMBER, "required": True, "min": 0, "max": 1},
+        "dtype": {"type": str, "default": "fp32", "choices": DTYPES},
+        "ema_config": {"type": dict, "fields": {
+            "use_ema": {"type": bool, "default": False},
+            "ema_decay": {"type": NUMBER, "default": 0.999, "min": 0, "max": 1},
+        }},
+    }},
+    "model": {"type": dict, "required": True, "fields": {
+        "name_or_path": {"type": str, "required": True},
+        "is_flux": {"type": bool, "default": False},
+        "quantize": {"type": bool, "default": False},
+    }},
+    # Only filled in when the config samples at all
+    "sample": {"type": dict, "optional": True, "fields": {
+        "sampler": {"type": str, "default": "ddpm", "choices": NOISE_SCHEDULERS},
+        "sample_every": {"type": int, "default": 100, "min": 1},
+        "width": {"type": int, "default": 512, "min": 64, "multiple_of": 8},
+        "height": {"type": int, "default": 512, "min": 64, "multiple_of": 8},
+        "prompts": {"type": list, "required": True, "items": {"type": str}},
+        "neg": {"type": str, "default": ""},
+        "seed": {"type": int, "default": 0},
+        "walk_seed": {"type": bool, "default": False},
+        "guidance_scale": {"type": NUMBER, "default": 7, "min": 0},
+        "sample_steps": {"type": int, "default": 20, "min": 1},
+    }},
+}
+
+
+def _compile(spec):
+    """Normalise a spec in place and work out the default of mapping sections
+
+    A mapping section gets a default (the mapping of its field defaults)
+    unless it is required, optional or has a required field, so a missing
+    "save" section resolves to every save default.
+    """
+    spec["type"] = spec["type"] if isinstance(spec["type"], tuple) else (spec["type"],)
+    for field in spec.get("fields", {}).values():
+        _compile(field)
+    if "items" in spec:
+        _compile(spec["items"])
+    fields = spec.get("fields")
+    if (fields is not None and not spec.get("required") and not spec.get("optional")
+            and not any(f.get("required") for f in fields.values())):
+        spec["default"] = {name: f["default"] for name, f in fields.items() if "default" in f}
+    return spec
+
+
+PROCESS_SPEC = _compile({"type": dict, "fields": PROCESS_SCHEMA})
+
+
+def _kind_matches(value, types):
+    if isinstance(value, bool):
+        return bool in types
+    return isinstance(value, types)
+
+
+def _resolve(value, spec, path, errors, warnings):
+    """value checked against spec, with defaults filled into mappings"""
+    types = spec["type"]
+    if not _kind_matches(value, types):
+        errors.append(f"{path}: expected {'/'.join(t.__name__ for t in types)}, got {type(value).__name__}")
+        return value
+
+    if isinstance(value, dict) and "fields" in spec:
+        resolved = dict(value)
+        for name, field in spec["fields"].items():
+            field_path = f"{path}.{name}"
+            if name in value:
+                resolved[name] = _resolve(value[name], field, field_path, errors, warnings)
+            elif "default" in field:
+                resolved[name] = copy.deepcopy(field["default"])
+            elif field.get("required"):
+                errors.append(f"{field_path}: required")
+        for name in value:
+            if name not in spec["fields"]:
+                close = difflib.get_close_matches(name, spec["fields"], n=1, cutoff=0.8)
+                if close:
+                    warnings.append(f"{path}.{name}: unknown key, did you mean {close[0]}?")
+        return resolved
+
+    if isinstance(value, list):
+        if len(value) < spec.get("min_items", 0):
+            errors.append(f"{path}: needs at least {spec['min_items']} item(s)")
+        if "items" in spec:
+            return [_resolve(item, spec["items"], f"{path}[{i}]", errors, warnings) for i, item in enumerate(value)]
+        return value
+
+    if "items" in spec:
+        # A single value where a list is also accepted
+        return _resolve(value, spec["items"], path, errors, warnings)
+    if "choices" in spec and value not in spec["choices"]:
+        close = difflib.get_close_matches(str(value), spec["choices"], n=1)
+        hint = f" (did you mean {close[0]}?)" if close else f" (one of {', '.join(spec['choices'])})"
+        errors.append(f"{path}: unknown value {value!r}{hint}")
+    if "min" in spec and value < spec["min"]:
+        errors.append(f"{path}: {value} is below {spec['min']}")
+    if "max" in spec and value > spec["max"]:
+        errors.append(f"{path}: {value} is above {spec['max']}")
+    if "multiple_of" in spec and value % spec["multiple_of"]:
+        errors.append(f"{path}: {value} is not a multiple of {spec['multiple_of']}")
+    return value
+
+
+def _combination_problems(process, path, errors, warnings):
+    """Settings that are valid on their own but cannot work together"""
+    train, model, sample = process["train"], process["model"], process.get("sample")
+    if not train["train_unet"] and not train["train_text_encoder"]:
+        errors.append(f"{path}.train: train_unet and train_text_encoder are both off, nothing would be trained")
+    if train.get("start_step") is not None and train["start_step"] >= train["steps"]:
+        errors.append(f"{path}.train.start_step: run already reached train.steps ({train['steps']})")
+    if model["is_flux"]:
+        if train["train_text_encoder"]:
+            errors.append(f"{path}.train.train_text_encoder: FLUX LoRAs can only train the transformer")
+        if train["noise_scheduler"] != "flowmatch":
+            errors.append(f"{path}.train.noise_scheduler: FLUX needs flowmatch, got {train['noise_scheduler']}")
+        if sample:
+            for side in ("width", "height"):
+                if sample[side] % 16:
+                    errors.append(f"{path}.sample.{side}: FLUX samples need a multiple of 16, got {sample[side]}")
+    elif model["quantize"]:
+        errors.append(f"{path}.model.quantize: only supported for FLUX models")
+    if process["save"]["save_every"] > train["steps"]:
+        warnings.append(f"{path}.save.save_every: larger than train.steps, only the final step is saved")
+    if sample and sample["sample_every"] > train["steps"]:
+        warnings.append(f"{path}.sample.sample_every: larger than train.steps, no samples before the end")
+
+
+def dataset_summary(folder, caption_ext="txt"):
+    """Usable image and missing caption counts of a training folder, from its (refreshed) index"""
+    import dataset_index
+
+    dataset_index.update_index(folder, caption_ext=caption_ext)
+    conn = dataset_index.open_index(folder)
+    try:
+        row = conn.execute(
+            "SELECT COUNT(*) AS images, "
+            "COALESCE(SUM(caption IS NULL OR caption = ''), 0) AS missing_captions "
+            "FROM images WHERE error IS NULL"
+        ).fetchone()
+    finally:
+        conn.close()
+    return {"folder_path": folder, "image_count": row["images"], "missing_captions": row["missing_captions"]}
+
+
+def _dataset_problems(process, path, errors, warnings, datasets):
+    for i, dataset in enumerate(process["datasets"]):
+        folder = dataset["folder_path"]
+        dataset_path = f"{path}.datasets[{i}].folder_path"
+        if not os.path.isdir(folder):
+            errors.append(f"{dataset_path}: dataset folder not found: {folder}")
+            continue
+        summary = dataset_summary(folder, dataset["caption_ext"])
+        datasets.append(summary)
+        if summary["image_count"] < process["train"]["batch_size"]:
+            errors.append(f"{dataset_path}: {summary['image_count']} usable images, "
+                          f"fewer than train.batch_size {process['train']['batch_size']}")
+        elif summary["missing_captions"]:
+            warnings.append(f"{dataset_path}: {summary['missing_captions']} images have no caption")
+
+
+def validate_config(config, check_datasets=True):
+    """Check a full training config and fill in defaults
+
+    Returns {"config": resolved, "warnings": [...], "datasets": [...]};
+    raises ConfigError listing every problem found. With check_datasets the
+    dataset folders are looked up through their index (refreshed first).
+    """
+    validate_base(config)
+    errors, warnings, datasets = [], [], []
+    resolved = copy.deepcopy(config)
+    resolved.setdefault("job", "extension")
+
+    name = config["config"].get("name")
+    if not isinstance(name, str) or not name.strip() or "/" in name or name in (".", ".."):
+        errors.append("config.name: required, and usable as a folder name")
+
+    processes = []
+    for i, process in enumerate(config["config"]["process"]):
+        path = f"config.process[{i}]"
+        process_errors = []
+        process = _resolve(process, PROCESS_SPEC, path, process_errors, warnings)
+        if not process_errors:
+            _combination_problems(process, path, process_errors, warnings)
+        if not process_errors and check_datasets:
+            _dataset_problems(process, path, process_errors, warnings, datasets)
+        errors += process_errors
+        processes.append(process)
+    resolved["config"]["process"] = processes
+
+    if errors:
+        raise ConfigError(f"Invalid training config: {'; '.join(errors)}", errors)
+    return {"config": resolved, "warnings": warnings, "datasets": datasets}
@@ -0,0 +1,726 @@
+#!/usr/bin/env python3
+"""
+🏋️ Training process manager for train_with_yaml
+Detached ai-toolkit runs in their own process groups, tracked in an in-memory registry
+"""
+
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+# ai-toolkit is cloned here by setup_environment; its runner takes the config path
+AI_TOOLKIT_PATH = os.environ.get("AI_TOOLKIT_PATH", "/workspace/ai-toolkit")
+RUNNER_SCRIPT = "run.py"
+
+# process_logs reads at most this much per call
+DEFAULT_LOG_CHUNK = 64 * 1024
+MAX_LOG_CHUNK = 1024 * 1024
+# Log files kept open between polls
+MAX_OPEN_LOGS = 16
+
+# Progress samples kept per run, and how often the reader polls the log
+PROGRESS_SAMPLES = 256
+PROGRESS_POLL_SECONDS = 0.5
+# Shorter sample spans use the trainer's own it/s (e.g. a log parsed in one go)
+MIN_RATE_WINDOW_SECONDS = 2.0
+# Progress fields journaled with a finished run (the ring buffer is gone after a restart)
+FINAL_PROGRESS_KEYS = ("step", "total_steps", "last_loss", "loss_avg", "it_per_sec")
+# How long an exiting run waits for its log reader to parse the last lines
+FOLLOW_DRAIN_SECONDS = 5.0
+
+# Registry journal: compacted once it holds this many lines per record (and at least 64)
+JOURNAL_COMPACT_RATIO = 4
+JOURNAL_MIN_LINES = 64
+# Finished runs kept in the registry
+MAX_FINISHED_RECORDS = 500
+# How often runs adopted after a restart are checked for exit
+ADOPTED_POLL_SECONDS = 2.0
+
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+KILLED = "killed"
+# Finished while not supervised by this handler process (exit code unknown)
+EXITED = "exited"
+
+
+class TrainingError(RuntimeError):
+    """Training run could not be started or signalled"""
+
+
+def runner_command(toolkit_path=AI_TOOLKIT_PATH):
+    """ai-toolkit's runner (python run.py <config>) without the config argument"""
+    return [sys.executable, os.path.join(toolkit_path, RUNNER_SCRIPT)]
+
+
+def _proc_stat(pid):
+    """Fields of /proc/<pid>/stat after "(comm)" (state, ppid, pgrp, ...), or None"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    return stat[stat.rfind(")") + 2:].split()
+
+
+def process_start_ticks(pid):
+    """Start time of a live (non-zombie) pid in clock ticks since boot, or None
+
+    Stored with each run so a recycled pid is never mistaken for the trainer.
+    """
+    fields = _proc_stat(pid)
+    if not fields or fields[0] == "Z" or len(fields) < 20:
+        return None
+    return int(fields[19])
+
+
+def boot_id():
+    """Kernel boot id; start ticks are only comparable within one boot"""
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def uptime_ticks():
+    """Clock ticks since boot now, on the same scale as process_start_ticks"""
+    try:
+        with open("/proc/uptime") as f:
+            return int(float(f.read().split()[0]) * os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError):
+        return None
+
+
+def process_groups():
+    """{pgid: [(pid, start_ticks), ...]} of every live (non-zombie) process, or None without /proc
+
+    One pass over /proc: a container's init may never reap orphans, and
+    killpg(pgid, 0) still succeeds while only zombies are left.
+    """
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    groups = {}
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        fields = _proc_stat(entry)
+        if fields and len(fields) > 19 and fields[0] != "Z":
+            groups.setdefault(int(fields[2]), []).append((int(entry), int(fields[19])))
+    return groups
+
+
+def group_members(pgid):
+    """Live (non-zombie) pids in process group pgid"""
+    groups = process_groups()
+    if groups is None:
+        try:
+            os.killpg(pgid, 0)
+        except (ProcessLookupError, PermissionError):
+            return []
+        return [pgid]
+    return sorted(pid for pid, _ in groups.get(pgid, []))
+
+
+# ai-toolkit's training bar, e.g.
+# "matt_lora:  12%|█▏  | 245/2000 [05:12<37:10,  1.27s/it, lr: 1.0e-04 loss: 4.123e-01]"
+# Only a bar with the lr/loss postfix counts: "Caching latents to disk", "Generating Images"
+# and "Loading checkpoint shards" draw the same N/M bar without it
+PROGRESS_STEP = re.compile(r"(\d+)/(\d+) \[(?=[^\]]*\b(?:lr|loss):)")
+PROGRESS_RATE = re.compile(r"([\d.]+)\s*(it/s|s/it)")
+PROGRESS_LR = re.compile(r"\blr:\s*([-+\d.eE]+)")
+PROGRESS_LOSS = re.compile(r"\bloss:\s*([-+\d.eE]+)")
+
+
+def parse_progress(line):
+    """(step, total, it/s, lr, loss) from one training progress line, or None"""
+    step = PROGRESS_STEP.search(line)
+    if not step:
+        return None
+
+    def number(pattern):
+        match = pattern.search(line)
+        try:
+            return float(match.group(1)) if match else None
+        except ValueError:
+            return None
+
+    rate = PROGRESS_RATE.search(line)
+    it_per_sec = None
+    if rate and float(rate.group(1)) > 0:
+        it_per_sec = float(rate.group(1)) if rate.group(2) == "it/s" else 1 / float(rate.group(1))
+    return int(step.group(1)), int(step.group(2)), it_per_sec, number(PROGRESS_LR), number(PROGRESS_LOSS)
+
+
+class ProgressBuffer:
+    """Fixed-size ring of (time, step, loss) samples with O(1) summaries
+
+    Repaints of the same step replace the newest sample; the rate is
+    measured across the oldest and newest samples, and the running loss
+    sum is kept as samples enter and leave the ring.
+    """
+
+    def __init__(self, capacity=PROGRESS_SAMPLES):
+        self._samples = deque(maxlen=capacity)
+        self._loss_sum = 0.0
+        self._loss_count = 0
+        self.total = None
+        self.lr = None
+        self.reported_rate = None
+        # Newest loss actually reported (samples without one do not clear it)
+        self.last_loss = None
+        # When the step last changed (repaints of the same step do not count)
+        self.advanced_time = None
+        self.lock = threading.Lock()
+
+    def _drop(self, sample):
+        if sample[2] is not None:
+            self._loss_sum -= sample[2]
+            self._loss_count -= 1
+
+    def add(self, step, total, it_per_sec=None, lr=None, loss=None, now=None):
+        sample = (time.time() if now is None else now, step, loss)
+        with self.lock:
+            self.total = total
+            self.lr = lr if lr is not None else self.lr
+            self.reported_rate = it_per_sec if it_per_sec is not None else self.reported_rate
+            if self._samples and self._samples[-1][1] == step:
+                self._drop(self._samples.pop())
+            else:
+                self.advanced_time = sample[0]
+                if len(self._samples) == self._samples.maxlen:
+                    self._drop(self._samples[0])
+            self._samples.append(sample)
+            if loss is not None:
+                self._loss_sum += loss
+                self._loss_count += 1
+                self.last_loss = loss
+
+    def summary(self, now=None):
+        """Current step/total, loss, smoothed it/s and ETA, or None before the first step"""
+        with self.lock:
+            if not self._samples:
+                return None
+            first, last = self._samples[0], self._samples[-1]
+            it_per_sec = self.reported_rate
+            if last[0] - first[0] >= MIN_RATE_WINDOW_SECONDS and last[1] > first[1]:
+                it_per_sec = (last[1] - first[1]) / (last[0] - first[0])
+            remaining = max(0, (self.total or 0) - last[1])
+            return {
+                "step": last[1],
+                "total_steps": self.total,
+                "percent": round(100 * last[1] / self.total, 2) if self.total else None,
+                "loss": last[2],
+                "last_loss": self.last_loss,
+                "loss_avg": self._loss_sum / self._loss_count if self._loss_count else None,
+                "lr": self.lr,
+                "it_per_sec": round(it_per_sec, 4) if it_per_sec else None,
+                "eta_seconds": round(remaining / it_per_sec, 1) if it_per_sec else None,
+                "samples": len(self._samples),
+                "updated_at": datetime.fromtimestamp(last[0]).isoformat(),
+                "advanced_at": datetime.fromtimestamp(self.advanced_time).isoformat()
+            }
+
+
+def follow_progress(log_path, buffer, stop, poll_seconds=PROGRESS_POLL_SECONDS):
+    """Reader loop: parse progress lines appended to log_path into buffer until stop is set
+
+    tqdm redraws with carriage returns, so both \\r and \\n end a line.
+    After stop the rest of the file is still parsed once.
+    """
+    pending = b""
+    handle = None
+    while True:
+        stopping = stop.is_set()
+        if handle is None:
+            try:
+                handle = open(log_path, "rb")
+            except FileNotFoundError:
+                if stopping:
+                    return
+                stop.wait(poll_seconds)
+                continue
+        data = handle.read()
+        if data:
+            *lines, pending = re.split(rb"[\r\n]", pending + data)
+            for line in lines:
+                progress = parse_progress(line.decode("utf-8", errors="replace"))
+                if progress:
+                    buffer.add(*progress)
+        elif stopping:
+            progress = parse_progress(pending.decode("utf-8", errors="replace"))
+            if progress:
+                buffer.add(*progress)
+            handle.close()
+            return
+        else:
+            stop.wait(poll_seconds)
+
+
+def final_progress(buffer):
+    """The FINAL_PROGRESS_KEYS of buffer's summary, or None before the first step"""
+    summary = buffer.summary()
+    return {key: summary[key] for key in FINAL_PROGRESS_KEYS} if summary else None
+
+
+def read_final_progress(log_path):
+    """final_progress of a whole log parsed in one go"""
+    buffer = ProgressBuffer()
+    stop = threading.Event()
+    stop.set()
+    follow_progress(log_path, buffer, stop)
+    return final_progress(buffer)
+
+
+class LogReader:
+    """Incremental reads of growing log files through cached, seekable handles
+
+    Each poll seeks to the caller's offset and reads only what was appended
+    since, so following a multi-hour run costs O(new bytes) per request.
+    """
+
+    def __init__(self, max_open=MAX_OPEN_LOGS):
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._handles = OrderedDict()
+
+    def _handle(self, path):
+        handle = self._handles.get(path)
+        if handle is None:
+            handle = open(path, "rb")
+            self._handles[path] = handle
+            while len(self._handles) > self.max_open:
+                self._handles.popitem(last=False)[1].close()
+        self._handles.move_to_end(path)
+        return handle
+
+    def read(self, path, offset=0, max_bytes=DEFAULT_LOG_CHUNK, final=False):
+        """New complete lines of path from byte offset, and the offset to continue from
+
+        A partial last line is held back until its newline arrives, unless
+        final (the writer has exited) or a single line exceeds max_bytes.
+        An offset past the end (log replaced) restarts from 0.
+        """
+        max_bytes = max(1, min(int(max_bytes), MAX_LOG_CHUNK))
+        offset = max(0, int(offset))
+        with self._lock:
+            try:
+                handle = self._handle(path)
+            except FileNotFoundError:
+                return {"lines": [], "offset": offset, "next_offset": offset, "size": 0, "eof": True,
+                        "reset": False}
+            size = os.fstat(handle.fileno()).st_size
+            reset = offset > size
+            if reset:
+                offset = 0
+            handle.seek(offset)
+            data = handle.read(max_bytes)
+            if final and offset + len(data) >= size:
+                self._handles.pop(path).close()
+
+        end = len(data)
+        if data and not data.endswith(b"\n") and not (final and offset + len(data) >= size):
+            newline = data.rfind(b"\n")
+            if newline >= 0:
+                end = newline + 1
+            elif len(data) < max_bytes:
+                end = 0
+        text = data[:end].decode("utf-8", errors="replace")
+        return {
+            "lines": text.splitlines(),
+            "offset": offset,
+            "next_offset": offset + end,
+            "size": size,
+            "eof": offset + end >= size,
+            "reset": reset
+        }
+
+    def close(self):
+        with self._lock:
+            while self._handles:
+                self._handles.popitem()[1].close()
+
+
+class ProcessJournal:
+    """Append-only JSONL log of registry records; the last line per process wins
+
+    Every state change appends the full record, so a crash loses at most the
+    line being written. Once the file holds JOURNAL_COMPACT_RATIO lines per
+    record it is rewritten atomically with one line each.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._lines = 0
+
+    def load(self):
+        """{process_id: record} replayed from the journal (a torn last line is skipped)"""
+        records = {}
+        self._lines = 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    self._lines += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    records[record["process_id"]] = record
+        except FileNotFoundError:
+            pass
+        return records
+
+    def append(self, record, records_count):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._lines += 1
+            return self._lines >= max(JOURNAL_MIN_LINES, JOURNAL_COMPACT_RATIO * records_count)
+
+    def compact(self, records):
+        """Rewrite the journal with one line per record"""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self._lines = len(records)
+
+
+class ProcessManager:
+    """Launches trainer subprocesses and answers status queries from memory
+
+    Each run is started with start_new_session, so the trainer and every
+    worker it forks share a process group that can be signalled as a unit
+    and that survives the handler's own signals. A waiter thread per run
+    records the exit code; queries only copy registry entries under a lock
+    and never touch the processes themselves.
+
+    With a journal_path the registry is persisted (see ProcessJournal) and
+    reloaded on construction: runs whose pid is still the same live process
+    (same boot, same start time) are adopted and watched until they exit,
+    the others are marked exited.
+    """
+
+    def __init__(self, command=None, cwd=None, journal_path=None):
+        self.command = list(command or runner_command())
+        self.cwd = cwd
+        self._lock = threading.Lock()
+        self._records = {}
+        self._exited = {}
+        self._progress = {}
+        self._followers = {}
+        self._follow_stops = {}
+        self.logs = LogReader()
+        # Called with the final registry entry whenever a run exits (from a waiter thread)
+        self.exit_callbacks = []
+        self.journal = ProcessJournal(journal_path) if journal_path else None
+        if self.journal:
+            self._reconcile()
+
+    def _persist(self, record):
+        """Journal a copy of record (caller holds self._lock)"""
+        if self.journal and self.journal.append(dict(record), len(self._records)):
+            self._compact()
+
+    def _compact(self):
+        finished = sorted(
+            (r for r in self._records.values() if r["status"] != RUNNING), key=lambda r: r["start_time"]
+        )
+        for record in finished[:max(0, len(finished) - MAX_FINISHED_RECORDS)]:
+            self._records.pop(record["process_id"])
+            self._exited.pop(record["process_id"], None)
+            self._progress.pop(record["process_id"], None)
+            self._followers.pop(record["process_id"], None)
+            self._follow_stops.pop(record["process_id"], None)
+        self.journal.compact(sorted(self._records.values(), key=lambda r: r["start_time"]))
+
+    def _reconcile(self):
+        """Reload the journal and check every run it left running against /proc"""
+        adopted = []
+        current_boot = boot_id()
+        with self._lock:
+            self._records = self.journal.load()
+            for process_id, record in self._records.items():
+                self._exited[process_id] = threading.Event()
+                if record["status"] != RUNNING:
+                    self._exited[process_id].set()
+                # start_ticks count from boot, so they only identify the process within one boot
+                elif record.get("start_ticks") is not None and record.get("boot_id") == current_boot and \
+                        process_start_ticks(record["pid"]) == record["start_ticks"]:
+                    adopted.append(record)
+                else:
+                    self._mark_exited(record)
+                    # Died while no handler was watching: recover its progress from the log
+                    if record.get("log_path") and "final_progress" not in record:
+                        record["final_progress"] = read_final_progress(record["log_path"])
+            self._compact()
+        for record in adopted:
+            threading.Thread(
+                target=self._watch_adopted, args=(record["process_id"],),
+                name=f"train-adopted-{record['process_id']}", daemon=True
+            ).start()
+            if record.get("log_path"):
+                self._follow(record["process_id"], record["log_path"])
+
+    def _mark_exited(self, record, observed=False):
+        record["status"] = KILLED if record.get("kill_signal") else EXITED
+        record["ended_at"] = datetime.now().isoformat()
+        record["end_time"] = time.time()
+        # Only an exit seen happening bounds the group's lifetime (see cleanup_stuck)
+        if observed:
+            record["end_ticks"] = uptime_ticks()
+        self._exited[record["process_id"]].set()
+
+    def _watch_adopted(self, process_id):
+        """Poll a run started by an earlier handler process (not our child, so no wait())"""
+        with self._lock:
+            record = self._records[process_id]
+            pid, ticks, exited = record["pid"], record["start_ticks"], self._exited[process_id]
+        while process_start_ticks(pid) == ticks:
+            if exited.wait(ADOPTED_POLL_SECONDS):
+                return
+        progress = self._drain_progress(process_id)
+        with self._lock:
+            if record["status"] != RUNNING:
+                return
+            self._mark_exited(record, observed=True)
+            record["final_progress"] = progress
+            self._persist(record)
+        self._notify_exit(process_id)
+
+    def _notify_exit(self, process_id):
+        snapshot = self.status(process_id)
+        for callback in list(self.exit_callbacks):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"⚠️ Exit callback for {process_id} failed: {e}", file=sys.stderr)
+
+    def start(self, process_id, config_path, name=None, log_path=None):
+        """Launch the trainer on config_path and register it as process_id
+
+        stdout and stderr go to log_path when given (appended), otherwise
+        they are inherited from the handler.
+        """
+        if self.cwd and not os.path.isdir(self.cwd):
+            raise TrainingError(f"Trainer directory not found: {self.cwd}")
+        for path in self.command[1:]:
+            if os.path.isabs(path) and not os.path.exists(path):
+                raise TrainingError(f"Trainer not found: {path}")
+        with self._lock:
+            if process_id in self._records:
+                raise TrainingError(f"Process already exists: {process_id}")
+
+        command = self.command + [config_path]
+        log_file = None
+        try:
+            if log_path:
+                os.makedirs(os.path.dirname(log_path), exist_ok=True)
+                log_file = open(log_path, "ab")
+            popen = subprocess.Popen(
+                command,
+                cwd=self.cwd,
+                stdin=subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=subprocess.STDOUT if log_file else None,
+                start_new_session=True
+            )
+        except OSError as e:
+            raise TrainingError(f"Could not start trainer: {e}") from e
+        finally:
+            # The child keeps its own descriptor
+            if log_file:
+                log_file.close()
+
+        record = {
+            "process_id": process_id,
+            "name": name,
+            "status": RUNNING,
+            "pid": popen.pid,
+            "pgid": popen.pid,
+            "command": command,
+            "config_path": config_path,
+            "log_path": log_path,
+            "started_at": datetime.now().isoformat(),
+            "start_time": time.time(),
+            "start_ticks": process_start_ticks(popen.pid),
+            "boot_id": boot_id(),
+            "ended_at": None,
+            "exit_code": None,
+            "kill_signal": None
+        }
+        exited = threading.Event()
+        with self._lock:
+            self._records[process_id] = record
+            self._exited[process_id] = exited
+            self._persist(record)
+        threading.Thread(
+            target=self._wait, args=(process_id, popen), name=f"train-wait-{process_id}", daemon=True
+        ).start()
+        if log_path:
+            self._follow(process_id, log_path)
+        return self.status(process_id)
+
+    def _follow(self, process_id, log_path):
+        buffer = ProgressBuffer()
+        stop = threading.Event()
+        follower = threading.Thread(
+            target=follow_progress, args=(log_path, buffer, stop),
+            name=f"train-progress-{process_id}", daemon=True
+        )
+        with self._lock:
+            self._progress[process_id] = buffer
+            self._followers[process_id] = follower
+            self._follow_stops[process_id] = stop
+        follower.start()
+
+    def _drain_progress(self, process_id):
+        """Stop the log reader of an exited run once it has parsed the last lines; its final_progress"""
+        with self._lock:
+            follower = self._followers.get(process_id)
+            stop = self._follow_stops.get(process_id)
+            buffer = self._progress.get(process_id)
+        if follower is None:
+            return None
+        stop.set()
+        follower.join(FOLLOW_DRAIN_SECONDS)
+        return final_progress(buffer)
+
+    def _wait(self, process_id, popen):
+        exit_code = popen.wait()
+        progress = self._drain_progress(process_id)
+        with self._lock:
+            record = self._records[process_id]
+            record["exit_code"] = exit_code
+            record["ended_at"] = datetime.now().isoformat()
+            record["end_time"] = time.time()
+            record["end_ticks"] = uptime_ticks()
+            if exit_code == 0:
+                record["status"] = COMPLETED
+            elif record["kill_signal"] or exit_code < 0:
+                record["status"] = KILLED
+            else:
+                record["status"] = FAILED
+            record["final_progress"] = progress
+            self._persist(record)
+        # Callbacks (e.g. the scheduler starting the next run) finish before wait() returns
+        self._notify_exit(process_id)
+        self._exited[process_id].set()
+
+    def _snapshot(self, record):
+        snapshot = dict(record)
+        end_time = snapshot.pop("end_time", None) or time.time()
+        snapshot["runtime_seconds"] = round(end_time - snapshot.pop("start_time"), 2)
+        for key in ("start_ticks", "end_ticks", "boot_id"):
+            snapshot.pop(key, None)
+        buffer = self._progress.get(record["process_id"])
+        snapshot["progress"] = buffer.summary() if buffer else None
+        return snapshot
+
+    def status(self, process_id):
+        """Registry entry for process_id, or None"""
+        with self._lock:
+            record = self._records.get(process_id)
+            return self._snapshot(record) if record else None
+
+    def list(self):
+        """All registry entries, oldest first"""
+        with self._lock:
+            records = sorted(self._records.values(), key=lambda r: r["start_time"])
+            return [self._snapshot(record) for record in records]
+
+    def kill(self, process_id, sig=signal.SIGKILL, reason=None):
+        """Signal the run's whole process group; returns the updated entry
+
+        reason (e.g. why the watchdog stopped it) is kept as kill_reason.
+        """
+        with self._lock:
+            record = self._records.get(process_id)
+            if record is None:
+                raise TrainingError(f"Process not found: {process_id}")
+            if record["status"] != RUNNING:
+                return self._snapshot(record)
+            record["kill_signal"] = signal.Signals(sig).name
+            if reason:
+                record["kill_reason"] = reason
+            self._persist(record)
+        try:
+            os.killpg(record["pgid"], sig)
+        except ProcessLookupError:
+            pass
+        return self.status(process_id)
+
+    def wait(self, process_id, timeout=None):
+        """Block until the run exits (tests and shutdown only); returns the entry"""
+        with self._lock:
+            exited = self._exited.get(process_id)
+        if exited is None:
+            raise TrainingError(f"Process not found: {process_id}")
+        exited.wait(timeout)
+        return self.status(process_id)
+
+    def read_logs(self, process_id, offset=0, max_bytes=DEFAULT_LOG_CHUNK):
+        """Log lines of process_id appended after offset (see LogReader.read)"""
+        with self._lock:
+            record = self._records.get(process_id)
+            if record is None:
+                raise TrainingError(f"Process not found: {process_id}")
+            log_path, status = record["log_path"], record["status"]
+        if not log_path:
+            raise TrainingError(f"Process {process_id} has no log file")
+        chunk = self.logs.read(log_path, offset, max_bytes, final=status != RUNNING)
+        return {"process_id": process_id, "process_status": status, **chunk}
+
+    def cleanup_stuck(self):
+        """Kill processes left behind by runs whose trainer already exited
+
+        Dataloader workers and other children can outlive the runner and keep
+        holding GPU memory; their group is still addressable by the runner's pgid.
+        pids and pgids are reused (and start over in a new container), so a
+        process only counts as left behind when it is in the pgid of a run
+        whose exit was observed in this boot and started between that run's
+        start and end. Groups of running records are never touched.
+        """
+        groups = process_groups()
+        if not groups:
+            return []
+        current_boot = boot_id()
+        with self._lock:
+            running_pgids = {r["pgid"] for r in self._records.values() if r["status"] == RUNNING}
+            finished = [dict(r) for r in self._records.values() if r["status"] != RUNNING]
+        cleaned = []
+        for record in finished:
+            pgid, start, end = record["pgid"], record.get("start_ticks"), record.get("end_ticks")
+            if (pgid in running_pgids or start is None or end is None
+                    or current_boot is None or record.get("boot_id") != current_boot):
+                continue
+            members = [pid for pid, ticks in groups.get(pgid, []) if start <= ticks <= end]
+            killed = []
+            for pid in members:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                    killed.append(pid)
+                except ProcessLookupError:
+                    pass
+            if killed:
+                cleaned.append({"process_id": record["process_id"], "pgid": pgid,
+                                "pids": killed, "reason": "orphaned process group"})
+        return cleaned
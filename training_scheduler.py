@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+🚦 Training queue in front of the process manager
+Priority FIFO with admission control: one GPU, one trainer at a time
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+
+import training_manager
+
+# Trainers allowed to run at once (one per GPU)
+MAX_CONCURRENT_TRAININGS = int(os.environ.get("MAX_CONCURRENT_TRAININGS", 1))
+
+QUEUED = "queued"
+CANCELLED = "cancelled"
+START_FAILED = "start_failed"
+# Journal-only status: the run was handed to the process manager, which tracks it from then on
+STARTED = "started"
+# Cancelled and failed-to-start entries kept (newest first), like the manager's finished runs
+MAX_FINISHED_ENTRIES = 500
+
+
+class TrainingScheduler:
+    """Admits up to max_concurrent runs and queues the rest by (priority, arrival)
+
+    Higher priority runs first; equal priorities keep submission order. The
+    next run is started from the process manager's exit callback, i.e. on
+    the waiter thread the moment the previous trainer is reaped, so the GPU
+    never idles waiting for a poll. Cancelled entries are only marked and
+    skipped when they reach the head of the heap.
+
+    With a journal_path every queue entry change is journaled (a
+    ProcessJournal, like the manager's registry) and replayed on
+    construction, so runs queued before a worker restart keep their place
+    and start once a slot is free.
+    """
+
+    def __init__(self, manager, max_concurrent=MAX_CONCURRENT_TRAININGS, journal_path=None):
+        self.manager = manager
+        self.max_concurrent = max(1, int(max_concurrent))
+        self._lock = threading.RLock()
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        # Last measured trainer speed, used to estimate queued runs from their step count
+        self.last_it_per_sec = None
+        self.journal = training_manager.ProcessJournal(journal_path) if journal_path else None
+        # Registered first, so a restored run that exits right away still starts the next one
+        manager.exit_callbacks.append(self._on_exit)
+        if self.journal:
+            self._restore()
+
+    def _persist(self, entry):
+        """Journal a copy of entry (caller holds self._lock)"""
+        if self.journal and self.journal.append(dict(entry), len(self._entries)):
+            self._compact()
+
+    def _compact(self):
+        """Forget the oldest finished entries and rewrite the journal (caller holds self._lock)"""
+        finished = sorted((e for e in self._entries.values() if e["status"] != QUEUED),
+                          key=lambda e: e["queued_time"])
+        for entry in finished[:max(0, len(finished) - MAX_FINISHED_ENTRIES)]:
+            self._entries.pop(entry["process_id"])
+        # Cancelled entries stay in the heap until they reach its head
+        self._heap = [item for item in self._heap if item[2] in self._entries]
+        heapq.heapify(self._heap)
+        self.journal.compact(sorted(self._entries.values(), key=lambda e: e["queued_time"]))
+
+    def _restore(self):
+        """Reload the queue journal; entries the manager already started are dropped"""
+        with self._lock:
+            journaled = sorted(self.journal.load().values(), key=lambda e: e["queued_time"])
+            for entry in journaled:
+                if entry["status"] == STARTED or self.manager.status(entry["process_id"]):
+                    continue
+                self._entries[entry["process_id"]] = entry
+                if entry["status"] == QUEUED:
+                    heapq.heappush(self._heap, (-entry["priority"], next(self._counter), entry["process_id"]))
+            if len(self._entries) < len(journaled) or \
+                    sum(1 for e in self._entries.values() if e["status"] != QUEUED) > MAX_FINISHED_ENTRIES:
+                self._compact()
+            self._start_next()
+
+    def _running(self):
+        return [r for r in self.manager.list() if r["status"] == training_manager.RUNNING]
+
+    def submit(self, process_id, config_path, name=None, log_path=None, priority=0,
+               steps=None, estimated_seconds=None):
+        """Start the run now if a slot is free, otherwise queue it; returns its entry"""
+        with self._lock:
+            if process_id in self._entries or self.manager.status(process_id):
+                raise training_manager.TrainingError(f"Process already exists: {process_id}")
+            entry = {
+                "process_id": process_id,
+                "name": name,
+                "status": QUEUED,
+                "priority": int(priority),
+                "config_path": config_path,
+                "log_path": log_path,
+                "steps": steps,
+                "estimated_seconds": estimated_seconds,
+                "queued_at": datetime.now().isoformat(),
+                "queued_time": time.time()
+            }
+            if not self._pending() and len(self._running()) < self.max_concurrent:
+                return self.manager.start(process_id, config_path, name=name, log_path=log_path)
+
+            self._entries[process_id] = entry
+            heapq.heappush(self._heap, (-entry["priority"], next(self._counter), process_id))
+            self._persist(entry)
+            return self.status(process_id)
+
+    def _pending(self):
+        return [process_id for _, _, process_id in sorted(self._heap)
+                if self._entries[process_id]["status"] == QUEUED]
+
+    def _start_next(self):
+        """Fill free slots from the head of the queue (caller holds the lock)"""
+        free = self.max_concurrent - len(self._running())
+        while free > 0 and self._heap:
+            _, _, process_id = heapq.heappop(self._heap)
+            entry = self._entries.pop(process_id)
+            if entry["status"] != QUEUED:
+                continue
+            try:
+                self.manager.start(process_id, entry["config_path"], name=entry["name"], log_path=entry["log_path"])
+                free -= 1
+                self._persist(dict(entry, status=STARTED))
+            except training_manager.TrainingError as e:
+                entry["status"] = START_FAILED
+                entry["error"] = str(e)
+                self._entries[process_id] = entry
+                self._persist(entry)
+
+    def _on_exit(self, record):
+        progress = record.get("progress") or {}
+        if progress.get("it_per_sec"):
+            self.last_it_per_sec = progress["it_per_sec"]
+        with self._lock:
+            self._start_next()
+
+    def cancel(self, process_id):
+        """Drop a queued run; running runs have to be stopped with force_kill"""
+        with self._lock:
+            entry = self._entries.get(process_id)
+            if entry is None or entry["status"] != QUEUED:
+                raise training_manager.TrainingError(f"No queued run: {process_id}")
+            entry["status"] = CANCELLED
+            entry["cancelled_at"] = datetime.now().isoformat()
+            self._persist(entry)
+            return self._snapshot(entry, None, None)
+
+    def _duration(self, steps, estimated_seconds):
+        if estimated_seconds:
+            return float(estimated_seconds)
+        if steps and self.last_it_per_sec:
+            return steps / self.last_it_per_sec
+        return None
+
+    def _estimates(self):
+        """{process_id: (position, seconds until start or None)} for the queue in start order
+
+        Slots free up when running trainers reach their ETA; each queued run
+        takes the earliest slot and holds it for its own estimated duration.
+        """
+        now = time.time()
+        slots = []
+        for record in self._running():
+            eta = (record.get("progress") or {}).get("eta_seconds")
+            slots.append(now + eta if eta is not None else None)
+        slots += [now] * max(0, self.max_concurrent - len(slots))
+        # Trainers without an ETA yet cannot be planned around
+        known = sorted(t for t in slots if t is not None)
+
+        estimates = {}
+        for position, process_id in enumerate(self._pending(), start=1):
+            entry = self._entries[process_id]
+            if not known:
+                estimates[process_id] = (position, None)
+                continue
+            start = heapq.heappop(known)
+            estimates[process_id] = (position, max(0.0, start - now))
+            duration = self._duration(entry["steps"], entry["estimated_seconds"])
+            if duration is None:
+                # Everything behind an open-ended run is unknown too
+                known = []
+            else:
+                heapq.heappush(known, start + duration)
+        return estimates
+
+    def _snapshot(self, entry, position, wait_seconds):
+        snapshot = dict(entry)
+        snapshot.pop("queued_time")
+        snapshot["position"] = position
+        snapshot["estimated_start_seconds"] = round(wait_seconds, 1) if wait_seconds is not None else None
+        snapshot["estimated_start_at"] = (
+            datetime.fromtimestamp(time.time() + wait_seconds).isoformat() if wait_seconds is not None else None
+        )
+        return snapshot
+
+    def status(self, process_id):
+        """Process manager entry, or the queue entry of a run that has not started"""
+        record = self.manager.status(process_id)
+        if record:
+            return record
+        with self._lock:
+            entry = self._entries.get(process_id)
+            if entry is None:
+                return None
+            position, wait_seconds = self._estimates().get(process_id, (None, None))
+            return self._snapshot(entry, position, wait_seconds)
+
+    def queue(self):
+        """Queued runs in the order they will start"""
+        with self._lock:
+            estimates = self._estimates()
+            return [self._snapshot(self._entries[process_id], *estimates[process_id])
+                    for process_id in self._pending()]
+
+    def list(self):
+        """Started runs followed by queued, cancelled and failed-to-start entries"""
+        with self._lock:
+            estimates = self._estimates()
+            waiting = sorted(self._entries.values(), key=lambda e: e["queued_time"])
+            return self.manager.list() + [
+                self._snapshot(entry, *estimates.get(entry["process_id"], (None, None))) for entry in waiting
+            ]
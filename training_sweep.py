@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+🧪 Hyperparameter sweeps over a base training config
+Grid or random expansion of parameter axes, sweep records and the final loss / timing summary
+"""
+
+import json
+import math
+import os
+import random
+from datetime import datetime
+
+import training_config
+import training_manager
+import training_scheduler
+
+SWEEP_MODES = ("grid", "random")
+# One GPU runs sweeps serially, so this caps a sweep at a few days of training
+MAX_SWEEP_RUNS = 64
+
+# Statuses after which a sweep run will not change any more
+FINISHED_STATUSES = (
+    training_manager.COMPLETED, training_manager.FAILED, training_manager.KILLED, training_manager.EXITED,
+    training_scheduler.CANCELLED, training_scheduler.START_FAILED
+)
+
+
+def axis_path(axis):
+    """Axis names are relative to the first process ("train.lr") unless already a full path or shortcut"""
+    if axis in training_config.OVERLAY_SHORTCUTS or axis.startswith(("config.", "$.")):
+        return axis
+    return f"config.process[0].{axis}"
+
+
+def expand_axes(axes, mode="grid", samples=None, seed=None):
+    """[{axis: value}] for the Cartesian product of axes, or a random sample of it
+
+    Random samples are drawn without replacement and kept in grid order, so
+    the same seed always gives the same runs.
+    """
+    if mode not in SWEEP_MODES:
+        raise training_config.ConfigError(f"Unknown sweep mode: {mode} (one of {', '.join(SWEEP_MODES)})")
+    if not isinstance(axes, dict) or not axes:
+        raise training_config.ConfigError("axes must be an object of {path: [values]}")
+    for axis, values in axes.items():
+        if not isinstance(values, list) or not values:
+            raise training_config.ConfigError(f"Axis {axis} needs a non-empty list of values")
+
+    names = list(axes)
+    sizes = [len(axes[name]) for name in names]
+    total = math.prod(sizes)
+    if mode == "grid":
+        indexes = range(total)
+    else:
+        if not samples or int(samples) < 1:
+            raise training_config.ConfigError("Random sweeps need samples >= 1")
+        indexes = sorted(random.Random(seed).sample(range(total), min(int(samples), total)))
+    if len(indexes) > MAX_SWEEP_RUNS:
+        raise training_config.ConfigError(f"Sweep has {len(indexes)} runs, more than {MAX_SWEEP_RUNS}")
+
+    variants = []
+    for index in indexes:
+        variant = {}
+        # Mixed-radix decode: the last axis changes fastest, like itertools.product
+        for name, size in reversed(list(zip(names, sizes))):
+            index, position = divmod(index, size)
+            variant[name] = axes[name][position]
+        variants.append({name: variant[name] for name in names})
+    return variants
+
+
+def sweep_path(sweeps_dir, sweep_id):
+    return os.path.join(sweeps_dir, f"{sweep_id}.json")
+
+
+def save_sweep(sweeps_dir, sweep):
+    os.makedirs(sweeps_dir, exist_ok=True)
+    path = sweep_path(sweeps_dir, sweep["sweep_id"])
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(sweep, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def load_sweep(sweeps_dir, sweep_id):
+    try:
+        with open(sweep_path(sweeps_dir, os.path.basename(sweep_id)), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def summarize(sweep, records):
+    """One row per run (best final loss first) plus sweep totals
+
+    records maps process_id to the scheduler status of each run (None if
+    the worker no longer knows it). Finished runs are scored from the
+    final_progress journaled with them, which outlives a worker restart.
+    """
+    rows = []
+    for run in sweep["runs"]:
+        record = records.get(run["process_id"]) or {}
+        progress = record.get("final_progress") or record.get("progress") or {}
+        rows.append({
+            "process_id": run["process_id"],
+            "name": run["name"],
+            "params": run["params"],
+            "status": record.get("status", "unknown"),
+            "final_loss": progress.get("last_loss"),
+            "loss_avg": progress.get("loss_avg"),
+            "step": progress.get("step"),
+            "total_steps": progress.get("total_steps"),
+            "it_per_sec": progress.get("it_per_sec"),
+            "runtime_seconds": record.get("runtime_seconds"),
+            "exit_code": record.get("exit_code")
+        })
+    rows.sort(key=lambda row: (row["final_loss"] is None, row["final_loss"] or 0.0))
+
+    finished = sum(1 for row in rows if row["status"] in FINISHED_STATUSES)
+    scored = [row for row in rows if row["final_loss"] is not None and row["status"] == training_manager.COMPLETED]
+    return {
+        "complete": finished == len(rows),
+        "finished": finished,
+        "total": len(rows),
+        "best": scored[0] if scored else None,
+        "total_runtime_seconds": round(sum(row["runtime_seconds"] or 0 for row in rows), 1),
+        "summary": rows,
+        "table": format_table(sweep["axes"], rows)
+    }
+
+
+def format_table(axes, rows):
+    """Plain-text table of the summary rows for logs and terminals"""
+    header = list(axes) + ["status", "final_loss", "loss_avg", "step", "runtime_s"]
+    lines = [[str(row["params"].get(axis)) for axis in axes] + [
+        row["status"],
+        f"{row['final_loss']:.4f}" if row["final_loss"] is not None else "-",
+        f"{row['loss_avg']:.4f}" if row["loss_avg"] is not None else "-",
+        f"{row['step']}/{row['total_steps']}" if row["step"] is not None else "-",
+        f"{row['runtime_seconds']:.0f}" if row["runtime_seconds"] is not None else "-"
+    ] for row in rows]
+    widths = [max(len(cell) for cell in column) for column in zip(header, *lines)]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip()
+                     for line in [header] + lines)
+
+
+def new_sweep(sweep_id, name, axes, mode, runs):
+    return {
+        "sweep_id": sweep_id,
+        "name": name,
+        "axes": axes,
+        "mode": mode,
+        "created_at": datetime.now().isoformat(),
+        "runs": runs
+    }
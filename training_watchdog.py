@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+🐕 Stall watchdog for training runs
+Stops runs whose progress or log output has stopped, escalating SIGTERM → SIGKILL on the process group
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+import training_manager
+
+# A run is stalled when its step has not advanced, or its log has not grown, for this long.
+# Loading FLUX and caching latents can take many minutes before the first step.
+STALL_PROGRESS_SECONDS = float(os.environ.get("STALL_PROGRESS_SECONDS", 30 * 60))
+STALL_LOG_SECONDS = float(os.environ.get("STALL_LOG_SECONDS", 30 * 60))
+# Time a trainer gets to exit after SIGTERM before the group is SIGKILLed
+KILL_GRACE_SECONDS = float(os.environ.get("KILL_GRACE_SECONDS", 30))
+WATCHDOG_INTERVAL_SECONDS = 60
+
+
+def _timestamp(iso):
+    return datetime.fromisoformat(iso).timestamp() if iso else None
+
+
+def stall_reason(record, now=None, progress_window=STALL_PROGRESS_SECONDS, log_window=STALL_LOG_SECONDS):
+    """Why a running record counts as stalled, or None
+
+    Idle time is never counted from before the run (or its adoption) started,
+    so a freshly started trainer always gets the full window.
+    """
+    now = time.time() if now is None else now
+    started = _timestamp(record["started_at"])
+
+    progress = record.get("progress")
+    if progress and progress.get("advanced_at"):
+        idle = now - max(started, _timestamp(progress["advanced_at"]))
+        if idle > progress_window:
+            return f"no progress for {idle:.0f}s (stuck at step {progress['step']})"
+
+    if record.get("log_path"):
+        try:
+            last_write = os.stat(record["log_path"]).st_mtime
+        except OSError:
+            last_write = started
+        idle = now - max(started, last_write)
+        if idle > log_window:
+            return f"no log output for {idle:.0f}s"
+    return None
+
+
+class Watchdog:
+    """Sweeps the process manager for stalled runs and orphaned process groups
+
+    Stalled runs get SIGTERM on their whole group and SIGKILL after
+    grace_seconds if any process of the group is still alive, even when
+    the leader itself has exited; the exit then frees the slot for the
+    next queued run. Sweeps never block on the escalation.
+    """
+
+    def __init__(self, manager, progress_window=STALL_PROGRESS_SECONDS, log_window=STALL_LOG_SECONDS,
+                 grace_seconds=KILL_GRACE_SECONDS, interval=WATCHDOG_INTERVAL_SECONDS):
+        self.manager = manager
+        self.progress_window = progress_window
+        self.log_window = log_window
+        self.grace_seconds = grace_seconds
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sweep(self, progress_window=None, log_window=None):
+        """Stop stalled runs and kill orphaned groups; returns what was acted on"""
+        now = time.time()
+        stalled = []
+        for record in self.manager.list():
+            if record["status"] != training_manager.RUNNING or record.get("kill_signal"):
+                continue  # already being stopped
+            reason = stall_reason(
+                record, now,
+                self.progress_window if progress_window is None else progress_window,
+                self.log_window if log_window is None else log_window
+            )
+            if reason:
+                self.stop_run(record["process_id"], f"stalled: {reason}")
+                stalled.append({"process_id": record["process_id"], "pgid": record["pgid"], "reason": reason,
+                                "escalation": f"SIGTERM, SIGKILL after {self.grace_seconds:.0f}s"})
+        return {"stalled": stalled, "orphans": self.manager.cleanup_stuck()}
+
+    def stop_run(self, process_id, reason):
+        """SIGTERM the run's group now and SIGKILL it after the grace period"""
+        self.manager.kill(process_id, signal.SIGTERM, reason=reason)
+        timer = threading.Timer(self.grace_seconds, self._escalate, args=(process_id, reason))
+        timer.daemon = True
+        timer.start()
+
+    def _escalate(self, process_id, reason):
+        record = self.manager.status(process_id)
+        if record is None:
+            return
+        if record["status"] == training_manager.RUNNING:
+            self.manager.kill(process_id, signal.SIGKILL, reason=f"{reason} (ignored SIGTERM)")
+        elif training_manager.group_members(record["pgid"]):
+            # The leader exited but children (e.g. dataloader workers) ignored SIGTERM and hold the GPU
+            try:
+                os.killpg(record["pgid"], signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def start(self):
+        """Sweep every interval seconds on a daemon thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="train-watchdog", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"⚠️ Watchdog sweep failed: {e}", file=sys.stderr)